@@ -65,9 +65,10 @@ def measure(message):
                 "requestId": requestId,
                 "type": "point", 
                 "message": {
-                    "x": distPoint[0],
-                    "y": distPoint[1],
-                    "z": distPoint[2]
+                    # float32 from the point cloud is not JSON serialisable
+                    "x": float(distPoint[0]),
+                    "y": float(distPoint[1]),
+                    "z": float(distPoint[2])
                     }
             }
 
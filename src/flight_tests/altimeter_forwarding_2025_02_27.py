@@ -8,7 +8,6 @@ from src.modules.autopilot.altimeter_mavlink import MavlinkAltimeterProvider
 
 # Connection settings
 CONN_STR = "tcp:127.0.0.1:14550"
-MESSENGER_PORT = 14550
 MAVLINK_ALTITUDE_CONN_STR = "tcp:127.0.0.1:14550"
 
 AltimeterData = []
@@ -23,7 +22,7 @@ TEST_DURATION = 600  # 10 minutes
 drone = connect(CONN_STR, wait_ready=False)
 
 # Initialize navigator
-nav = navigator.Navigator(drone, MESSENGER_PORT)
+nav = navigator.Navigator(drone)
 nav.send_status_message("Altimeter test initializing")
 
 # Initialize the XM125 radar altimeter
@@ -31,7 +30,8 @@ radar_sensor = XM125(
     sensor_id=0,
     min_distance=250,
     max_distance=10000,
-    average_window=5
+    average_window=5,
+    continuous=True
 )
 
 
@@ -10,7 +10,6 @@ import json
 
 # Connection settings
 CONN_STR = "tcp:127.0.0.1:14550"
-MESSENGER_PORT = 14550
 MAVLINK_ALTITUDE_CONN_STR = "tcp:127.0.0.1:14550"
 
 AltimeterData = []
@@ -25,7 +24,7 @@ TEST_DURATION = 600  # 10 minutes
 drone = connect(CONN_STR, wait_ready=False)
 
 # Initialize navigator
-nav = navigator.Navigator(drone, MESSENGER_PORT)
+nav = navigator.Navigator(drone)
 nav.send_status_message("SHEPARD: Altimeter test initializing")
 
 # Initialize the XM125 radar altimeter
@@ -33,7 +32,8 @@ radar_sensor = XM125(
     sensor_id=0,
     min_distance=250,
     max_distance=10000,
-    average_window=5
+    average_window=5,
+    continuous=True
 )
 
 
@@ -69,12 +69,12 @@ try:
             altitude_m = float(drone.location.global_relative_frame.alt)
             if altitude_m is not None:
                 status_msg = f"Radar Altitude: {altitude_m:.2f} m"
-                nav.send_status_message(status_msg)
+                nav.send_status_message(status_msg, topic="altitude")
                 PixHawkData.append(altitude_m)
                 Delta.append(float(altitude_m) - float(average[0]))
 
             else:
-                nav.send_status_message("No valid altitude reading")
+                nav.send_status_message("No valid altitude reading", topic="altitude")
 
             last_status_time = current_time
 
@@ -14,7 +14,6 @@ from src.modules.imaging.detector import Detector
 
 # Connection settings
 CONN_STR = "tcp:127.0.0.1:14550"
-MESSENGER_PORT = 14550
 MAVLINK_ALTITUDE_CONN_STR = "tcp:127.0.0.1:14550"
 
 # Connect to the drone
@@ -24,7 +23,7 @@ drone = connect(CONN_STR, wait_ready=False)
 detector = Detector()
 
 # Initialize navigator
-nav = navigator.Navigator(drone, MESSENGER_PORT)
+nav = navigator.Navigator(drone)
 nav.send_status_message("Altimeter test initializing")
 
 # Initialize the XM125 radar altimeter
@@ -32,7 +31,8 @@ radar_sensor = XM125(
     sensor_id=0,
     min_distance=250,
     max_distance=10000,
-    average_window=5
+    average_window=5,
+    continuous=True
 )
 
 if not radar_sensor.begin():
@@ -72,7 +72,7 @@ try:
             continue
 
         if direction is not None:
-            nav.send_status_message(f"Balloon detected: Move {direction}, Distance: {distance:.2f}")
+            nav.send_status_message(f"Balloon detected: Move {direction}, Distance: {distance:.2f}", topic="balloon")
 
             if direction == "center":
                 # Move in that direction, need to calculate the N and E offsets based on heading
@@ -86,7 +86,7 @@ try:
                 nav.set_heading_relative(-10)
 
         else:
-            nav.send_status_message("No balloons detected")
+            nav.send_status_message("No balloons detected", topic="balloon")
             nav.set_heading_relative(10)
 
 except KeyboardInterrupt:
@@ -10,7 +10,6 @@ from src.modules.imaging.camera import RPiCamera
 # from src.modules.imaging.location import MAVLinkLocationProvider
 
 CONN_STR = "tcp:127.0.0.1:14550"
-MESSENGER_PORT = 14552
 
 cam = RPiCamera()
 #mavlink = MAVLinkDelegate()
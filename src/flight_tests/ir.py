@@ -1,17 +1,23 @@
-from src.modules.imaging.detector import IrDetector, BoundingBox
+from src.modules.imaging.detector import IrDetector
 import time
 from typing import Tuple
-from src.modules.imaging.analysis import ImageAnalysisDelegate
+from src.modules.imaging.analysis import AnalysisResult, ImageAnalysisDelegate
 from src.modules.imaging.camera import RPiCamera
 from src.modules.imaging.location import DebugLocationProvider
-from PIL import Image, ImageDraw
+from PIL import ImageDraw
 
 
-def func(image: Image.Image, bb: BoundingBox):
+def func(result: AnalysisResult):
+    bb = result.bounding_box
+    if bb is None:
+        return
+
     top_left_corner: Tuple[float, float] = (bb.position.x, bb.position.y)
     bottom_right_corner: Tuple[float, float] = (bb.position.x + bb.size.x,
                                                 bb.position.y + bb.size.y)
 
+    # The frame's image is shared with other subscribers, so draw on a copy
+    image = result.frame.to_image().copy()
     draw = ImageDraw.Draw(image)
     draw.rectangle((top_left_corner, bottom_right_corner), outline="red", width=3)
     image.show()
@@ -23,6 +29,6 @@ detector = IrDetector()
 location = DebugLocationProvider()
 
 analysis = ImageAnalysisDelegate(detector, camera, location)
-analysis.subscribe(func)
+analysis.subscribe(func, asynchronous=True, with_result=True)
 
 analysis.start()
@@ -12,13 +12,12 @@ import RPi.GPIO as GPIO
 
 
 CONN_STR = "udp:127.0.0.1:14551"
-MESSENGER_PORT = 14552
 mavlink_str = "udp:127.0.0.1:14553"
 GPIO_PIN = 23
 
 drone = connect(CONN_STR, wait_ready=False)
 
-nav = navigator.Navigator(drone, MESSENGER_PORT)
+nav = navigator.Navigator(drone)
 mavlink = MAVLinkDelegate(conn_str = mavlink_str)
 
 
@@ -70,7 +69,7 @@ model_file = "best.pt"
 detector = BucketDetector(f"samples/models/{model_file}")
 
 analysis = ImageAnalysisDelegate(detector, camera, navigation_provider = nav)
-analysis.subscribe(moving_bucket_avg)
+analysis.subscribe(moving_bucket_avg, asynchronous=True)
 
 nav.send_status_message("Shepard is online")
 
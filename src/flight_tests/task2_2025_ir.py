@@ -12,11 +12,10 @@ from dronekit import connect, VehicleMode
 
 
 CONN_STR = "udp:127.0.0.1:14551"
-MESSENGER_PORT = 14552
 
 drone = connect(CONN_STR, wait_ready=False)
 
-nav = navigator.Navigator(drone, MESSENGER_PORT)
+nav = navigator.Navigator(drone)
 mavlink = MAVLinkDelegate(conn_str = CONN_STR)
 
 time.sleep(2)
@@ -49,11 +48,11 @@ def moving_bucket_avg(_, pos):
 
 
 camera = RPiCamera(0)
-detector = IrDetector()
+detector = IrDetector(tracking=True)
 location = DebugLocationProvider()
 
 analysis = ImageAnalysisDelegate(detector, camera, location)
-analysis.subscribe(moving_bucket_avg)
+analysis.subscribe(moving_bucket_avg, asynchronous=True)
 
 nav.send_status_message("Shepard is online")
 
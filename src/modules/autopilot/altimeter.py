@@ -1,28 +1,164 @@
 from abc import ABC, abstractmethod
 from typing import Optional, List, Dict, Any
 
+import numpy as np
+
 
 class MovingAverage:
+    """
+    Average of the last `window_size` values added.
+
+    The values are kept in a preallocated ring buffer alongside their running
+    sum, so adding a value and getting the average are both O(1) whatever the
+    window size.
+    """
+
     def __init__(self, window_size=5):
+        if window_size < 1:
+            raise ValueError("window_size must be at least 1")
         self.window_size = window_size
-        self.values = []
+        self._buffer = np.zeros(window_size, dtype=np.float64)
+        self._index = 0  # Where the next value goes
+        self._count = 0
+        self._sum = 0.0
+
+    @property
+    def values(self) -> List[float]:
+        """The values in the window, oldest first"""
+        if self._count < self.window_size:
+            return self._buffer[:self._count].tolist()
+        return np.roll(self._buffer, -self._index).tolist()
 
     def add(self, value):
-        self.values.append(value)
-        if len(self.values) > self.window_size:
-            self.values.pop(0)
+        if self._count == self.window_size:
+            self._sum -= self._buffer[self._index]
+        else:
+            self._count += 1
+        self._buffer[self._index] = value
+        self._sum += value
+
+        self._index = (self._index + 1) % self.window_size
+        if self._index == 0:
+            # Re-sum once per pass over the buffer so rounding errors cannot build up
+            self._sum = float(self._buffer[:self._count].sum())
 
     def get_average(self):
-        if not self.values:
+        if self._count == 0:
             return None
-        return sum(self.values) / len(self.values)
+        return self._sum / self._count
 
     def is_valid(self):
-        return len(self.values) == self.window_size
+        return self._count == self.window_size
 
     def reset(self):
         """Clear all values"""
-        self.values = []
+        self._index = 0
+        self._count = 0
+        self._sum = 0.0
+
+
+class MovingMedian(MovingAverage):
+    """
+    Median of the last `window_size` values added, which ignores the odd
+    spurious reading entirely rather than averaging it in.
+    """
+
+    def get_average(self):
+        if self._count == 0:
+            return None
+        return float(np.median(self._buffer[:self._count]))
+
+
+class ExponentialMovingAverage(MovingAverage):
+    """
+    Exponentially weighted average, using constant time and memory.
+
+    `alpha` is the weight of each new value, by default 2 / (window_size + 1),
+    which has about the same lag as a MovingAverage of `window_size`. It is
+    valid once `window_size` values have been added.
+    """
+
+    def __init__(self, window_size=5, alpha=None):
+        if window_size < 1:
+            raise ValueError("window_size must be at least 1")
+        if alpha is None:
+            alpha = 2 / (window_size + 1)
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be between 0 and 1")
+        self.window_size = window_size
+        self.alpha = alpha
+        self._count = 0
+        self._average = 0.0
+
+    @property
+    def values(self) -> List[float]:
+        return [self._average] if self._count else []
+
+    def add(self, value):
+        if self._count == 0:
+            self._average = float(value)
+        else:
+            self._average += self.alpha * (value - self._average)
+        self._count = min(self._count + 1, self.window_size)
+
+    def get_average(self):
+        if self._count == 0:
+            return None
+        return self._average
+
+    def reset(self):
+        """Clear all values"""
+        self._count = 0
+        self._average = 0.0
+
+
+class OutlierRejectingAverage(MovingAverage):
+    """
+    MovingAverage which drops values more than `threshold` robust standard
+    deviations (from the median absolute deviation) away from the median of
+    a full window. `min_spread` puts a floor on the deviation, so that a
+    window of identical values does not reject every change.
+
+    If `max_rejections` values in a row are rejected, the readings have
+    genuinely moved on, so the window is restarted from the latest value.
+    """
+
+    # Converts a median absolute deviation to a standard deviation for normally distributed values
+    MAD_TO_STD = 1.4826
+
+    def __init__(self, window_size=5, threshold=3.0, min_spread=0.0, max_rejections=None):
+        super().__init__(window_size)
+        self.threshold = threshold
+        self.min_spread = min_spread
+        self.max_rejections = window_size if max_rejections is None else max_rejections
+        self.rejected = 0
+        self._consecutive_rejections = 0
+
+    def add(self, value) -> bool:
+        """
+        Adds `value` to the window unless it is an outlier.
+
+        Returns:
+            True if the value was added
+        """
+        if self.is_valid():
+            median = np.median(self._buffer)
+            spread = max(self.MAD_TO_STD * np.median(np.abs(self._buffer - median)), self.min_spread)
+            if abs(value - median) > self.threshold * spread:
+                self.rejected += 1
+                self._consecutive_rejections += 1
+                if self._consecutive_rejections < self.max_rejections:
+                    return False
+                super().reset()
+
+        self._consecutive_rejections = 0
+        super().add(value)
+        return True
+
+    def reset(self):
+        """Clear all values"""
+        super().reset()
+        self._consecutive_rejections = 0
 
 
 class Altimeter(ABC):
@@ -82,6 +218,17 @@ class Altimeter(ABC):
         """
         pass
 
+    def get_variance_mm2(self) -> Optional[float]:
+        """
+        Get the variance of the latest distance measurement in square millimeters.
+
+        Sensors which can estimate their own noise should override this.
+
+        Returns:
+            The variance in mm^2, or None if it is not known
+        """
+        return None
+
     def get_distance_m(self) -> Optional[float]:
         """
         Get the latest distance measurement in meters.
@@ -0,0 +1,192 @@
+import threading
+import time
+from typing import Optional, List, Dict, Any
+
+import numpy as np
+
+from src.modules.autopilot.altimeter import Altimeter
+
+
+class FusedAltimeter(Altimeter):
+    """
+    Fuses several Altimeter sensors into one altitude estimate.
+
+    Each sensor is measured on its own thread, as fast as it allows, and every
+    new reading is folded into a Kalman filter tracking altitude and vertical
+    speed. Between readings the estimate is predicted forward, so `measure`
+    gives a new altitude every `output_interval` seconds, faster than any one
+    sensor, along with its variance.
+
+    As it is an Altimeter itself, it can be passed to MavlinkAltimeterProvider
+    like any single sensor, which then publishes every `output_interval`
+    unless given its own rate.
+    """
+
+    def __init__(self, sensors: List[Altimeter], sensor_id: int = 0, output_interval: float = 0.02,
+                 acceleration_variance: float = 1e6, default_variance_mm2: float = 100.0 ** 2,
+                 gate: float = 5.0, max_age: float = 1.0):
+        """
+        Args:
+            sensors: The sensors to fuse
+            sensor_id: Unique ID for the fused sensor (used in MAVLink messages)
+            output_interval: Seconds between fused measurements
+            acceleration_variance: Variance of the vertical acceleration in (mm/s^2)^2, ie. how quickly the altitude
+                can change unexpectedly
+            default_variance_mm2: Variance of readings from sensors which do not report their own
+            gate: Readings more than this many standard deviations from the estimate are ignored
+            max_age: Seconds without any reading after which there is no estimate
+        """
+        if not sensors:
+            raise ValueError("FusedAltimeter needs at least one sensor")
+
+        super().__init__(sensor_id,
+                         min(sensor.min_distance_mm for sensor in sensors),
+                         max(sensor.max_distance_mm for sensor in sensors))
+        self.sensors = sensors
+        self.output_interval = output_interval
+        self.acceleration_variance = acceleration_variance
+        self.default_variance_mm2 = default_variance_mm2
+        self.gate = gate
+        self.max_age = max_age
+        self.rejected = 0
+
+        # Altitude (mm) and vertical speed (mm/s), their covariance, and the
+        # time.monotonic() they are for
+        self._x = np.zeros(2)
+        self._P = np.zeros((2, 2))
+        self._time: Optional[float] = None
+        self._last_update = 0.0
+        self._last_output = 0.0
+        self._lock = threading.Lock()
+
+        self._running = False
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def mavlink_sensor_type(self) -> int:
+        """Get the MAVLink sensor type (the first sensor's)"""
+        return self.sensors[0].mavlink_sensor_type
+
+    def begin(self) -> bool:
+        """Initialize every sensor and start measuring those which succeeded."""
+        if self._running:
+            return True
+
+        started = [sensor for sensor in self.sensors if sensor.begin()]
+        if not started:
+            return False
+
+        self._running = True
+        self._threads = [threading.Thread(target=self._sensor_loop, args=(sensor,), daemon=True)
+                         for sensor in started]
+        for thread in self._threads:
+            thread.start()
+        return True
+
+    def stop(self):
+        """Stop measuring the sensors."""
+        self._running = False
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+        self._threads = []
+
+    def measure(self) -> List[Dict[str, Any]]:
+        """
+        Wait for the next output time and give the fused altitude then.
+
+        Returns:
+            A single {'distance': mm, 'variance': mm^2} entry, or nothing if there is no estimate
+        """
+        delay = self._last_output + self.output_interval - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._last_output = time.monotonic()
+
+        distance = self.get_distance_mm()
+        variance = self.get_variance_mm2()
+        if distance is None or variance is None:
+            return []
+        return [{'distance': distance, 'variance': variance}]
+
+    def get_distance_mm(self) -> Optional[float]:
+        """Get the fused altitude, predicted to now, in millimeters"""
+        estimate = self._estimate(time.monotonic())
+        return float(estimate[0][0]) if estimate is not None else None
+
+    def get_variance_mm2(self) -> Optional[float]:
+        """Get the variance of the fused altitude, predicted to now, in mm^2"""
+        estimate = self._estimate(time.monotonic())
+        return float(estimate[1][0, 0]) if estimate is not None else None
+
+    def update(self, distance_mm: float, variance_mm2: Optional[float] = None,
+               timestamp: Optional[float] = None) -> bool:
+        """
+        Fold a reading into the estimate.
+
+        Args:
+            distance_mm: The reading in millimeters
+            variance_mm2: Its variance, or None to use `default_variance_mm2`
+            timestamp: The time.monotonic() it was taken, or now
+
+        Returns:
+            False if the reading was rejected as an outlier
+        """
+        if variance_mm2 is None:
+            variance_mm2 = self.default_variance_mm2
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        with self._lock:
+            if self._time is None or timestamp - self._last_update > self.max_age:
+                # (Re)start from this reading, with no idea of the vertical speed
+                self._x = np.array([distance_mm, 0.0])
+                self._P = np.diag([variance_mm2, 1e3 ** 2])
+                self._time = self._last_update = timestamp
+                return True
+
+            # Readings from slower sensors may be a little older than the
+            # estimate; treat them as current rather than rewinding
+            x, P = self._predict(max(timestamp, self._time))
+
+            innovation = distance_mm - x[0]
+            innovation_variance = P[0, 0] + variance_mm2
+            if innovation ** 2 > self.gate ** 2 * innovation_variance:
+                self.rejected += 1
+                return False
+
+            gain = P[:, 0] / innovation_variance
+            self._x = x + gain * innovation
+            self._P = P - np.outer(gain, P[0, :])
+            self._time = max(timestamp, self._time)
+            self._last_update = timestamp
+            return True
+
+    def _predict(self, timestamp: float):
+        """The estimate moved forward to `timestamp`, with a constant vertical speed."""
+        assert self._time is not None
+        dt = timestamp - self._time
+        F = np.array([[1.0, dt], [0.0, 1.0]])
+        Q = self.acceleration_variance * np.array([[dt ** 3 / 3, dt ** 2 / 2], [dt ** 2 / 2, dt]])
+        return F @ self._x, F @ self._P @ F.T + Q
+
+    def _estimate(self, timestamp: float):
+        with self._lock:
+            if self._time is None or timestamp - self._last_update > self.max_age:
+                return None
+            return self._predict(max(timestamp, self._time))
+
+    def _sensor_loop(self, sensor: Altimeter):
+        """Measures one sensor as fast as it allows, folding each reading in."""
+        while self._running:
+            try:
+                if not sensor.measure():
+                    time.sleep(0.01)
+                    continue
+
+                distance_mm = sensor.get_distance_mm()
+                if distance_mm is not None:
+                    self.update(distance_mm, sensor.get_variance_mm2())
+
+            except Exception as e:
+                print(f"Error measuring {type(sensor).__name__}: {e}")
+                time.sleep(0.5)
@@ -1,6 +1,6 @@
 import threading
 import time
-from typing import Optional
+from typing import Any, Optional
 
 from pymavlink import mavutil
 
@@ -11,27 +11,56 @@ class MavlinkAltimeterProvider:
     """
     A class to handle altitude measurements from any Altimeter sensor
     and send them to the Pixhawk via MAVLink.
+
+    Measuring and sending run on separate threads, so that slow sensor reads,
+    retries and resets never hold up the output. The sender publishes the
+    latest sample on a fixed schedule: samples older than `stale_timeout` are
+    still sent but with an unknown covariance, and once the latest sample is
+    older than `drop_timeout` nothing is sent, so that the flight controller
+    sees the rangefinder as unhealthy.
     """
 
-    def __init__(self, sensor: Altimeter, connection_string: str, update_rate_hz: float = 10.0):
+    # Covariance sent with stale samples, meaning unknown
+    COVARIANCE_UNKNOWN = 255
+
+    # Rate in Hz to send at for sensors which do not set their own
+    DEFAULT_UPDATE_RATE_HZ = 10.0
+
+    # Seconds to wait before measuring again after a failed measurement
+    RETRY_DELAY = 0.01
+    # Seconds to wait after an unexpected error from the sensor
+    ERROR_DELAY = 0.5
+
+    def __init__(self, sensor: Altimeter, connection_string: str, update_rate_hz: Optional[float] = None,
+                 stale_timeout: float = 0.5, drop_timeout: float = 2.0):
         """
         Initialize the MavlinkAltimeterProvider.
 
         Args:
             sensor: Altimeter sensor instance
             connection_string: MAVLink connection string (e.g., 'udp:127.0.0.1:14550')
-            update_rate_hz: Rate at which to send altitude updates (Hz)
+            update_rate_hz: Rate at which to send altitude updates (Hz). Defaults to the sensor's own output rate
+                (ie. FusedAltimeter's `output_interval`), or DEFAULT_UPDATE_RATE_HZ for sensors without one
+            stale_timeout: Age in seconds after which a sample is sent as stale
+            drop_timeout: Age in seconds after which a sample is no longer sent
         """
         self.sensor = sensor
         self.connection_string = connection_string
-        self.update_interval = 1.0 / update_rate_hz
-        self._latest_altitude_mm = None
-        self._latest_altitude_timestamp = 0
+        if update_rate_hz is not None:
+            self.update_interval = 1.0 / update_rate_hz
+        else:
+            self.update_interval = getattr(sensor, "output_interval", 1.0 / self.DEFAULT_UPDATE_RATE_HZ)
+        self.stale_timeout = stale_timeout
+        self.drop_timeout = drop_timeout
+        self._latest_altitude_mm: Optional[float] = None
+        self._latest_altitude_timestamp = 0.0  # time.monotonic() of the latest sample
+        self._latest_variance_mm2: Optional[float] = None
         self._running = False
-        self._thread = None
+        self._thread: Optional[threading.Thread] = None
+        self._publish_thread: Optional[threading.Thread] = None
         self._lock = threading.Lock()
-        self._mavlink_connection = None
-        self._tstart = None
+        self._mavlink_connection: Any = None
+        self._tstart = 0.0
 
     def start(self):
         """Start the altimeter thread."""
@@ -39,7 +68,7 @@ class MavlinkAltimeterProvider:
             return
 
         try:
-            self._tstart = time.time()
+            self._tstart = time.monotonic()
 
             # Initialize MAVLink connection
             self._mavlink_connection = mavutil.mavlink_connection(self.connection_string)
@@ -47,10 +76,12 @@ class MavlinkAltimeterProvider:
             self._mavlink_connection.wait_heartbeat()
             print(f"MAVLink connection established on {self.connection_string}")
 
-            # Start the measurement thread
+            # Start the measurement and publishing threads
             self._running = True
             self._thread = threading.Thread(target=self._measurement_loop, daemon=True)
+            self._publish_thread = threading.Thread(target=self._publish_loop, daemon=True)
             self._thread.start()
+            self._publish_thread.start()
             print("Altimeter measurement thread started")
 
         except Exception as e:
@@ -64,6 +95,8 @@ class MavlinkAltimeterProvider:
         self._running = False
         if self._thread:
             self._thread.join(timeout=2.0)
+        if self._publish_thread:
+            self._publish_thread.join(timeout=2.0)
         if self._mavlink_connection:
             self._mavlink_connection.close()
         print("Altimeter measurement thread stopped")
@@ -90,42 +123,82 @@ class MavlinkAltimeterProvider:
                 return self._latest_altitude_mm / 1000.0
             return None
 
+    def get_latest_age(self) -> Optional[float]:
+        """
+        Get the age of the latest altitude measurement in seconds.
+
+        Returns:
+            The age in seconds, or None if no valid measurement is available
+        """
+        with self._lock:
+            if self._latest_altitude_mm is None:
+                return None
+            return time.monotonic() - self._latest_altitude_timestamp
+
     def _measurement_loop(self):
-        """Continuous measurement loop that runs in a separate thread."""
+        """Measures as fast as the sensor allows, keeping the latest valid sample."""
         while self._running:
             try:
-                start_time = time.time()
-
-                # Get measurement from sensor
-                self.sensor.measure()
+                # Blocks for as long as the sensor takes, including any recovery
+                if not self.sensor.measure():
+                    time.sleep(self.RETRY_DELAY)
+                    continue
 
-                # Get the distance
                 distance_mm = self.sensor.get_distance_mm()
-
                 if distance_mm is not None:
-                    # Update the latest altitude
+                    variance_mm2 = self.sensor.get_variance_mm2()
                     with self._lock:
                         self._latest_altitude_mm = distance_mm
-                        self._latest_altitude_timestamp = time.time()
-
-                    # Send to Pixhawk via MAVLink
-                    self._send_distance_sensor_message(distance_mm)
-
-                # Sleep to maintain the desired update rate
-                elapsed = time.time() - start_time
-                sleep_time = max(0, self.update_interval - elapsed)
-                time.sleep(sleep_time)
+                        self._latest_altitude_timestamp = time.monotonic()
+                        self._latest_variance_mm2 = variance_mm2
 
             except Exception as e:
                 print(f"Error in measurement loop: {e}")
-                time.sleep(0.5)
+                time.sleep(self.ERROR_DELAY)
+
+    def _publish_loop(self):
+        """Sends the latest sample at a fixed rate, whatever the sensor is doing."""
+        next_time = time.monotonic()
+        while self._running:
+            self._publish()
+
+            # Keep to the schedule, skipping any slots which have been missed
+            # rather than sending a burst to catch up
+            next_time += self.update_interval
+            now = time.monotonic()
+            if next_time < now:
+                next_time = now + self.update_interval - (now - next_time) % self.update_interval
+            time.sleep(next_time - now)
+
+    def _publish(self):
+        """Sends the latest sample, marked as stale if it is old."""
+        with self._lock:
+            distance_mm = self._latest_altitude_mm
+            timestamp = self._latest_altitude_timestamp
+            variance_mm2 = self._latest_variance_mm2
+        if distance_mm is None:
+            return
+
+        age = time.monotonic() - timestamp
+        if age > self.drop_timeout:
+            return
+
+        if age > self.stale_timeout:
+            covariance = self.COVARIANCE_UNKNOWN
+        elif variance_mm2 is None:
+            covariance = 0
+        else:
+            # In cm^2, keeping clear of the unknown value
+            covariance = min(int(round(variance_mm2 / 100)), self.COVARIANCE_UNKNOWN - 1)
+        self._send_distance_sensor_message(distance_mm, covariance)
 
-    def _send_distance_sensor_message(self, distance_mm: float):
+    def _send_distance_sensor_message(self, distance_mm: float, covariance: int = 0):
         """
         Send a DISTANCE_SENSOR MAVLink message to the Pixhawk.
 
         Args:
             distance_mm: Distance measurement in millimeters
+            covariance: Measurement variance in cm^2, or COVARIANCE_UNKNOWN
         """
         if not self._mavlink_connection:
             return
@@ -137,14 +210,14 @@ class MavlinkAltimeterProvider:
             # Create and send the DISTANCE_SENSOR message
             # Documentation: https://mavlink.io/en/messages/common.html#DISTANCE_SENSOR
             self._mavlink_connection.mav.distance_sensor_send(
-                int((time.time() - self._tstart) * 1000),  # time_boot_ms
+                int((time.monotonic() - self._tstart) * 1000),  # time_boot_ms
                 self.sensor.min_distance_cm,  # min_distance (cm)
                 self.sensor.max_distance_cm,  # max_distance (cm)
                 distance_cm,  # current_distance (cm)
                 self.sensor.mavlink_sensor_type,  # type (from sensor)
                 self.sensor.sensor_id,  # id (unique ID for this sensor)
                 mavutil.mavlink.MAV_SENSOR_ROTATION_PITCH_270,  # orientation (downward facing)
-                0,  # covariance
+                covariance,  # covariance
             )
 
         except Exception as e:
@@ -0,0 +1,79 @@
+from typing import Optional, List, Dict, Any
+
+import numpy as np
+
+from src.modules.autopilot.altimeter import Altimeter
+from src.modules.imaging.camera import OakdCamera
+
+
+class OakdAltimeter(Altimeter):
+    """
+    Uses a downward facing OAK-D as an altimeter, taking the median depth of
+    the middle of its point cloud.
+
+    The camera must have been started. Every measurement takes a capture, so
+    this should own the camera rather than share it with the imaging code.
+    """
+
+    # Converts a median absolute deviation to a standard deviation for normally distributed values
+    MAD_TO_STD = 1.4826
+
+    def __init__(self, camera: OakdCamera, sensor_id: int = 1, roi: float = 0.2, min_distance: int = 300,
+                 max_distance: int = 20000, min_valid: float = 0.25):
+        """
+        Args:
+            camera: The OAK-D to measure with
+            sensor_id: Unique ID for this sensor (used in MAVLink messages)
+            roi: Fraction of the image's width and height, around the middle, to measure
+            min_distance: Minimum measurable distance in millimeters
+            max_distance: Maximum measurable distance in millimeters
+            min_valid: Fraction of the region which must have a depth for the measurement to count
+        """
+        super().__init__(sensor_id, min_distance, max_distance)
+        self.camera = camera
+        self.roi = roi
+        self.min_valid = min_valid
+        self._distance_mm: Optional[float] = None
+        self._variance_mm2: Optional[float] = None
+
+    @property
+    def mavlink_sensor_type(self) -> int:
+        """Get the MAVLink sensor type (UNKNOWN, as there is none for stereo vision)"""
+        return self.SENSOR_TYPE_UNKNOWN
+
+    def begin(self) -> bool:
+        """Check the camera has been started."""
+        return getattr(self.camera, "device", None) is not None and not self.camera.device.isClosed()
+
+    def measure(self) -> List[Dict[str, Any]]:
+        """
+        Capture a depth frame and measure the median depth of its middle.
+
+        Returns:
+            A single {'distance': mm, 'variance': mm^2} entry, or nothing if too little of the region has a depth
+        """
+        capture = self.camera.capture_with_depth()
+        points = capture.points
+
+        rows = int(capture.height * self.roi / 2)
+        cols = int(capture.width * self.roi / 2)
+        middle_y, middle_x = capture.height // 2, capture.width // 2
+        depth = points[middle_y - rows:middle_y + rows + 1, middle_x - cols:middle_x + cols + 1, 2].ravel()
+
+        valid = depth[(depth >= self.min_distance_mm) & (depth <= self.max_distance_mm)]
+        if len(valid) < self.min_valid * len(depth):
+            return []
+
+        distance = float(np.median(valid))
+        spread = self.MAD_TO_STD * float(np.median(np.abs(valid - distance)))
+        self._distance_mm = distance
+        self._variance_mm2 = spread ** 2
+        return [{'distance': distance, 'variance': self._variance_mm2}]
+
+    def get_distance_mm(self) -> Optional[float]:
+        """Get the latest distance measurement in millimeters"""
+        return self._distance_mm
+
+    def get_variance_mm2(self) -> Optional[float]:
+        """Get the spread of depths in the latest measurement, in mm^2"""
+        return self._variance_mm2
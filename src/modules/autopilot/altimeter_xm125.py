@@ -41,6 +41,11 @@ class XM125(Altimeter):
     REG_COMMAND = 0x0100
     REG_REFLECTOR_SHAPE = 0x004b
 
+    # Number of peak distance (and strength) registers
+    PEAK_COUNT = 10
+    # REG_DISTANCE_RESULT followed by every peak distance and strength, read in one transaction
+    RESULT_BLOCK_SIZE = 1 + 2 * PEAK_COUNT
+
     # Command values
     CMD_APPLY_CONFIG_AND_CALIBRATE = 1
     CMD_MEASURE_DISTANCE = 2
@@ -62,10 +67,23 @@ class XM125(Altimeter):
     RETRY_DELAY = 0.5  # seconds
     ERROR_TIMEOUT = 5.0  # seconds
 
-    def __init__(self, sensor_id=0, min_distance=250, max_distance=10000, bus=1, address=0x52, average_window=5):
+    # Busy polling
+    BUSY_TIMEOUT = 1.0  # seconds
+    POLL_INTERVAL = 0.01  # seconds
+    CONTINUOUS_POLL_INTERVAL = 0.002  # seconds
+
+    def __init__(self, sensor_id=0, min_distance=250, max_distance=10000, bus=1, address=0x52, average_window=5,
+                 continuous=False):
+        """
+        Args:
+            continuous: Start the next measurement as soon as the last one has been read, so that the sensor
+                measures while the result is being used rather than only when `measure` is called
+        """
         super().__init__(sensor_id, min_distance, max_distance)
         self.bus = smbus2.SMBus(bus)
         self.address = address
+        self.continuous = continuous
+        self._measurement_pending = False
         self.distance_avg = MovingAverage(average_window)
         self.strength_avg = MovingAverage(average_window)
         self.last_error_time = 0
@@ -86,24 +104,33 @@ class XM125(Altimeter):
 
     def _read_register(self, reg_addr) -> Optional[int]:
         """Read a 32-bit register value with error handling."""
+        values = self._read_registers(reg_addr, 1)
+        return values[0] if values is not None else None
+
+    def _read_registers(self, reg_addr, count) -> Optional[List[int]]:
+        """
+        Read `count` consecutive 32-bit registers in a single I2C transaction
+        (the sensor increments the register address as it is read), with
+        error handling.
+        """
         try:
             write = smbus2.i2c_msg.write(self.address, [(reg_addr >> 8) & 0xFF, reg_addr & 0xFF])
-            read = smbus2.i2c_msg.read(self.address, 4)
+            read = smbus2.i2c_msg.read(self.address, 4 * count)
 
             if DEBUG:
                 print(f"\nREAD OPERATION:")
-                print(f"  Register: 0x{reg_addr:04x}")
+                print(f"  Register: 0x{reg_addr:04x} (x{count})")
                 print(f"  Sending address bytes: MSB=0x{(reg_addr >> 8) & 0xFF:02x}, LSB=0x{reg_addr & 0xFF:02x}")
 
             self.bus.i2c_rdwr(write, read)
-            data = list(read)
-            value = (data[0] << 24) | (data[1] << 16) | (data[2] << 8) | data[3]
+            data = bytes(read)
+            values = [int.from_bytes(data[i:i + 4], "big") for i in range(0, len(data), 4)]
 
             if DEBUG:
-                print(f"  Received bytes: [0x{data[0]:02x}, 0x{data[1]:02x}, 0x{data[2]:02x}, 0x{data[3]:02x}]")
-                print(f"  Decoded value: 0x{value:08x} ({value})")
+                print(f"  Received bytes: {[f'0x{b:02x}' for b in data]}")
+                print(f"  Decoded values: {[f'0x{value:08x}' for value in values]}")
 
-            return value
+            return values
         except IOError as e:
             self._handle_error(f"I/O error reading register 0x{reg_addr:04x}: {e}")
             return None
@@ -159,12 +186,12 @@ class XM125(Altimeter):
 
         time.sleep(self.RETRY_DELAY)
 
-    def _wait_not_busy(self):
+    def _wait_not_busy(self, poll_interval=POLL_INTERVAL):
         """Wait until the detector is not busy."""
         if DEBUG:
             print("\nWaiting for detector not busy...")
 
-        attempts = 0
+        deadline = time.monotonic() + self.BUSY_TIMEOUT
         while True:
             status = self._read_register(self.REG_DETECTOR_STATUS)
             if status is None:
@@ -179,12 +206,11 @@ class XM125(Altimeter):
             if not busy:
                 break
 
-            time.sleep(0.01)
-            attempts += 1
-            if attempts >= 100:  # Timeout after 1 second
+            if time.monotonic() >= deadline:
                 if DEBUG:
                     print("  Timeout waiting for not busy")
                 break
+            time.sleep(poll_interval)
 
     def begin(self) -> bool:
         """Initialize the sensor with given start and end distances in mm."""
@@ -242,6 +268,7 @@ class XM125(Altimeter):
             # Clear averaging buffers
             self.distance_avg.reset()
             self.strength_avg.reset()
+            self._measurement_pending = False
 
             # Reinitialize
             if not self.begin():
@@ -261,59 +288,73 @@ class XM125(Altimeter):
             return False
 
         if result & self.DISTANCE_RESULT_CALIBRATION_NEEDED:
-            print("Calibration needed, recalibrating...")
-            self._write_register(self.REG_COMMAND, self.CMD_RECALIBRATE)
-            time.sleep(0.5)
-            self.state = SensorState.INITIALIZED
-            return True
+            self._recalibrate()
 
         return True
 
+    def _recalibrate(self):
+        print("Calibration needed, recalibrating...")
+        self._write_register(self.REG_COMMAND, self.CMD_RECALIBRATE)
+        time.sleep(0.5)
+        self._measurement_pending = False
+        self.state = SensorState.INITIALIZED
+
     def measure(self) -> List[Dict[str, Any]]:
-        """Perform a distance measurement with error checking and recovery."""
+        """
+        Perform a distance measurement with error checking and recovery.
+
+        The result and every peak are read in one transaction, and calibration
+        is only redone when a result says it is needed. In continuous mode,
+        the next measurement is started as soon as the result has been read.
+        """
         try:
             if self.state == SensorState.ERROR:
                 self.reset_and_recalibrate()
 
-            if not self.check_calibration():
-                return []
+            # Start measurement, unless it was already started after the last read
+            if not self._measurement_pending:
+                if not self._write_register(self.REG_COMMAND, self.CMD_MEASURE_DISTANCE):
+                    return []
 
-            # Start measurement
-            if not self._write_register(self.REG_COMMAND, self.CMD_MEASURE_DISTANCE):
-                return []
-
-            self._wait_not_busy()
+            self._wait_not_busy(self.CONTINUOUS_POLL_INTERVAL if self.continuous else self.POLL_INTERVAL)
 
             # Read result
-            result = self._read_register(self.REG_DISTANCE_RESULT)
-            if result is None:
+            block = self._read_registers(self.REG_DISTANCE_RESULT, self.RESULT_BLOCK_SIZE)
+            self._measurement_pending = False
+            if block is None:
+                return []
+            result = block[0]
+
+            if result & self.DISTANCE_RESULT_CALIBRATION_NEEDED:
+                self._recalibrate()
                 return []
 
+            if self.continuous:
+                self._measurement_pending = self._write_register(self.REG_COMMAND, self.CMD_MEASURE_DISTANCE)
+
             if result & self.DISTANCE_RESULT_MEASURE_DISTANCE_ERROR:
                 self._handle_error("Measurement error")
                 return []
 
-            num_distances = (result & self.DISTANCE_RESULT_NUM_DISTANCES_MASK)
+            num_distances = min(result & self.DISTANCE_RESULT_NUM_DISTANCES_MASK, self.PEAK_COUNT)
+            distances = block[1:1 + num_distances]
+            strengths = block[1 + self.PEAK_COUNT:1 + self.PEAK_COUNT + num_distances]
             peaks_with_average = []
 
-            for i in range(num_distances):
-                distance = self._read_register(self.REG_PEAK0_DISTANCE + i)
-                strength = self._read_register(self.REG_PEAK0_STRENGTH + i)
-
-                if distance is not None and strength is not None:
-                    # Convert strength from 32-bit unsigned to signed int
-                    if strength > 0x7FFFFFFF:
-                        strength = int(0x100000000 - strength)
+            for distance, strength in zip(distances, strengths):
+                # Convert strength from 32-bit unsigned to signed int
+                if strength > 0x7FFFFFFF:
+                    strength = int(0x100000000 - strength)
 
-                    self.distance_avg.add(distance)
-                    self.strength_avg.add(strength)
+                self.distance_avg.add(distance)
+                self.strength_avg.add(strength)
 
-                    peak_data = {
-                        'raw': (distance, strength),
-                        'averaged': (self.distance_avg.get_average(),
-                                     self.strength_avg.get_average()) if self.distance_avg.is_valid() else None
-                    }
-                    peaks_with_average.append(peak_data)
+                peak_data = {
+                    'raw': (distance, strength),
+                    'averaged': (self.distance_avg.get_average(),
+                                 self.strength_avg.get_average()) if self.distance_avg.is_valid() else None
+                }
+                peaks_with_average.append(peak_data)
 
             # Only reset consecutive errors if we got valid data
             if peaks_with_average:
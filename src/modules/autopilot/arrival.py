@@ -0,0 +1,107 @@
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+import threading
+
+
+class _Target:
+    """
+    A pending arrival. `distance` gives the distance in meters left to the
+    target from a vehicle location.
+    """
+
+    def __init__(self, future: Future, distance: Callable, tolerance: float):
+        self.future = future
+        self.distance = distance
+        self.tolerance = tolerance
+        self.timer: Optional[threading.Timer] = None
+
+
+class ArrivalMonitor:
+    """
+    Resolves futures once the vehicle arrives at its targets.
+
+    Instead of each command polling the vehicle's position, a single monitor
+    listens for the vehicle's location updates (through dronekit's attribute
+    listeners) and checks every pending target as soon as new telemetry
+    arrives.
+
+    A target's future resolves to True once the vehicle is within its
+    tolerance, or to False if it times out or the vehicle leaves GUIDED mode
+    (ie. the pilot took over, or it is returning to launch).
+    """
+
+    def __init__(self, vehicle):
+        self.vehicle = vehicle
+        self._targets: List[_Target] = []
+        self._lock = threading.Lock()
+
+        vehicle.add_attribute_listener("location.global_relative_frame", self._on_location)
+        vehicle.add_attribute_listener("mode", self._on_mode)
+
+    def watch(self, distance: Callable, tolerance: float, timeout: Optional[float] = None) -> Future:
+        """
+        Returns a future which resolves once `distance(location)` is within
+        `tolerance` meters for the vehicle's location, or after `timeout`
+        seconds if given.
+        """
+        future: Future = Future()
+        future.set_running_or_notify_cancel()
+        target = _Target(future, distance, tolerance)
+
+        if self.vehicle.mode.name != "GUIDED":
+            future.set_result(False)
+            return future
+
+        if timeout is not None:
+            target.timer = threading.Timer(timeout, self._resolve, (target, False))
+            target.timer.daemon = True
+            target.timer.start()
+
+        with self._lock:
+            self._targets.append(target)
+
+        # The vehicle may already be there
+        self._check(self.vehicle.location.global_relative_frame)
+        return future
+
+    def cancel_all(self):
+        """
+        Resolve every pending target as not reached.
+        """
+        with self._lock:
+            targets = list(self._targets)
+        for target in targets:
+            self._resolve(target, False)
+
+    @property
+    def pending(self) -> int:
+        return len(self._targets)
+
+    def _on_location(self, _vehicle, _name, location):
+        self._check(location)
+
+    def _on_mode(self, _vehicle, _name, mode):
+        if mode.name != "GUIDED":
+            self.cancel_all()
+
+    def _check(self, location):
+        if location is None:
+            return
+
+        with self._lock:
+            targets = list(self._targets)
+        for target in targets:
+            if target.distance(location) <= target.tolerance:
+                self._resolve(target, True)
+
+    def _resolve(self, target: _Target, arrived: bool):
+        with self._lock:
+            if target not in self._targets:
+                return  # Already resolved
+            self._targets.remove(target)
+
+        if target.timer is not None:
+            target.timer.cancel()
+        if not target.future.done():
+            target.future.set_result(arrived)
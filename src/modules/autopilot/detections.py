@@ -0,0 +1,109 @@
+from collections import defaultdict
+from typing import DefaultDict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class Track:
+    """
+    A single target, made of every sighting merged into it. Keeps a running
+    mean and covariance of the sighting positions (Welford's algorithm), so
+    adding a sighting is constant time however many there have been.
+    """
+
+    def __init__(self, track_id: int, position: np.ndarray):
+        self.id = track_id
+        self.count = 1
+        self.mean = position.copy()
+        self._m2 = np.zeros((len(position), len(position)))
+
+    def add(self, position: np.ndarray):
+        self.count += 1
+        delta = position - self.mean
+        self.mean += delta / self.count
+        self._m2 += np.outer(delta, position - self.mean)
+
+    @property
+    def covariance(self) -> np.ndarray:
+        """
+        Sample covariance of the sightings, zero until there are two.
+        """
+        if self.count < 2:
+            return np.zeros_like(self._m2)
+        return self._m2 / (self.count - 1)
+
+
+class DetectionRegistry:
+    """
+    Deduplicates detections in the local NED frame. A sighting within `radius`
+    meters (horizontally) of an existing track is merged into it, otherwise it
+    starts a new track.
+
+    Tracks are binned into a uniform grid of `radius` sized cells, so a
+    sighting only needs comparing against the tracks in the 3x3 cells around
+    it rather than every track seen so far.
+    """
+
+    def __init__(self, radius: float):
+        if radius <= 0:
+            raise ValueError("radius must be positive")
+        self.radius = radius
+        self.tracks: List[Track] = []
+        self._grid: DefaultDict[Tuple[int, int], List[Track]] = defaultdict(list)
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def _cell(self, position: np.ndarray) -> Tuple[int, int]:
+        return (int(np.floor(position[0] / self.radius)), int(np.floor(position[1] / self.radius)))
+
+    def nearest(self, position: Sequence[float]) -> Optional[Track]:
+        """
+        Returns the closest track within `radius` of `position`, or None.
+        """
+        point = np.asarray(position, dtype=np.float64)
+        i, j = self._cell(point)
+
+        best, best_distance = None, self.radius
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                for track in self._grid.get((i + di, j + dj), ()):
+                    distance = float(np.hypot(*(track.mean[:2] - point[:2])))
+                    if distance <= best_distance:
+                        best, best_distance = track, distance
+        return best
+
+    def add(self, position: Sequence[float]) -> Tuple[Track, bool]:
+        """
+        Records a sighting at `position` (north, east[, down]).
+
+        :return: The track it was merged into, and whether that track is new.
+        """
+        point = np.asarray(position, dtype=np.float64)
+        track = self.nearest(position)
+
+        if track is None:
+            track = Track(len(self.tracks), point)
+            self.tracks.append(track)
+            self._grid[self._cell(point)].append(track)
+            return track, True
+
+        # The mean may drift into a neighbouring cell
+        old_cell = self._cell(track.mean)
+        track.add(point)
+        new_cell = self._cell(track.mean)
+        if new_cell != old_cell:
+            self._grid[old_cell].remove(track)
+            if not self._grid[old_cell]:
+                del self._grid[old_cell]
+            self._grid[new_cell].append(track)
+        return track, False
+
+    def targets(self) -> np.ndarray:
+        """
+        Returns the mean position of every track, in the order they were
+        first seen.
+        """
+        if not self.tracks:
+            return np.zeros((0, 2))
+        return np.array([track.mean for track in self.tracks])
@@ -0,0 +1,87 @@
+from typing import Sequence, Tuple
+
+import numpy as np
+
+
+class Geofence:
+    """
+    A polygonal geofence, given as a list of (x, y) vertices in order around
+    the polygon. The polygon is closed automatically if the last vertex is not
+    the same as the first.
+
+    The edges are preprocessed into arrays once, so queries are cheap and can
+    be made for many points at once (ie. a whole search route).
+    """
+
+    def __init__(self, vertices: Sequence[Tuple[float, float]]):
+        polygon = np.asarray(vertices, dtype=np.float64).reshape(-1, 2)
+        if len(polygon) > 1 and np.array_equal(polygon[0], polygon[-1]):
+            polygon = polygon[:-1]
+        if len(polygon) < 3:
+            raise ValueError("A geofence needs at least 3 vertices")
+
+        self.vertices = polygon
+
+        # Edge i goes from _start[i] to _start[i] + _delta[i]
+        self._start = polygon
+        self._delta = np.roll(polygon, -1, axis=0) - polygon
+        self._length_sq = np.einsum("ij,ij->i", self._delta, self._delta)
+
+        # dx/dy of each edge, for finding where a horizontal ray crosses it.
+        # Horizontal edges are never crossed, so their slope does not matter.
+        dy = self._delta[:, 1]
+        self._inv_slope = np.divide(self._delta[:, 0], dy, out=np.zeros_like(dy), where=dy != 0)
+
+    def contains(self, point: Tuple[float, float]) -> bool:
+        """
+        Returns True if `point` is inside the geofence.
+        """
+        return bool(self.contains_many([point])[0])
+
+    def contains_many(self, points) -> np.ndarray:
+        """
+        Returns whether each of the N `points` is inside the geofence, as an
+        array of N bools.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        x = points[:, 0, np.newaxis]
+        y = points[:, 1, np.newaxis]
+
+        # Cast a ray from each point towards +x and count the edges it crosses
+        start_y = self._start[:, 1]
+        end_y = start_y + self._delta[:, 1]
+        spans = (start_y > y) != (end_y > y)
+        crossing_x = self._start[:, 0] + (y - start_y) * self._inv_slope
+        crossings = np.count_nonzero(spans & (x < crossing_x), axis=1)
+
+        return crossings % 2 == 1
+
+    def signed_distance(self, point: Tuple[float, float]) -> float:
+        """
+        Returns the distance from `point` to the nearest edge of the geofence,
+        positive if the point is inside and negative if it is outside.
+        """
+        return float(self.signed_distance_many([point])[0])
+
+    def signed_distance_many(self, points) -> np.ndarray:
+        """
+        `signed_distance` for each of the N `points`.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+
+        # Project each point onto every edge, clamped to the edge's ends
+        offset = points[:, np.newaxis, :] - self._start[np.newaxis, :, :]
+        t = np.einsum("nij,ij->ni", offset, self._delta) / self._length_sq
+        t = np.clip(t, 0, 1)
+        nearest = offset - t[:, :, np.newaxis] * self._delta[np.newaxis, :, :]
+        distance = np.sqrt(np.min(np.einsum("nij,nij->ni", nearest, nearest), axis=1))
+
+        return np.where(self.contains_many(points), distance, -distance)
+
+    def clip_route(self, route, margin: float = 0.0) -> np.ndarray:
+        """
+        Returns the waypoints of `route` which are inside the geofence by at
+        least `margin`, in their original order.
+        """
+        route = np.asarray(route, dtype=np.float64).reshape(-1, 2)
+        return route[self.signed_distance_many(route) >= margin]
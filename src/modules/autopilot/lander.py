@@ -1,8 +1,13 @@
 import time
 
+import numpy as np
 from pymavlink import mavutil
 
+from src.modules.autopilot.detections import DetectionRegistry
+from src.modules.autopilot.geofence import Geofence
 from src.modules.autopilot.navigator import Navigator
+from src.modules.autopilot.route import coverage_step, spiral_route
+from src.modules.autopilot.waypoints import WaypointStreamer
 from src.modules import imaging
 import math
 
@@ -15,6 +20,9 @@ class Lander:
     HORIZONTAL_ANGLE = math.radians(30)
     VERTICAL_ANGLE = math.radians(24)
 
+    # Seconds between search setpoint updates
+    SEARCH_UPDATE_INTERVAL = 0.1
+
     def __init__(self, nav, max_velocity, geofence):
         self.__spiral_route = []  # Private attribute
         self.__bounding_box_pos = []
@@ -26,88 +34,37 @@ class Lander:
         self.max_velocity = max_velocity
         self.bounding_box_detected = False
         self.bounding_box_pos = []
-        self.bounding_box_log = []
-        self.bounding_box_log_og = []
         self.leave_frame = False
+        if geofence is not None and not isinstance(geofence, Geofence):
+            geofence = Geofence(geofence)
         self.geofence = geofence
 
         self.null_radius = 10  # Radius in METERS of bounding box detection being ignored
+        self.detections = DetectionRegistry(self.null_radius)
 
     @property
     def route(self):
         return self.__spiral_route
 
-    def generateSpiralSearch(self, numberOfLoops=10):
+    def generateSpiralSearch(self, numberOfLoops=10, altitude=None, overlap=0.2):
         """
-        Generate a landing route in a square spiral pattern. The generated route is to be multiplied by the current height in metres
-        to get the relative distance traveled in metres.
+        Generate a landing route in a square spiral pattern, as offsets in metres from the start of the search.
+
+        If `altitude` is given, the spacing between passes is chosen from the camera's field of view so that the
+        ground seen on each pass overlaps the next by `overlap`. Otherwise passes are 5 m apart.
 
         :param numberOfLoops: The number of loops to be made, with a default value of 10
+        :param altitude: The altitude of the search in metres
+        :param overlap: The fraction of the camera's view shared by neighbouring passes
         :return: None
         """
 
-        self.__spiral_route = []  # Clear the existing route
-        self.y, self.x = 0, 0
-
-        # verticalScanRatio = math.tan(Lander.VERTICAL_ANGLE)
-        # horizontalScanRatio = math.tan(Lander.HORIZONTAL_ANGLE)
-
-        step_size = 5
-
-        steps_per_side = 2
-        curr_side_iter = 0
-        loops_completed = 0
-
-        axis = "x"
-
-        dir_x = 1
-        dir_y = 1
-
-        x, y = 0, 0
-
-        while loops_completed != numberOfLoops:
-            if axis == "x":
-                x += dir_x * step_size
-                for i in range(steps_per_side):
-                    if len(self.__spiral_route) > 0:
-                        last_x = self.__spiral_route[-1][0]
-                        last_y = self.__spiral_route[-1][1]
-                    else:
-                        last_x = 0
-                        last_y = 0
-
-                    self.__spiral_route.append((x + last_x, y + last_y))
-
-                axis = "y"
-                dir_x *= -1
-            elif axis == "y":
-                y += dir_y * step_size
-
-                for i in range(steps_per_side):
-                    if len(self.__spiral_route) > 0:
-                        last_x = self.__spiral_route[-1][0]
-                        last_y = self.__spiral_route[-1][1]
-                    else:
-                        last_x = 0
-                        last_y = 0
-
-                    self.__spiral_route.append((x + last_x, y + last_y))
-
-                axis = "x"
-                dir_y *= -1
-
-            curr_side_iter += 1
-
-            if curr_side_iter % 2 == 0:
-                steps_per_side += 1
-
-            if curr_side_iter % 5 == 0:
-                loops_completed += 1
+        if altitude is None:
+            step_size = 5
+        else:
+            step_size = coverage_step(altitude, Lander.HORIZONTAL_ANGLE, Lander.VERTICAL_ANGLE, overlap)
 
-            self.x = x
-            self.y = y
-            x = 0
-            y = 0
+        self.__spiral_route = [tuple(point) for point in spiral_route(step_size, numberOfLoops).tolist()]
 
     '''
     def executeSearch(self, altitude):
@@ -169,56 +126,46 @@ class Lander:
         (location.north, location.east, location.down)
         to always face inwards, always face the origin
         '''
-        type_mask = self.nav.generate_typemask([0, 1])
-        i = 0
         origin = self.nav.get_local_position_ned()
+
+        # NOTE: THESE ARE ABSOLUTE COORDINATES
+        # Spiral search is in absolute coordinates in which it adds the offset to the origin
+        route = self.__spiral_route
+        waypoints = [(x + origin[0] - (route[4][0] / 2), y + origin[1] - (route[9][1] / 2), -altitude)
+                     for x, y in route]
+        streamer = WaypointStreamer(self.nav, waypoints, speed=self.max_velocity)
         try:
-            while i <= len(self.__spiral_route) - 1:
+            while not streamer.done:
                 current_local_pos = self.nav.get_local_position_ned()
                 if self.bounding_box_detected:
                     print(self.bounding_box_pos)
                     new_x, new_y = self.bounding_box_pos[0], self.bounding_box_pos[1]
-                    if len(self.bounding_box_log) == 0:
-                        self.bounding_box_log.append((new_x, new_y))
-                        self.bounding_box_log_og.append((new_x + current_local_pos[0], new_y + current_local_pos[1]))
-                    print(self.bounding_box_log)
-                    for bounding_box in self.bounding_box_log:
-                        delta_x = bounding_box[0] - new_x - current_local_pos[0]
-                        delta_y = bounding_box[1] - new_y - current_local_pos[1]
-
-                        if math.sqrt((delta_x ** 2) + (delta_y ** 2)) >= self.null_radius:
-                            self.boundingBoxAction()
-                            time.sleep(2 / (self.max_velocity))
-                            break
+                    track, new = self.detections.add((new_x + current_local_pos[0], new_y + current_local_pos[1]))
+                    print(f"Detection {track.id} seen {track.count} times at {track.mean}")
+
+                    # Only go and look at targets which have not been seen before
+                    if new:
+                        self.boundingBoxAction()
+                        time.sleep(2 / (self.max_velocity))
                     self.bounding_box_detected = False
                 else:
-                    # NOTE: THESE ARE ABSOLUTE COORDINATES
-                    # Spiral search is in absolute coordinates in which it adds the offset to the origin
-                    self.nav.set_position_target_local_ned(x = self.__spiral_route[i][0] + origin[0] - (self.__spiral_route[4][0] / 2),
-                                                           y = self.__spiral_route[i][1] + origin[1] - (self.__spiral_route[9][1] / 2),
-                                                           z = -altitude,
-                                                           type_mask=type_mask,
-                                                           coordinate_frame = mavutil.mavlink.MAV_FRAME_LOCAL_NED)
-
-                    i += 1
-
-                    # Increase if the drone is overriding itself or moving too quickly
-                    # Decrease if there is more "stop, start" than desirable
-                    time.sleep(1.5 / (self.max_velocity))
-
-            print(self.bounding_box_log_og)
+                    # Setpoints follow the vehicle's position, so they only need
+                    # to be refreshed about as often as the position is
+                    streamer.update(current_local_pos)
+                    time.sleep(self.SEARCH_UPDATE_INTERVAL)
         finally:
-            return self.bounding_box_log_og
+            targets = [tuple(target) for target in self.detections.targets()]
+            print(f"Search found {len(targets)} targets: {targets}")
+            return targets
 
     def boundingBoxAction(self):
         # go to bounding box and go around it in a square
         type_mask = self.nav.generate_typemask([0, 1])
 
-        current_local_pos = self.nav.get_local_position_ned()
         time.sleep(1)
 
         x, y = self.bounding_box_pos[0], self.bounding_box_pos[1]
-        if self.geofence_check((x + 2, y)) and self.geofence_check((x, y + 2)) and self.geofence_check((x + 2, y + 2)):
+        if self.geofence_check_many([(x + 2, y), (x, y + 2), (x + 2, y + 2)]).all():
             self.nav.set_position_target_local_ned(x = x,
                                                    y = y,
                                                    type_mask=type_mask,
@@ -259,8 +206,6 @@ class Lander:
             time.sleep((math.sqrt(x ** 2 + y ** 2) / (self.max_velocity)))
 
         self.bounding_box_detected = False
-        self.bounding_box_log.append((x, y))
-        self.bounding_box_log_og.append((x + current_local_pos[0], y + current_local_pos[1]))
 
     def detectBoundingBox(self, _, bounding_box_pos):
         if bounding_box_pos:
@@ -273,28 +218,21 @@ class Lander:
                 self.leave_frame = False
 
     def geofence_check(self, point):
-        # Adapted from code provided by Aiden
-        #lat, lon, alt = self.nav.get_global_position()
-        lat, lon = point[1], point[0]
-        hitcount = 0
-        for i in range(len(self.geofence) - 1):
-            # Model geofence lines as y = mx + b
-            A = self.geofence[i]
-            B = self.geofence[i + 1]
-
-            m = (B[1] - A[1]) / (B[0] - A[0])
-
-            # Handling the case of delta_lon == 0
-            if abs(m) == float('inf'):
-                m = (B[1] - A[1]) / (B[0] - A[0] + 0.00000001)
-
-            b = A[0] - m * A[0]
-
-            x = (lat - b) / m
+        """
+        Returns True if `point` (x, y) is inside the geofence, or if there is
+        no geofence.
+        """
+        if self.geofence is None:
+            return True
+        return self.geofence.contains(point)
 
-            if x > lon and lat > min(A[1], B[1]) and lat < max(A[1], B[1]):
-                hitcount += 1
-        return bool(hitcount & 1)
+    def geofence_check_many(self, points):
+        """
+        `geofence_check` for many points at once, returning an array of bools.
+        """
+        if self.geofence is None:
+            return np.ones(len(points), dtype=bool)
+        return self.geofence.contains_many(points)
 
     def enable_precision_land(self, Navigator):
 
@@ -1,3 +1,9 @@
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import threading
+import time
+
 from pymavlink import mavutil
 import pymavlink.dialects.v20.all as dialect
 
@@ -6,26 +12,172 @@ class Messenger:
     """
     Messenger class for sending messages from the autopilot to the ground station.
 
+    Sending never blocks: messages are queued and sent by a worker thread, so
+    that status chatter takes as little of the telemetry link as possible:
+
+    - Messages on the same topic are sent at most once every `min_interval`
+      seconds. If more arrive in the meantime, only the newest is sent once
+      the interval is up (ie. progress updates are coalesced). Without a
+      topic, a message is its own topic, so repeats of the same text are
+      coalesced too.
+    - Text longer than fits in one STATUSTEXT is split over several, linked by
+      their `id` and `chunk_seq`.
+    - If more than `queue_size` messages are waiting, the oldest are dropped.
+
+    Pass `vehicle` to send through a dronekit vehicle's own connection, or
+    `connection` to send over an already open mavutil connection, instead of
+    opening a new one on `port`. Through a vehicle, messages are sent as the
+    vehicle's system and the onboard computer component (SOURCE_COMPONENT),
+    rather than as dronekit's ground station.
+
     Source:
     https://github.com/mustafa-gokce/ardupilot-software-development/blob/main/pymavlink/send-status-text.py
     """
 
-    def __init__(self, port):
-        self.__master = mavutil.mavlink_connection(
-            device=f"udp:127.0.0.1:{port}",
-            source_system=1,
-            source_component=1)
+    # Bytes of text in a single STATUSTEXT message
+    CHUNK_SIZE = 50
+
+    # Component messages sent through a vehicle come from
+    SOURCE_COMPONENT = dialect.MAV_COMP_ID_ONBOARD_COMPUTER
+
+    def __init__(self, port=None, connection=None, vehicle=None, min_interval=1.0, queue_size=32):
+        if vehicle is not None:
+            # Encode with our own IDs (and sequence numbers) but write to the vehicle's connection
+            self.__vehicle_connection = vehicle.message_factory.file
+            self.__vehicle_mav = dialect.MAVLink(self.__vehicle_connection, srcComponent=self.SOURCE_COMPONENT)
+            self.__send_mavlink = self.__send_as_vehicle
+        else:
+            if connection is None:
+                connection = mavutil.mavlink_connection(
+                    device=f"udp:127.0.0.1:{port}",
+                    source_system=1,
+                    source_component=1)
+            self.__send_mavlink = connection.mav.send
+
+        self.min_interval = min_interval
+        self.queue_size = queue_size
+        self.dropped = 0
+
+        # topic -> (text, severity), in the order they were first queued
+        self.__pending: "OrderedDict[Hashable, Tuple[bytes, int]]" = OrderedDict()
+        # topic -> earliest time (time.monotonic()) it may be sent again
+        self.__next_send: Dict[Hashable, float] = {}
+        self.__sending = False
+        self.__condition = threading.Condition()
+        self.__text_id = 0
 
-    def send(self, message, prefix="SHEPARD"):
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__send_loop, name="messenger", daemon=True)
+        self.__thread.start()
+
+    def send(self, message, prefix="SHEPARD", topic=None, severity=dialect.MAV_SEVERITY_INFO):
         """
-        Sends a message to the ground station.
+        Queues a message to be sent to the ground station.
 
         :param message: The message to send.
         :param prefix: The prefix to add to the message.
+        :param topic: Messages sharing a topic are rate limited and coalesced together. Defaults to the message itself.
+        :param severity: The MAV_SEVERITY of the message.
         :return: None
         """
 
-        message = f"{prefix}: {message}"
-        mav_message = dialect.MAVLink_statustext_message(
-            severity=dialect.MAV_SEVERITY_INFO, text=message.encode("utf-8"))
-        self.__master.mav.send(mav_message)
+        text = f"{prefix}: {message}".encode("utf-8")
+        if topic is None:
+            topic = text
+
+        with self.__condition:
+            if topic not in self.__pending and len(self.__pending) >= self.queue_size:
+                self.__pending.popitem(last=False)
+                self.dropped += 1
+            self.__pending[topic] = (text, severity)
+            self.__condition.notify()
+
+    def flush(self, timeout=None):
+        """
+        Waits until every queued message has been sent.
+
+        :param timeout: The longest to wait in seconds, or forever if None.
+        :return: True if everything was sent.
+        """
+
+        with self.__condition:
+            return self.__condition.wait_for(lambda: not self.__pending and not self.__sending, timeout)
+
+    def close(self):
+        """
+        Stops the send thread. Messages still queued are not sent.
+        """
+
+        with self.__condition:
+            self.__running = False
+            self.__condition.notify_all()
+        self.__thread.join()
+
+    def chunk(self, text: bytes) -> List[Tuple[bytes, int, int]]:
+        """
+        Splits `text` into (text, id, chunk_seq) for each STATUSTEXT message.
+        """
+
+        if len(text) <= self.CHUNK_SIZE:
+            return [(text, 0, 0)]  # id 0 means there is a single chunk
+
+        self.__text_id = self.__text_id % 255 + 1
+        chunks: List[Tuple[bytes, int, int]] = []
+        start = 0
+        while start < len(text):
+            end = min(start + self.CHUNK_SIZE, len(text))
+            # Do not split UTF-8 characters across chunks
+            while end < len(text) and end > start + 1 and text[end] & 0xC0 == 0x80:
+                end -= 1
+            chunks.append((text[start:end], self.__text_id, len(chunks)))
+            start = end
+
+        # A full last chunk does not mark the end, so finish with an empty one
+        if len(chunks[-1][0]) == self.CHUNK_SIZE:
+            chunks.append((b"", self.__text_id, len(chunks)))
+
+        return chunks
+
+    def __send_as_vehicle(self, mav_message):
+        # The vehicle's system ID is only known once its heartbeat arrived
+        self.__vehicle_mav.srcSystem = self.__vehicle_connection.target_system or 1
+        self.__vehicle_mav.send(mav_message)
+
+    def __next_message(self) -> Optional[Tuple[bytes, int]]:
+        """
+        Takes the first queued message whose topic may be sent now, waiting
+        until there is one. Returns None once closed.
+        """
+
+        with self.__condition:
+            self.__sending = False
+            self.__condition.notify_all()
+            while self.__running:
+                now = time.monotonic()
+                wait: Optional[float] = None
+                for topic in self.__pending:
+                    next_send = self.__next_send.get(topic, 0.0)
+                    if next_send <= now:
+                        self.__next_send[topic] = now + self.min_interval
+                        self.__sending = True
+                        return self.__pending.pop(topic)
+                    wait = next_send - now if wait is None else min(wait, next_send - now)
+
+                # Forget topics which are no longer rate limited
+                for topic in [t for t, next_send in self.__next_send.items() if next_send <= now]:
+                    del self.__next_send[topic]
+
+                self.__condition.wait(wait)
+            return None
+
+    def __send_loop(self):
+        while True:
+            message = self.__next_message()
+            if message is None:
+                return
+
+            text, severity = message
+            for chunk, text_id, chunk_seq in self.chunk(text):
+                mav_message = dialect.MAVLink_statustext_message(
+                    severity=severity, text=chunk, id=text_id, chunk_seq=chunk_seq)
+                self.__send_mavlink(mav_message)
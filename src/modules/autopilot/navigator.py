@@ -1,37 +1,47 @@
 import math
 import time
+from concurrent.futures import Future
 from datetime import datetime
 
 import dronekit
 from pymavlink import mavutil
 
+from src.modules.autopilot.arrival import ArrivalMonitor
 from src.modules.autopilot.messenger import Messenger
 
 
 class Navigator:
     """
     A class to handle navigation.
+
+    Movement commands come in two flavours: `set_*_async` sends the command
+    and returns a `Future` which resolves to True once the vehicle arrives
+    (or False if it times out or leaves GUIDED mode), while `set_*` waits for
+    that future.
     """
 
     vehicle: dronekit.Vehicle | None = None
     POSITION_TOLERANCE = 1
 
-    def __init__(self, vehicle, messenger_port):
+    def __init__(self, vehicle):
         self.vehicle = vehicle
-        self.mavlink_messenger = Messenger(messenger_port)
+        # Status messages share the vehicle's connection rather than opening another
+        self.mavlink_messenger = Messenger(vehicle=vehicle)
+        self.arrival_monitor = ArrivalMonitor(vehicle)
 
-    def send_status_message(self, message):
-        self.__message(message)
+    def send_status_message(self, message, topic=None):
+        self.__message(message, topic)
 
-    def __message(self, msg):
+    def __message(self, msg, topic=None):
         """
-        Prints a message to the console.
+        Prints a message to the console and sends it to the ground station.
         :param msg: The message to print.
+        :param topic: Messages on the same topic are rate limited (see `Messenger.send`).
         :return: None
         """
 
         print(f"SHEPARD_NAV: {msg}")
-        self.mavlink_messenger.send(msg)
+        self.mavlink_messenger.send(msg, topic=topic)
 
     def takeoff(self, target_alt):
         """
@@ -50,13 +60,15 @@ class Navigator:
 
         return True
 
-    def set_position(self, lat, lon):
+    def set_position_async(self, lat, lon, tolerance=None, timeout=None) -> Future:
         """
-        Moves the vehicle to a given position.
+        Starts moving the vehicle to a given position.
 
         :param lat: The latitude of the target position.
         :param lon: The longitude of the target position.
-        :return: None
+        :param tolerance: How close in meters counts as arrived. Defaults to POSITION_TOLERANCE.
+        :param timeout: Seconds after which to give up waiting, if given.
+        :return: A future resolving to whether the target was reached.
         """
 
         self.__message(f"Moving to {lat}, {lon}")
@@ -65,22 +77,27 @@ class Navigator:
             lat, lon, self.vehicle.location.global_relative_frame.alt)
         self.vehicle.simple_goto(target_location)
 
-        while self.vehicle.mode.name == "GUIDED":
-            remaining_distance = self.__get_distance_metres(
-                self.vehicle.location.global_relative_frame, target_location)
-            self.__message(f"Distance to target: {remaining_distance} m")
-            if remaining_distance <= self.POSITION_TOLERANCE:
-                self.__message("Reached target")
-                break
-            time.sleep(2)
+        return self.__await_arrival(
+            lambda location: self.__get_distance_metres(location, target_location),
+            tolerance, timeout)
 
-    def set_position_relative(self, d_north, d_east):
+    def set_position(self, lat, lon, tolerance=None, timeout=None):
         """
-        Moves the vehicle to a given position relative to its current position.
+        Moves the vehicle to a given position. See `set_position_async`.
+
+        :return: True if the target was reached.
+        """
+        return self.set_position_async(lat, lon, tolerance, timeout).result()
+
+    def set_position_relative_async(self, d_north, d_east, tolerance=None, timeout=None) -> Future:
+        """
+        Starts moving the vehicle to a given position relative to its current position.
 
         :param d_north: The distance to move north in meters.
         :param d_east: The distance to move east in meters.
-        :return: None
+        :param tolerance: How close in meters counts as arrived. Defaults to POSITION_TOLERANCE.
+        :param timeout: Seconds after which to give up waiting, if given.
+        :return: A future resolving to whether the target was reached.
         """
 
         self.__message(f"Moving {d_north} m north and {d_east} m east")
@@ -91,14 +108,18 @@ class Navigator:
 
         self.vehicle.simple_goto(target_location)
 
-        while self.vehicle.mode.name == "GUIDED":
-            remaining_distance = self.__get_distance_metres(
-                self.vehicle.location.global_relative_frame, target_location)
-            self.__message(f"Distance to target: {remaining_distance} m")
-            if remaining_distance <= self.POSITION_TOLERANCE:
-                self.__message("Reached target")
-                break
-            time.sleep(2)
+        return self.__await_arrival(
+            lambda location: self.__get_distance_metres(location, target_location),
+            tolerance, timeout)
+
+    def set_position_relative(self, d_north, d_east, tolerance=None, timeout=None):
+        """
+        Moves the vehicle to a given position relative to its current position.
+        See `set_position_relative_async`.
+
+        :return: True if the target was reached.
+        """
+        return self.set_position_relative_async(d_north, d_east, tolerance, timeout).result()
 
     def get_local_position_ned(self):
         # Gets the current location of the drone in the local NED frame
@@ -137,12 +158,14 @@ class Navigator:
         # self.vehicle.commands.condition_yaw(heading, relative=True)
         self.__condition_yaw(heading, relative=True)
 
-    def set_altitude(self, altitude):
+    def set_altitude_async(self, altitude, tolerance=None, timeout=None) -> Future:
         """
-        Sets the altitude of the vehicle.
+        Starts changing the altitude of the vehicle.
 
         :param altitude: The altitude in meters.
-        :return: None
+        :param tolerance: How close in meters counts as arrived. Defaults to POSITION_TOLERANCE.
+        :param timeout: Seconds after which to give up waiting, if given.
+        :return: A future resolving to whether the target was reached.
         """
 
         self.__message(f"Setting altitude to {altitude} m")
@@ -154,22 +177,26 @@ class Navigator:
         )
         self.vehicle.simple_goto(target_altitude)
 
-        while self.vehicle.mode.name == "GUIDED":
-            remaining_distance = abs(
-                self.vehicle.location.global_relative_frame.alt -
-                target_altitude.alt)
-            self.__message(f"Distance to target: {remaining_distance} m")
-            if remaining_distance <= self.POSITION_TOLERANCE:
-                self.__message("Reached target")
-                break
-            time.sleep(2)
+        return self.__await_arrival(
+            lambda location: abs(location.alt - target_altitude.alt),
+            tolerance, timeout)
 
-    def set_altitude_relative(self, altitude):
+    def set_altitude(self, altitude, tolerance=None, timeout=None):
         """
-        Sets the altitude of the vehicle relative to its current altitude.
+        Sets the altitude of the vehicle. See `set_altitude_async`.
+
+        :return: True if the target was reached.
+        """
+        return self.set_altitude_async(altitude, tolerance, timeout).result()
+
+    def set_altitude_relative_async(self, altitude, tolerance=None, timeout=None) -> Future:
+        """
+        Starts changing the altitude of the vehicle relative to its current altitude.
 
         :param altitude: The altitude relative to current altitude in meters, positive value to ascend and negative to descend.
-        :return: None
+        :param tolerance: How close in meters counts as arrived. Defaults to POSITION_TOLERANCE.
+        :param timeout: Seconds after which to give up waiting, if given.
+        :return: A future resolving to whether the target was reached.
         """
 
         self.__message(
@@ -182,30 +209,38 @@ class Navigator:
         )
         self.vehicle.simple_goto(target_altitude)
 
-        while self.vehicle.mode.name == "GUIDED":
-            remaining_distance = self.__get_distance_metres(
-                self.vehicle.location.global_relative_frame, target_altitude)
-            self.__message(f"Distance to target: {remaining_distance} m")
-            if remaining_distance <= self.POSITION_TOLERANCE:
-                self.__message("Reached target")
-                break
-            time.sleep(2)
+        return self.__await_arrival(
+            lambda location: abs(location.alt - target_altitude.alt),
+            tolerance, timeout)
 
-    def set_altitude_position(self,
-                              lat,
-                              lon,
-                              alt,
-                              battery=None,
-                              voltage_hard_cutoff=22.4,
-                              hard_cutoff_enable=False):
+    def set_altitude_relative(self, altitude, tolerance=None, timeout=None):
         """
-        Sets the altitude and the position in absolute terms
+        Sets the altitude of the vehicle relative to its current altitude.
+        See `set_altitude_relative_async`.
+
+        :return: True if the target was reached.
+        """
+        return self.set_altitude_relative_async(altitude, tolerance, timeout).result()
+
+    def set_altitude_position_async(self,
+                                    lat,
+                                    lon,
+                                    alt,
+                                    battery=None,
+                                    voltage_hard_cutoff=22.4,
+                                    hard_cutoff_enable=False,
+                                    tolerance=None,
+                                    timeout=None) -> Future:
+        """
+        Starts moving to an absolute altitude and position
 
         :param lat: The latitude of the target position.
         :param lon: The longitude of the target position.
         :param alt: The target altitude in metres
         :param battery: MAVLinkBatteryStatusProvider object
-        :return: None
+        :param tolerance: How close in meters counts as arrived. Defaults to POSITION_TOLERANCE.
+        :param timeout: Seconds after which to give up waiting, if given.
+        :return: A future resolving to whether the target was reached.
         """
         self.__message(f"Moving to lat: {lat} lon: {lon} alt: {alt}")
 
@@ -217,28 +252,44 @@ class Navigator:
                 self.__message("--------Hard Cutoff reached----------")
                 self.__message("--------Returning to Launch----------")
                 self.return_to_launch()
-                return
+                future: Future = Future()
+                future.set_result(False)
+                return future
 
         self.vehicle.simple_goto(target_altitude_position)
 
-        while self.vehicle.mode.name == "GUIDED":
-            remaining_distance = self.__get_distance_metres(
-                self.vehicle.location.global_relative_frame,
-                target_altitude_position)
-            self.__message(f"Distance to target: {remaining_distance} m")
-            if remaining_distance <= self.POSITION_TOLERANCE:
-                self.__message("Reached target")
-                break
-            time.sleep(2)
+        return self.__await_arrival(
+            lambda location: self.__get_distance_3d_metres(location, target_altitude_position),
+            tolerance, timeout)
+
+    def set_altitude_position(self,
+                              lat,
+                              lon,
+                              alt,
+                              battery=None,
+                              voltage_hard_cutoff=22.4,
+                              hard_cutoff_enable=False,
+                              tolerance=None,
+                              timeout=None):
+        """
+        Sets the altitude and the position in absolute terms. See
+        `set_altitude_position_async`.
+
+        :return: True if the target was reached.
+        """
+        return self.set_altitude_position_async(lat, lon, alt, battery, voltage_hard_cutoff,
+                                                hard_cutoff_enable, tolerance, timeout).result()
 
-    def set_altitude_position_relative(self, d_north, d_east, alt):
+    def set_altitude_position_relative_async(self, d_north, d_east, alt, tolerance=None, timeout=None) -> Future:
         """
-        Sets the altitude and the position relative to current position
+        Starts moving to an altitude and position relative to current position
 
         :param d_north: The distance to be moved north.
         :param d_east: The distance to be moved east.
         :param alt: Altitude to be moved in metres.
-        :return: None
+        :param tolerance: How close in meters counts as arrived. Defaults to POSITION_TOLERANCE.
+        :param timeout: Seconds after which to give up waiting, if given.
+        :return: A future resolving to whether the target was reached.
         """
 
         self.__message(
@@ -252,14 +303,31 @@ class Navigator:
 
         self.vehicle.simple_goto(target_location)
 
-        while self.vehicle.mode.name == "GUIDED":
-            remaining_distance = self.__get_distance_metres(
-                self.vehicle.location.global_relative_frame, target_location)
-            self.__message(f"Distance to target: {remaining_distance} m")
-            if remaining_distance <= self.POSITION_TOLERANCE:
-                self.__message("Reached target")
-                break
-            time.sleep(2)
+        return self.__await_arrival(
+            lambda location: self.__get_distance_3d_metres(location, target_location),
+            tolerance, timeout)
+
+    def set_altitude_position_relative(self, d_north, d_east, alt, tolerance=None, timeout=None):
+        """
+        Sets the altitude and the position relative to current position. See
+        `set_altitude_position_relative_async`.
+
+        :return: True if the target was reached.
+        """
+        return self.set_altitude_position_relative_async(d_north, d_east, alt, tolerance, timeout).result()
+
+    def __await_arrival(self, distance, tolerance=None, timeout=None) -> Future:
+        """
+        Returns a future which resolves once `distance(location)` is within
+        `tolerance` of the vehicle's location.
+        """
+        if tolerance is None:
+            tolerance = self.POSITION_TOLERANCE
+
+        future = self.arrival_monitor.watch(distance, tolerance, timeout)
+        future.add_done_callback(
+            lambda f: self.__message("Reached target" if f.result() else "Did not reach target"))
+        return future
 
     def land(self):
         """
@@ -374,6 +442,15 @@ class Navigator:
 
         return math.sqrt((d_lat * d_lat) + (d_lon * d_lon)) * 1.113195e5
 
+    def __get_distance_3d_metres(self, location_1, location_2):
+        """
+        Returns the larger of the ground and altitude distances in metres between two `LocationGlobalRelative`
+        objects, so a target is only reached once both are within tolerance.
+        """
+
+        return max(self.__get_distance_metres(location_1, location_2),
+                   abs(location_2.alt - location_1.alt))
+
     def __condition_yaw(self, heading, relative=False):
         if relative:
             is_relative = 1  # yaw relative to direction of travel
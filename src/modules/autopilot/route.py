@@ -0,0 +1,63 @@
+import math
+from typing import Iterator, Tuple
+
+import numpy as np
+
+# Direction of each side of the square spiral, in turn: +x, +y, -x, -y
+SPIRAL_DIRECTIONS = np.array([(1, 0), (0, 1), (-1, 0), (0, -1)])
+
+# Sides of the spiral making up one "loop" of the search
+SIDES_PER_LOOP = 5
+
+
+def _spiral_sides(number_of_loops: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the direction and number of steps of every side of the spiral.
+    The first two sides are 2 steps long, and every second side after that
+    is one step longer, so each pass is one step outside the previous one.
+    """
+    sides = np.arange(SIDES_PER_LOOP * number_of_loops)
+    return SPIRAL_DIRECTIONS[sides % 4], 2 + sides // 2
+
+
+def spiral_route(step_size: float, number_of_loops: int = 10) -> np.ndarray:
+    """
+    Returns the waypoints of a square spiral search around (0, 0) as an N x 2
+    array of (x, y) offsets in meters, `step_size` meters apart.
+    """
+    directions, lengths = _spiral_sides(number_of_loops)
+    steps = np.repeat(directions, lengths, axis=0)
+    return np.cumsum(steps, axis=0) * step_size
+
+
+def spiral_waypoints(step_size: float, number_of_loops: int = 10) -> Iterator[Tuple[float, float]]:
+    """
+    Yields the same waypoints as `spiral_route` one at a time, without
+    building the whole route.
+    """
+    x, y = 0.0, 0.0
+    for side in range(SIDES_PER_LOOP * number_of_loops):
+        dx, dy = SPIRAL_DIRECTIONS[side % 4]
+        for _ in range(2 + side // 2):
+            x += dx * step_size
+            y += dy * step_size
+            yield (x, y)
+
+
+def coverage_step(altitude: float, horizontal_angle: float, vertical_angle: float, overlap: float = 0.2) -> float:
+    """
+    Returns the spiral step size in meters for which the camera's footprint
+    on consecutive passes overlaps by the fraction `overlap`.
+
+    :param altitude: Height above the ground in meters.
+    :param horizontal_angle: Half of the camera's horizontal field of view in radians.
+    :param vertical_angle: Half of the camera's vertical field of view in radians.
+    :param overlap: Fraction of the footprint shared by neighbouring passes, between 0 and 1.
+    """
+    if not 0 <= overlap < 1:
+        raise ValueError("overlap must be between 0 and 1")
+
+    # The spiral turns, so passes run along both axes of the image; the
+    # narrower side of the footprint limits the spacing
+    footprint = 2 * altitude * min(math.tan(horizontal_angle), math.tan(vertical_angle))
+    return footprint * (1 - overlap)
@@ -0,0 +1,170 @@
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+from pymavlink import mavutil
+
+# Fly to a position, with a velocity feed-forward
+POSITION_VELOCITY_TYPEMASK = (mavutil.mavlink.POSITION_TARGET_TYPEMASK_AX_IGNORE
+                              | mavutil.mavlink.POSITION_TARGET_TYPEMASK_AY_IGNORE
+                              | mavutil.mavlink.POSITION_TARGET_TYPEMASK_AZ_IGNORE
+                              | mavutil.mavlink.POSITION_TARGET_TYPEMASK_YAW_IGNORE
+                              | mavutil.mavlink.POSITION_TARGET_TYPEMASK_YAW_RATE_IGNORE)
+
+# Fly to a position only
+POSITION_TYPEMASK = (POSITION_VELOCITY_TYPEMASK
+                     | mavutil.mavlink.POSITION_TARGET_TYPEMASK_VX_IGNORE
+                     | mavutil.mavlink.POSITION_TARGET_TYPEMASK_VY_IGNORE
+                     | mavutil.mavlink.POSITION_TARGET_TYPEMASK_VZ_IGNORE)
+
+
+class WaypointStreamer:
+    """
+    Flies a route of local NED waypoints by streaming setpoints to the
+    autopilot based on where the vehicle actually is, rather than on timing.
+
+    Call `update()` regularly (ie. at the telemetry rate). Each call looks at
+    the vehicle's local NED position and sends a setpoint for a point
+    `lookahead` meters further along the route. As the vehicle closes in on a
+    waypoint, the setpoint is already moving along the next leg, so the
+    vehicle turns the corner without stopping.
+
+    With `blend`, each setpoint also carries a velocity of `speed` towards
+    that look-ahead point, so passes are flown at a constant speed and
+    corners are rounded off. The vehicle slows down for the last waypoint,
+    and the route is done once it is within `tolerance` of it.
+
+    Without `blend`, only the next waypoint's position is sent and the
+    vehicle moves on once within `lookahead` of it.
+    """
+
+    def __init__(self,
+                 nav,
+                 waypoints: Sequence[Tuple[float, float, float]],
+                 speed: float,
+                 lookahead: float = 2.0,
+                 tolerance: float = 1.0,
+                 blend: bool = True):
+        """
+        :param nav: The Navigator used to read the position and send setpoints.
+        :param waypoints: The route as (north, east, down) in the local NED frame.
+        :param speed: The speed to fly at in m/s.
+        :param lookahead: How far ahead along the route to aim, and how close to a waypoint
+                          moves on to the next, in meters.
+        :param tolerance: How close to the last waypoint counts as arrived, in meters.
+        :param blend: Whether to send velocity-blended setpoints.
+        """
+        self.nav = nav
+        self.waypoints = np.asarray(waypoints, dtype=np.float64).reshape(-1, 3)
+        if len(self.waypoints) == 0:
+            raise ValueError("A route needs at least one waypoint")
+
+        self.speed = speed
+        self.lookahead = lookahead
+        self.tolerance = tolerance
+        self.blend = blend
+
+        # The route starts wherever the vehicle is on the first update
+        self._path: Optional[np.ndarray] = None
+        # Index into _path of the start of the leg being flown
+        self._leg = 0
+        self.done = False
+
+    @property
+    def index(self) -> int:
+        """
+        Index of the waypoint currently being flown towards.
+        """
+        return self._leg
+
+    def update(self, position: Optional[Sequence[float]] = None) -> bool:
+        """
+        Send the next setpoint for the vehicle at `position` (north, east,
+        down), read from the Navigator if not given.
+
+        :return: False once the route has been completed.
+        """
+        if self.done:
+            return False
+
+        if position is None:
+            position = self.nav.get_local_position_ned()
+        if position is None or any(p is None for p in position):
+            return True  # No position yet
+        pos = np.asarray(position, dtype=np.float64)
+
+        if self._path is None:
+            self._path = np.vstack((pos, self.waypoints))
+        path = self._path
+
+        # Move on to the next leg once the vehicle is within `lookahead` of
+        # the end of this one. Being level with it is not enough, as the
+        # vehicle may be well off the route (ie. after chasing a detection).
+        while self._leg < len(path) - 2 and np.linalg.norm(path[self._leg + 1] - pos) <= self.lookahead:
+            self._leg += 1
+
+        final = path[-1]
+        if self._leg == len(path) - 2 and np.linalg.norm(final - pos) <= self.tolerance:
+            self.done = True
+            return False
+
+        if not self.blend:
+            self._send(path[self._leg + 1], None)
+            return True
+
+        start, end = path[self._leg], path[self._leg + 1]
+        target = self._along(self._project(pos, start, end), self.lookahead)
+
+        # Head for the look-ahead point at full speed, slowing down for the end
+        heading = target - pos
+        distance = np.linalg.norm(heading)
+        velocity = np.zeros(3)
+        if distance > 0:
+            remaining = float(np.linalg.norm(final - pos)) if self._leg == len(path) - 2 else np.inf
+            velocity = heading / distance * self.speed * min(1.0, remaining / self.lookahead)
+
+        self._send(target, velocity)
+        return True
+
+    @staticmethod
+    def _project(pos: np.ndarray, start: np.ndarray, end: np.ndarray) -> np.ndarray:
+        """
+        Returns the point nearest `pos` on the leg from `start` to `end`.
+        """
+        leg = end - start
+        length_sq = leg @ leg
+        if length_sq == 0:
+            return end.copy()
+        t = np.clip((pos - start) @ leg / length_sq, 0, 1)
+        return start + t * leg
+
+    def _along(self, point: np.ndarray, distance: float) -> np.ndarray:
+        """
+        Returns the point `distance` meters further along the route from
+        `point`, which is on the current leg. Stops at the last waypoint.
+        """
+        assert self._path is not None
+
+        for leg in range(self._leg, len(self._path) - 1):
+            end = self._path[leg + 1]
+            left = float(np.linalg.norm(end - point))
+            if left >= distance:
+                return point + (end - point) / left * distance
+            distance -= left
+            point = end
+        return point
+
+    def _send(self, position: np.ndarray, velocity: Optional[np.ndarray]):
+        if velocity is None:
+            velocity = np.zeros(3)
+            type_mask = POSITION_TYPEMASK
+        else:
+            type_mask = POSITION_VELOCITY_TYPEMASK
+
+        self.nav.set_position_target_local_ned(x=float(position[0]),
+                                               y=float(position[1]),
+                                               z=float(position[2]),
+                                               vx=float(velocity[0]),
+                                               vy=float(velocity[1]),
+                                               vz=float(velocity[2]),
+                                               type_mask=type_mask,
+                                               coordinate_frame=mavutil.mavlink.MAV_FRAME_LOCAL_NED)
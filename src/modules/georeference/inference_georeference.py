@@ -12,16 +12,110 @@ where X, Y are in meters
 
 # TODO: Requires a circular-import... but we only need these for type annotations
 import numpy as np
-from math import cos, tan, atan, radians, sqrt
+from math import cos, radians
 import pyproj
 from pyproj import Geod
 
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
 
 if TYPE_CHECKING:
     from ..imaging.analysis import CameraAttributes, Inference
 
 
+class GeoreferenceContext:
+    """
+    Converts between Lon, Lat and UTM Easting, Northing (and metre offsets)
+    on a given ellipsoid.
+
+    Setting up a PROJ projection is far more expensive than using one, so the
+    projection for each UTM zone is created once and reused for every call.
+    All conversions accept either scalars or arrays; passing arrays converts
+    every point with a single call.
+    """
+
+    def __init__(self, ellps: str = 'WGS84'):
+        self.ellps = ellps
+        self.geod = Geod(ellps=ellps)
+        self._projections: Dict[Tuple[int, bool], pyproj.Proj] = {}
+
+    @staticmethod
+    def utm_zone(lon) -> int:
+        """
+        Returns the UTM zone containing the given longitude in degrees. If an
+        array is given, the zone of its mean longitude is returned so that all
+        points end up on the same grid.
+        """
+        lon = float(np.mean(lon))
+        return int((lon + 180) // 6) % 60 + 1
+
+    def projection(self, zone: int, south: bool = False) -> pyproj.Proj:
+        """
+        Returns the (cached) UTM projection for `zone`.
+        """
+        key = (zone, south)
+        if key not in self._projections:
+            self._projections[key] = pyproj.Proj(proj='utm',
+                                                 zone=zone,
+                                                 south=south,
+                                                 ellps=self.ellps,
+                                                 preserve_units=True)
+        return self._projections[key]
+
+    @staticmethod
+    def utm_south(lat) -> bool:
+        """
+        Returns whether the given latitude in degrees is projected on the
+        southern hemisphere's grid. As with `utm_zone`, an array is judged by
+        its mean.
+        """
+        return float(np.mean(lat)) < 0
+
+    def lonlat_to_xy(self, lon, lat, zone: Optional[int] = None, south: Optional[bool] = None):
+        """
+        Returns the Easting and Northing of given Lon, Lat, and the zone and
+        hemisphere they are in, so they can be converted back with
+        `xy_to_lonlat`. If `zone` or `south` are not given, they are picked
+        from the coordinates (see `utm_zone` and `utm_south`).
+
+        Input is in degrees, return is in meters
+        """
+        if zone is None:
+            zone = self.utm_zone(lon)
+        if south is None:
+            south = self.utm_south(lat)
+        x, y = self.projection(zone, south)(lon, lat)
+        return x, y, zone, south
+
+    def xy_to_lonlat(self, x, y, zone: int, south: bool = False):
+        """
+        Returns the Lon, Lat of given Easting, Northing in `zone`.
+
+        Input is in meters, return is in degrees
+        """
+        return self.projection(zone, south)(x, y, inverse=True)
+
+    def offsets_to_lonlat(self, origin, north, east):
+        """
+        Returns the Lon, Lat of points `north`, `east` meters away from
+        `origin` (lon, lat) in degrees.
+        """
+        north = np.asarray(north, dtype=np.float64)
+        east = np.asarray(east, dtype=np.float64)
+
+        az = np.degrees(np.arctan2(east, north))
+        dist = np.hypot(north, east)
+        origin_lon = np.full(np.shape(dist), origin[0], dtype=np.float64)
+        origin_lat = np.full(np.shape(dist), origin[1], dtype=np.float64)
+
+        lon, lat, _ = self.geod.fwd(origin_lon, origin_lat, az, dist)
+        return lon, lat
+
+
+# Shared by the module-level helpers below so they do not re-create PROJ
+# objects on every call.
+_default_context = GeoreferenceContext()
+
+
 def LonLat_To_XY(lon, lat, zone=12):
     """
     Returns the Easting and Northing of given Lon, Lat on the WGS84
@@ -29,9 +123,8 @@ def LonLat_To_XY(lon, lat, zone=12):
 
     Input is in degrees, return is in meters
     """
-    P = pyproj.Proj(proj='utm', zone=zone, ellps='WGS84', preserve_units=True)
-
-    return P(lon, lat)
+    x, y, _, _ = _default_context.lonlat_to_xy(lon, lat, zone, south=False)
+    return x, y
 
 
 def XY_To_LonLat(x, y, zone=12):
@@ -41,9 +134,7 @@ def XY_To_LonLat(x, y, zone=12):
 
     Input is in meters, return is in degrees
     """
-    P = pyproj.Proj(proj='utm', zone=zone, ellps='WGS84', preserve_units=True)
-
-    return P(x, y, inverse=True)
+    return _default_context.xy_to_lonlat(x, y, zone)
 
 
 def Geofence_to_XY(origin, geofence):
@@ -111,65 +202,101 @@ def meters_to_LonLat(origin, points):
 
 
 def meters_to_LonLat(origin, points):
-    g = Geod(ellps='clrk66')
-    new_points = []
-    for point in points:
-        az = atan(point[1] / point[0])
-        dist = sqrt((point[0] ** 2 + point[1] ** 2))
-
-        point_lon, point_lat, backaz = g.fwd(origin[0], origin[1], az, dist)
-        new_points.append((point_lat, point_lon))
+    """
+    Returns the (lat, lon) of each (north, east) offset in meters from
+    `origin` (lon, lat).
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    lon, lat = _default_context.offsets_to_lonlat(origin, points[:, 0], points[:, 1])
 
-    return new_points
+    return list(zip(lat.tolist(), lon.tolist()))
 
 
-def pixel_to_rel_position(camera_attributes: 'CameraAttributes',
-                          inference: 'Inference', fovh, fovv) -> np.array:
-    """
-    Calculates the unit vector from an angled camera to an object at x, y pixel coordinates
-    x and y are the normalized pixel coordinates between 0 and 1
-    both fovs' are in radians.
+def pixels_to_rel_positions(camera_attributes: 'CameraAttributes',
+                            xs,
+                            ys,
+                            altitude,
+                            fovh,
+                            fovv,
+                            pitch=0.0,
+                            roll=0.0,
+                            yaw=None) -> np.ndarray:
     """
+    Projects many detections onto the ground at once.
+
+    Each pixel is turned into a ray through the camera, which is tilted
+    forward by `camera_attributes.angle`, then rotated by the drone's attitude
+    and intersected with the ground `altitude` meters below.
+
+    :param xs, ys: Normalized pixel coordinates between 0 and 1 (N values).
+    :param altitude: Height above the ground in meters.
+    :param fovh, fovv: Horizontal and vertical field of view in radians.
+    :param pitch, roll: Attitude of the drone in radians (nose up and right
+                        wing down are positive).
+    :param yaw: Heading of the drone in radians. If given, the offsets are
+                rotated into [north, east] instead of [forward, right].
+
+    `altitude`, `pitch`, `roll` and `yaw` may either be scalars or have one
+    value per pixel (ie. when reprocessing a whole flight).
 
-    direction_vector = np.zeros(2)
+    Returns an N x 2 array of [forward, right] (or [north, east]) offsets in
+    meters. Pixels whose ray does not hit the ground are NaN.
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
 
-    #calculating image height and width in meters
-    height = 2 * camera_attributes.focal_length * tan(fovv / 2)
-    width = 2 * camera_attributes.focal_length * tan(fovh / 2)
+    # Ray in the camera's frame, with the camera pointing straight down.
+    # NOTE: The image x axis is flipped because of the camera being upside
+    # down, so objects on the right of the image are to the right of the drone
+    forward = (1 - 2 * ys) * np.tan(fovv / 2)
+    right = (2 * xs - 1) * np.tan(fovh / 2)
+    down = np.ones_like(forward)
 
-    #pixels to meters conversion
-    y_m = inference.y * height
-    x_m = inference.x * width
+    # Camera mount, tilted forward about the drone's lateral axis
+    angle = camera_attributes.angle
+    forward, down = (forward * np.cos(angle) + down * np.sin(angle),
+                     down * np.cos(angle) - forward * np.sin(angle))
 
-    if (y_m > height / 2):
-        y_m = height - y_m
-        theta_y = camera_attributes.angle - atan(
-            (height / 2 - y_m) / camera_attributes.focal_length)
-    elif (y_m <= height / 2):
-        theta_y = atan(
-            (height / 2 - y_m) /
-            camera_attributes.focal_length) + camera_attributes.angle
+    # Roll, then pitch, to bring the ray from the body frame to a level frame
+    cos_r, sin_r = np.cos(roll), np.sin(roll)
+    right, down = (right * cos_r - down * sin_r,
+                   right * sin_r + down * cos_r)
 
-    if (x_m > width / 2):
-        x_m = width - x_m
-        theta_x = -1 * (atan(
-            (width / 2 - x_m) / camera_attributes.focal_length))
-    elif (x_m <= width / 2):
-        theta_x = atan((width / 2 - x_m) / camera_attributes.focal_length)
+    cos_p, sin_p = np.cos(pitch), np.sin(pitch)
+    forward, down = (forward * cos_p + down * sin_p,
+                     down * cos_p - forward * sin_p)
 
-    y_comp = inference.relative_alt * tan(theta_y)
-    x_comp = (inference.relative_alt /
-              cos(camera_attributes.angle)) * tan(theta_x)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale = np.where(down > 0, altitude / down, np.nan)
 
     offset = calculate_object_offsets()
+    forward = forward * scale + offset[1]
+    right = right * scale - offset[0]
+
+    if yaw is not None:
+        cos_y, sin_y = np.cos(yaw), np.sin(yaw)
+        forward, right = (forward * cos_y - right * sin_y,
+                          forward * sin_y + right * cos_y)
 
-    # NOTE: This correction was made because of the camera being upside down
-    # This corrects the issues regarding the autopilot navigating to the wrong direction
+    return np.stack(np.broadcast_arrays(forward, right), axis=-1).reshape(-1, 2)
 
-    direction_vector[1] = -1 * (x_comp + offset[0])
-    direction_vector[0] = y_comp + offset[1]
 
-    return direction_vector
+def pixel_to_rel_position(camera_attributes: 'CameraAttributes',
+                          inference: 'Inference', fovh, fovv) -> np.ndarray:
+    """
+    Calculates the [forward, right] offset in meters from the drone to an
+    object at x, y pixel coordinates (see `pixels_to_rel_positions`)
+    x and y are the normalized pixel coordinates between 0 and 1
+    both fovs' are in radians.
+    """
+    return pixels_to_rel_positions(camera_attributes,
+                                   inference.x,
+                                   inference.y,
+                                   inference.relative_alt,
+                                   fovh,
+                                   fovv,
+                                   pitch=inference.pitch,
+                                   roll=inference.roll)[0]
 
 
 #TODO get measurements to calculate offset due to shifted position of camera from the gps
@@ -193,8 +320,7 @@ def get_object_location(camera_attributes: 'CameraAttributes',
         H_FOV,
         V_FOV,
     )
-    print("dir_vector", dir_vector)
 
     #lon, lat = XY_To_LonLat(dir_vector[0], dir_vector[1])
 
-    return (dir_vector[0], dir_vector[1])
+    return (float(dir_vector[0]), float(dir_vector[1]))
@@ -1,14 +1,18 @@
-from typing import Callable, Optional, List, Callable, Any
+from typing import Callable, Optional, List, Callable, Any, Tuple
 
+from dataclasses import dataclass
+import math
 import threading
+import time
 # from multiprocessing import Process
 from .detector import BaseDetector, BoundingBox
 from .camera import CameraProvider
+from .frame import Frame
+from .pipeline import AsyncCallback, Pipeline
 from .debug import ImageAnalysisDebugger
 from ..georeference.inference_georeference import get_object_location
 from .location import LocationProvider
 from ..autopilot.navigator import Navigator
-from PIL import Image
 
 
 class CameraAttributes:
@@ -19,13 +23,33 @@ class CameraAttributes:
 
 
 class Inference:
-    def __init__(self, bounding_box: BoundingBox, relative_alt):
+    def __init__(self, bounding_box: BoundingBox, relative_alt, pitch=0.0, roll=0.0):
         camera_attributes = CameraAttributes()
         position = bounding_box.position
         size = bounding_box.size
         self.x = (position.x + size.x / 2) / camera_attributes.resolution[0]
         self.y = (position.y + size.y / 2) / camera_attributes.resolution[1]
         self.relative_alt = relative_alt
+        self.pitch = pitch  # in radians
+        self.roll = roll  # in radians
+
+
+@dataclass(frozen=True)
+class AnalysisResult:
+    """
+    Everything the image analysis worked out for a single frame.
+
+    Computed once per frame and shared by every subscriber, so it must not be
+    modified. All fields but `frame` are None if nothing was detected.
+    """
+
+    frame: Frame
+    bounding_box: Optional[BoundingBox] = None
+    inference: Optional[Inference] = None
+    # Altitude of the drone when the frame was georeferenced, in meters
+    altitude: Optional[float] = None
+    # Offset of the detection from the drone in meters, as [forward, right]
+    offset: Optional[Tuple[float, float]] = None
 
 
 class ImageAnalysisDelegate:
@@ -40,6 +64,20 @@ class ImageAnalysisDelegate:
     Pass an `ImageAnalysisDebugger` when constructing to see a window with live
     results.
 
+    Pass `pipelined=True` to run capture, inference, georeferencing and
+    subscriber dispatch each on their own thread, connected by queues of at
+    most `queue_size` items. When a stage falls behind, the stale frames
+    waiting for it are dropped so that results are always as fresh as possible.
+
+    Pass `batch_size` > 1 to run the detector on micro-batches of frames (see
+    `BaseDetector.predict_batch`). A batch is sent to the detector once it is
+    full or `batch_latency` seconds after its first frame, whichever comes
+    first.
+
+    Each frame is georeferenced once into an `AnalysisResult`, which is then
+    shared with every subscriber. The latest one is available from
+    `latest_result()`.
+
     TODO: geolocate the landing pad using the drone's location.
     """
 
@@ -48,7 +86,11 @@ class ImageAnalysisDelegate:
                  camera: CameraProvider,
                  location_provider: LocationProvider = None,
                  navigation_provider: Navigator = None,
-                 debugger: Optional[ImageAnalysisDebugger] = None):
+                 debugger: Optional[ImageAnalysisDebugger] = None,
+                 pipelined: bool = False,
+                 queue_size: int = 1,
+                 batch_size: int = 1,
+                 batch_latency: float = 0.1):
         self.detector = detector
         self.camera = camera
         self.debugger = debugger
@@ -59,27 +101,69 @@ class ImageAnalysisDelegate:
         self.location_provider = location_provider
         self.navigation_provider = navigation_provider
 
-        self.subscribers: List[Callable[[Image.Image, float, float], Any]] = []
+        self.subscribers: List[Callable[[Frame, Optional[Tuple[float, float]]], Any]] = []
+        self.result_subscribers: List[Callable[[AnalysisResult], Any]] = []
+        self.async_subscribers: List[AsyncCallback] = []
         self.camera_attributes = CameraAttributes()
-        self.thread = None
+        self._latest_result: Optional[AnalysisResult] = None
+        self.thread: Optional[threading.Thread] = None
         self.loop = True
 
-    def get_inference(self, bounding_box: BoundingBox) -> Inference:
+        self.pipelined = pipelined
+        self.queue_size = queue_size
+        self.pipeline: Optional[Pipeline] = None
+
+        self.batch_size = batch_size
+        self.batch_latency = batch_latency
+
+    def get_inference(self, bounding_box: BoundingBox, timestamp: Optional[float] = None) -> Inference:
+        """
+        Georeference `bounding_box` using the drone's pose at `timestamp` (ie.
+        when the frame was captured), or its latest pose if not given.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+
         if self.location_provider is not None:
-            altitude = self.location_provider.altitude()
+            altitude = self.location_provider.altitude_at(timestamp)
         elif self.navigation_provider is not None:
             altitude = -1 * self.navigation_provider.get_local_position_ned()[2]
         else:
             raise ValueError("No altitude information provider available.")
 
-        inference = Inference(bounding_box, altitude)
+        pitch = roll = 0.0
+        if self.location_provider is not None:
+            try:
+                orientation = self.location_provider.orientation_at(timestamp)
+                pitch = math.radians(orientation.pitch)
+                roll = math.radians(orientation.roll)
+            except (ValueError, NotImplementedError):
+                pass  # No attitude yet, assume the drone is level
+
+        inference = Inference(bounding_box, altitude, pitch, roll)
         return inference
 
     def start(self):
         """
-        Will start the image analysis process in another thread.
+        Will start the image analysis process in another thread (or several
+        threads, if pipelined).
         """
         self.loop = True
+        for subscriber in self.async_subscribers:
+            subscriber.start()
+
+        if self.pipelined:
+            self.pipeline = Pipeline(self.queue_size)
+            self.pipeline.add_stage("capture", self._capture)
+            if self.batch_size > 1:
+                self.pipeline.add_stage("detect", self._detect_batch, self.batch_size, self.batch_latency)
+            else:
+                self.pipeline.add_stage("detect", self._detect)
+            self.pipeline.add_stage("georeference", self._georeference)
+            self.pipeline.add_stage("dispatch", self._dispatch)
+            self.pipeline.start()
+            return
+
         self.thread = threading.Thread(target=self._analysis_loop)
         # process = Process(target=self._analysis_loop)
         self.thread.start()
@@ -88,7 +172,61 @@ class ImageAnalysisDelegate:
 
     def stop(self):
         self.loop = False
-        self.thread.join()
+        if self.pipeline is not None:
+            self.pipeline.stop()
+            self.pipeline = None
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        for subscriber in self.async_subscribers:
+            subscriber.stop()
+
+    def _capture(self) -> Frame:
+        return self.camera.capture_frame()
+
+    def _detect(self, im: Frame) -> Tuple[Frame, Optional[BoundingBox]]:
+        bounding_box = self.detector.predict(im)
+
+        if self.debugger is not None:
+            # The debugger draws with PIL, so only convert when it is attached
+            self.debugger.set_image(im.to_image())
+            if bounding_box is not None:
+                self.debugger.set_bounding_box(bounding_box)
+
+        return im, bounding_box
+
+    def _detect_batch(self, frames: List[Frame]) -> List[Tuple[Frame, Optional[BoundingBox]]]:
+        batch = self.detector.predict_batch(frames)
+
+        detections = []
+        for frame, bounding_boxes in zip(frames, batch):
+            detections.append((frame, self.detector.select_best(bounding_boxes)))
+
+        if self.debugger is not None and detections:
+            frame, bounding_box = detections[-1]
+            self.debugger.set_image(frame.to_image())
+            if bounding_box is not None:
+                self.debugger.set_bounding_box(bounding_box)
+
+        return detections
+
+    def _georeference(self, detection: Tuple[Frame, Optional[BoundingBox]]) -> AnalysisResult:
+        im, bounding_box = detection
+        if not bounding_box:
+            return AnalysisResult(im)
+
+        # Use the pose from when the frame was captured, not from now that
+        # inference is done
+        inference = self.get_inference(bounding_box, im.timestamp)
+        offset = get_object_location(self.camera_attributes, inference)
+        return AnalysisResult(im, bounding_box, inference, inference.relative_alt, offset)
+
+    def _dispatch(self, result: AnalysisResult):
+        self._latest_result = result
+        for subscriber in self.subscribers:
+            subscriber(result.frame, result.offset)
+        for result_subscriber in self.result_subscribers:
+            result_subscriber(result)
 
     def _analyze_image(self):
         """
@@ -96,23 +234,27 @@ class ImageAnalysisDelegate:
         should otherwise we run by `start()` which then starts
         `_analysis_loop()` in another thread.
         """
-        im = self.camera.capture()
-        bounding_box = self.detector.predict(im)
+        if self.batch_size > 1:
+            self._analyze_batch()
+            return
 
-        if self.debugger is not None:
-            self.debugger.set_image(im)
-            if bounding_box is not None:
-                self.debugger.set_bounding_box(bounding_box)
+        im = self._capture()
+        detection = self._detect(im)
+        result = self._georeference(detection)
+        self._dispatch(result)
 
-        for subscriber in self.subscribers:
-            if bounding_box:
-                inference = self.get_inference(bounding_box)
-                if inference:
-                    x, y = get_object_location(self.camera_attributes,
-                                               inference)
-                    subscriber(im, (x, y))
-            else:
-                subscriber(im, None)
+    def _analyze_batch(self):
+        """
+        Like `_analyze_image()`, but captures a micro-batch of frames and runs
+        them through the detector together.
+        """
+        frames = [self._capture()]
+        deadline = time.monotonic() + self.batch_latency
+        while len(frames) < self.batch_size and time.monotonic() < deadline:
+            frames.append(self._capture())
+
+        for detection in self._detect_batch(frames):
+            self._dispatch(self._georeference(detection))
 
     def _analysis_loop(self):
         """
@@ -122,16 +264,43 @@ class ImageAnalysisDelegate:
         while self.loop:
             self._analyze_image()
 
-    def subscribe(self, callback: Callable):
+    def subscribe(self, callback: Callable, asynchronous: bool = False, with_result: bool = False):
         """
         Subscribe to image analysis updates. For example:
 
-            def myhandler(image: Image.Image, bounding_box: BoundingBox):
-                if bounding_box is None:
+            def myhandler(frame: Frame, location: Optional[Tuple[float, float]]):
+                if location is None:
                     print("No bounding box detected")
                 else:
                     print("Bounding box detected")
+                    frame.to_image().save("detection.png")
 
             imaging_process.subscribe(myhandler)
+
+        Subscribers are called on the analysis thread, so a slow subscriber
+        delays the next frame. Pass `asynchronous=True` to call `callback` on
+        its own thread instead; updates which arrive while it is still busy
+        are dropped in favour of the latest one.
+
+        Pass `with_result=True` to call `callback` with the frame's whole
+        `AnalysisResult` instead (ie. to get the bounding box). It is the same
+        object every subscriber gets for that frame, unlike `latest_result()`
+        which may already be a later frame's.
+        """
+        if asynchronous:
+            async_callback = AsyncCallback(callback)
+            self.async_subscribers.append(async_callback)
+            async_callback.start()
+            callback = async_callback
+
+        if with_result:
+            self.result_subscribers.append(callback)
+        else:
+            self.subscribers.append(callback)
+
+    def latest_result(self) -> Optional[AnalysisResult]:
+        """
+        Returns the result of the most recently analysed frame, or None if no
+        frame has been analysed yet.
         """
-        self.subscribers.append(callback)
+        return self._latest_result
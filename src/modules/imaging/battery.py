@@ -35,31 +35,18 @@ class MAVLinkBatteryStatusProvider:
     For use in production when a MAVLink connection is available.
     """
 
-    def __init__(self, mavlink_delegate: MAVLinkDelegate):
+    def __init__(self, mavlink_delegate: MAVLinkDelegate, rate: float = 2.0):
         self.mavlink_delegate = mavlink_delegate
         self._voltage: Optional[float] = None
 
         # Subscribe to the delegate's messages
-        self.mavlink_delegate.subscribe(self._process_message)
-        self.mavlink_delegate.send(
-            dialect.MAVLink_command_long_message(
-                target_system=1,
-                target_component=1,
-                command=dialect.MAV_CMD_SET_MESSAGE_INTERVAL,
-                confirmation=0,
-                param1=1,  # param1: send SYS_STATUS message
-                param2=500000,  # param2: send every 5e5 us
-                param3=0,
-                param4=0,
-                param5=0,
-                param6=0,
-                param7=1))  # param7: send messaged to requester
+        self.mavlink_delegate.subscribe(self._process_message, [dialect.MAVLINK_MSG_ID_SYS_STATUS])
+        self.mavlink_delegate.telemetry_rates.request("battery", dialect.MAVLINK_MSG_ID_SYS_STATUS, rate)
 
     def _process_message(self, message):
-        # This callback processes incoming MAVLink messages and updates the internal state
-        if message.get_type() == 'SYS_STATUS':
-            # message.voltage_battery is an int in mV
-            self._voltage = float(message.voltage_battery) / 1e3
+        # This callback processes incoming SYS_STATUS messages and updates the internal state
+        # message.voltage_battery is an int in mV
+        self._voltage = float(message.voltage_battery) / 1e3
 
     def voltage(self) -> float:
         if self._voltage is not None:
@@ -1,32 +1,50 @@
-from typing import Optional
+from typing import List, Optional, Sequence, Union
 
 from PIL import Image
 
-from .detector import Vec2, BoundingBox, BaseDetector 
+from .detector import Vec2, BoundingBox, BaseDetector
+from .frame import Frame, as_frame
 
 from ultralytics import YOLO
 
 
 class BucketDetector(BaseDetector):
 
-    def __init__(self, model_path):
+    def __init__(self, model_path, min_confidence: float = 0.75):
         print(f"model: {model_path}")
         self.model = YOLO(model_path)
+        self.min_confidence = min_confidence
 
-    def predict(self, image: Image.Image) -> Optional[BoundingBox]:
-        results = self.model(image, verbose = False)
+    def predict(self, image: Union[Frame, Image.Image]) -> Optional[BoundingBox]:
+        return self.select_best(self.predict_batch([image])[0])
 
-        result = results[0]  # because one image
-
-        boxes = result.boxes
+    def select_best(self, bounding_boxes: List[BoundingBox]) -> Optional[BoundingBox]:
+        if len(bounding_boxes) == 0:
+            return None
 
-        if boxes is not None and len(boxes) > 0:
-            best_box = boxes[boxes.conf.argmax()]
-            (x1, y1, x2, y2) = best_box.xyxy[0].tolist()  # box [x1, y1, x2, y2]
-            conf = best_box.conf.item()  # confidence threshold
-            if conf < 0.75:
-                return None
-            else:
-                return BoundingBox(Vec2(x1, y1), Vec2(x2, y2))
-        else:
+        best_box = bounding_boxes[0]  # boxes are sorted by confidence
+        if best_box.confidence is None or best_box.confidence < self.min_confidence:
             return None
+        else:
+            return best_box
+
+    def predict_batch(self, images: Sequence[Union[Frame, Image.Image]]) -> List[List[BoundingBox]]:
+        # YOLO takes ndarrays in BGR order, which is what OpenCV cameras give.
+        # Passing a list runs all images through a single forward pass.
+        results = self.model([as_frame(image).bgr for image in images], verbose = False)
+
+        batch: List[List[BoundingBox]] = []
+        for result in results:
+            boxes = result.boxes
+            if boxes is None or len(boxes) == 0:
+                batch.append([])
+                continue
+
+            bounding_boxes = []
+            for (x1, y1, x2, y2), conf in zip(boxes.xyxy.tolist(), boxes.conf.tolist()):
+                bounding_boxes.append(BoundingBox(Vec2(x1, y1), Vec2(x2 - x1, y2 - y1), conf))
+
+            bounding_boxes.sort(key=lambda bb: bb.confidence or 0.0, reverse=True)
+            batch.append(bounding_boxes)
+
+        return batch
@@ -1,12 +1,18 @@
-from typing import Tuple
+from typing import List, Optional, Tuple, Union, cast
 
 import pathlib
+import threading
+import time
 from PIL import Image
 import numpy as np
 import cv2
 import depthai as dai
 from dataclasses import dataclass
 
+from .detector import BoundingBox, Vec2
+from .frame import Frame
+from .oakd_detector import boxes_from_detections
+
 
 class CameraProvider:
     """
@@ -29,6 +35,17 @@ class CameraProvider:
         # Should be implemented by deriving classes.
         raise NotImplementedError()
 
+    def capture_frame(self) -> Frame:
+        """
+        Captures a single frame from the camera. Unlike `capture()`, the frame
+        keeps the camera's own buffer and colour order; conversion to the size
+        set by `set_size` only happens when a consumer asks for it.
+
+        Cameras which natively produce ndarrays should override this (and
+        implement `capture()` in terms of it).
+        """
+        return Frame.from_image(self.capture())
+
     def capture_to(self, path: str | pathlib.Path):
         """
         Captures a single image and saves it to `path`.
@@ -40,46 +57,181 @@ class CameraProvider:
         Captures a single image returns it's numpy.ndarray representation. Will
         have shape (height, width, colors).
         """
-        return np.array(self.capture())
+        return self.capture_frame().rgb
 
 @dataclass
 class DepthCapture:
-    rgb: np.ndarray
+    """
+    A colour frame with the point cloud aligned to it, as captured by the
+    OAK-D.
+
+    The point cloud is kept as the device produced it (float32, in mm,
+    relative to the camera), one point per pixel of the frame in row-major
+    order. `points` is an H x W x 3 view of it, so looking up pixels never
+    copies the whole cloud. Points with no depth are (0, 0, 0).
+
+    If the OAK-D is running a detection network, `detections` are the
+    bounding boxes it found in this same frame (and `frame.detections` too).
+    """
+    frame: Frame
     point_cloud: np.ndarray
     width: int
     height: int
+    detections: Optional[List[BoundingBox]] = None
+
+    @property
+    def rgb(self) -> np.ndarray:
+        """The colour image as an RGB ndarray, converted on first use."""
+        return self.frame.rgb
+
+    @property
+    def points(self) -> np.ndarray:
+        """The point cloud as an H x W x 3 view, indexed by [y, x]."""
+        return self.point_cloud.reshape(self.height, self.width, 3)
+
+    def get_points(self, xs, ys) -> np.ndarray:
+        """Get the 3D coordinates relative to the camera frame (in mm) of
+        each pixel (xs[i], ys[i]), as an N x 3 array.
+
+        (xs, ys) are in pixel coordinates in the self.rgb frame."""
+        return self.points[np.asarray(ys), np.asarray(xs)]
 
     def get_point(self, x: int, y: int) -> np.ndarray:
         """Get the 3D coordinates relative to the camera frame (in mm) of a pixel).
 
         (x, y) are in pixel coordinates in the self.rgb frame."""
-        idx = y * self.width + x
-        p = self.point_cloud[idx]
+        p = self.get_points(x, y)
 
         # I am not sure if this is possible...
         assert not np.any(np.isnan(p)), "Invalid depth at this point"
 
         return p
 
-    def distance_between_points(self, x1: int, y1: int, x2: int, y2: int):
+    def distance_between_points(self, x1, y1, x2, y2):
         """Get the physical distance between points from pixels in the rgb
-        frame (x1, y1) and (x2, y2).
+        frame (x1, y1) and (x2, y2). Each may also be an array of pixels, to
+        measure many distances at once.
 
         Resulting distance is in mm."""
-        p1 = self.get_point(x1, y1)
-        p2 = self.get_point(x2, y2)
+        p1 = self.get_points(x1, y1)
+        p2 = self.get_points(x2, y2)
 
-        dist = np.linalg.norm(p1 - p2)
+        dist = np.linalg.norm(p1 - p2, axis=-1)
 
         return dist
 
+    def region(self, box: BoundingBox) -> np.ndarray:
+        """The points inside `box` (in pixels of the rgb frame), clipped to the
+        frame, as an h x w x 3 view."""
+        x0 = max(int(np.floor(box.position.x)), 0)
+        y0 = max(int(np.floor(box.position.y)), 0)
+        x1 = min(int(np.ceil(box.position.x + box.size.x)), self.width)
+        y1 = min(int(np.ceil(box.position.y + box.size.y)), self.height)
+        return self.points[y0:max(y0, y1), x0:max(x0, x1)]
+
+    @staticmethod
+    def _valid(points: np.ndarray) -> np.ndarray:
+        """Mask of the points which have a depth."""
+        return np.isfinite(points).all(axis=-1) & (points[..., 2] > 0)
+
+    def region_valid_ratio(self, box: BoundingBox) -> float:
+        """The fraction of pixels inside `box` which have a depth."""
+        region = self.region(box)
+        if region.size == 0:
+            return 0.0
+        return float(np.count_nonzero(self._valid(region))) / (region.shape[0] * region.shape[1])
+
+    def region_points(self, box: BoundingBox) -> np.ndarray:
+        """The points inside `box` which have a depth, as an N x 3 array."""
+        region = self.region(box)
+        return region[self._valid(region)]
+
+    @staticmethod
+    def _robust_mean(values: np.ndarray, method: str, trim: float) -> np.ndarray:
+        """The median or trimmed mean of `values` along the first axis."""
+        if method == "median":
+            return np.median(values, axis=0)
+        if method == "trimmed_mean":
+            cut = int(len(values) * trim)
+            ordered = np.sort(values, axis=0)
+            return ordered[cut:len(values) - cut].mean(axis=0)
+        raise ValueError(f"Unknown method {method}")
+
+    def region_depth(self, box: BoundingBox, method: str = "median", trim: float = 0.1) -> Optional[float]:
+        """Get the depth (in mm) of what is inside `box`, ignoring pixels
+        without a depth. Returns None if none have one.
+
+        method is "median" or "trimmed_mean", which drops the `trim` fraction
+        of nearest and furthest depths before averaging."""
+        points = self.region_points(box)
+        if len(points) == 0:
+            return None
+        return float(self._robust_mean(points[:, 2], method, trim))
+
+    def region_position(self, box: BoundingBox, method: str = "median", trim: float = 0.1) -> Optional[np.ndarray]:
+        """Get the 3D position relative to the camera frame (in mm) of what is
+        inside `box`, as the median (or trimmed mean) of each coordinate of
+        the points with a depth. Returns None if none have one."""
+        points = self.region_points(box)
+        if len(points) == 0:
+            return None
+        return self._robust_mean(points, method, trim)
+
+    def fit_plane(self, box: Optional[BoundingBox] = None, max_points: int = 10000) -> Optional[Tuple[np.ndarray, float]]:
+        """Fit a plane (ie. the ground under the drone) to the points inside
+        `box`, or the whole capture.
+
+        Returns the plane's unit normal, facing the camera, and its distance
+        from the camera in mm, or None if there are too few points with a
+        depth. At most `max_points` evenly spread points are used."""
+        if box is None:
+            box = BoundingBox(Vec2(0, 0), Vec2(self.width, self.height))
+        points = self.region_points(box).astype(np.float64)
+        if len(points) < 3:
+            return None
+        if len(points) > max_points:
+            points = points[::int(np.ceil(len(points) / max_points))]
+
+        # The normal is the direction the points vary least in
+        centroid = points.mean(axis=0)
+        _, _, vt = np.linalg.svd(points - centroid, full_matrices=False)
+        normal = vt[2]
+        if normal @ centroid > 0:
+            normal = -normal
+        return normal, float(-normal @ centroid)
+
 
 class OakdCamera(CameraProvider):
     """
     Manages an OAK-D device with on-demand capturing of 3D pictures (see DepthCapture).
+
+    Given `nn_blob_path`, a YOLO detection network (compiled to a .blob for
+    the OAK-D) also runs on the device, on every colour frame. Its detections
+    come back in the same message as the frame and point cloud, so they are
+    always in sync with them (see OakdDetector).
     """
 
-    def __init__(self, fps: int = 30):
+    def __init__(self,
+                 fps: int = 30,
+                 nn_blob_path: Optional[Union[str, pathlib.Path]] = None,
+                 nn_input_size: Tuple[int, int] = (416, 416),
+                 nn_num_classes: int = 1,
+                 nn_confidence: float = 0.5,
+                 nn_iou: float = 0.5):
+        """
+        :param fps: Frame rate of the cameras.
+        :param nn_blob_path: YOLO detection network to run on the device, if any.
+        :param nn_input_size: (width, height) the network takes. The whole
+                              colour frame is scaled to it.
+        :param nn_num_classes: Number of classes the network detects.
+        :param nn_confidence: Detections less confident than this are dropped on the device.
+        :param nn_iou: Overlap above which the device suppresses the less confident of two detections.
+        """
+        self.nn_blob_path = nn_blob_path
+        self.nn_input_size = nn_input_size
+        self.nn_num_classes = nn_num_classes
+        self.nn_confidence = nn_confidence
+        self.nn_iou = nn_iou
         self._init_pipeline(fps)
 
     def _init_pipeline(self, fps: int):
@@ -119,11 +271,39 @@ class OakdCamera(CameraProvider):
         camRgb.isp.link(sync.inputs["rgb"])
         pointcloud.outputPointCloud.link(sync.inputs["pcl"])
 
+        if self.nn_blob_path is not None:
+            self._init_detection_network(pipeline, camRgb, sync)
+
         sync.out.link(xOut.input)
         xOut.setStreamName("out")
 
         self.pipeline = pipeline
 
+    def _init_detection_network(self, pipeline, camRgb, sync):
+        """Add a YOLO detection network, fed from the colour camera, whose
+        detections are synced with the colour frame and point cloud."""
+        network = pipeline.create(dai.node.YoloDetectionNetwork)
+
+        # Squash the whole field of view into the network's input, so that
+        # its normalised detections map straight onto the colour frame
+        camRgb.setPreviewSize(*self.nn_input_size)
+        camRgb.setPreviewKeepAspectRatio(False)
+        camRgb.setInterleaved(False)
+        camRgb.setColorOrder(dai.ColorCameraProperties.ColorOrder.BGR)
+
+        network.setBlobPath(str(self.nn_blob_path))
+        network.setNumClasses(self.nn_num_classes)
+        network.setCoordinateSize(4)
+        network.setConfidenceThreshold(self.nn_confidence)
+        network.setIouThreshold(self.nn_iou)
+        network.setAnchors([])  # Anchor-free (YOLOv6 onwards)
+        network.setAnchorMasks({})
+        network.setNumInferenceThreads(2)
+        network.input.setBlocking(False)
+
+        camRgb.preview.link(network.input)
+        network.out.link(sync.inputs["detections"])
+
     def capture_with_depth(self) -> DepthCapture:
         """Capture a current 3D frame on the OAK-D.
 
@@ -131,23 +311,30 @@ class OakdCamera(CameraProvider):
         if not self.device or self.device.isClosed():
             raise Exception("No oakD connection, perhaps you forgot to call the .start() function")
 
-        msg = self.queue.get()
-        rgbFrame = msg["rgb"]
-        cv_frame = rgbFrame.getCvFrame()
-        rgb_frame = cv2.cvtColor(cv_frame, cv2.COLOR_BGR2RGB)
-        rgb = np.array(rgb_frame)
-        pcl = msg["pcl"]
+        msg = cast(dai.MessageGroup, self.queue.get())
+        rgbFrame = cast(dai.ImgFrame, msg["rgb"])
+        # Left in the camera's BGR until something asks for RGB
+        frame = Frame(rgbFrame.getCvFrame(), "BGR")
+        pcl = cast(dai.PointCloudData, msg["pcl"])
+
+        # The device's own float32 buffer, without copying
+        point_cloud = pcl.getPoints()
+        height, width = frame.raw.shape[:2]
 
-        point_cloud = pcl.getPoints().astype(np.float64)
-        height, width, _ = rgb.shape
+        detections = None
+        if self.nn_blob_path is not None:
+            nn_detections = cast(dai.ImgDetections, msg["detections"])
+            detections = boxes_from_detections(nn_detections.detections, width, height)
+            frame.detections = detections
 
-        capture = DepthCapture(rgb, point_cloud, width, height)
+        capture = DepthCapture(frame, point_cloud, width, height, detections)
         return capture
 
+    def capture_frame(self) -> Frame:
+        return self.capture_with_depth().frame
+
     def capture(self) -> Image.Image:
-        capture = self.capture_with_depth
-        img = Image.fromarray(capture.rgb, "RGB")
-        return img
+        return self.capture_frame().to_image()
 
 
     def start(self):
@@ -240,14 +427,16 @@ class GazeboCamera(CameraProvider):
         self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
         self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
 
-    def capture(self) -> Image.Image:
+    def capture_frame(self) -> Frame:
         ret, frame = self.cap.read()
         if ret:
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            return Image.fromarray(frame).resize(self.size)
+            return Frame(frame, "BGR", self.size)
         else:
             raise RuntimeError("Failed to capture image from webcam")
 
+    def capture(self) -> Image.Image:
+        return self.capture_frame().to_image()
+
     def show_images(self):
         while True:
             ret, frame = self.cap.read()
@@ -278,14 +467,16 @@ class WebcamCamera(CameraProvider):
         self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
         self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
 
-    def capture(self) -> Image.Image:
+    def capture_frame(self) -> Frame:
         ret, frame = self.cap.read()
         if ret:
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            return Image.fromarray(frame).resize(self.size)
+            return Frame(frame, "BGR", self.size)
         else:
             raise RuntimeError("Failed to capture image from webcam")
 
+    def capture(self) -> Image.Image:
+        return self.capture_frame().to_image()
+
 
 class RPiCamera(CameraProvider):
     """
@@ -311,11 +502,125 @@ class RPiCamera(CameraProvider):
 
     def set_size(self, size: Tuple[int, int]):
         self.size = size
+        # The camera must be stopped before it can be reconfigured
+        self.camera.stop()
         self.configure_camera()
-
-    def capture(self) -> Image.Image:
-        # Capture an image
         self.camera.start()
+
+    def capture_frame(self) -> Frame:
+        # Capture an image. The camera is already running since __init__.
         capture_result = self.camera.capture_array()
-        image = Image.fromarray(capture_result)
-        return image
+        color_order = "RGBA" if capture_result.shape[2] == 4 else "RGB"
+        return Frame(capture_result, color_order)
+
+    def capture(self) -> Image.Image:
+        return self.capture_frame().to_image()
+
+
+class ThreadedCamera(CameraProvider):
+    """
+    Wraps any other `CameraProvider` and continuously captures from it in a
+    background thread. `capture()` then returns the newest frame immediately
+    instead of waiting for the sensor readout.
+
+    The wrapped camera allocates every frame afresh, so the newest one is
+    handed out as it is, without copying: frames which nobody reads cost
+    nothing, and every caller of the same frame shares it, so it must not be
+    modified in place. Each frame is tagged with the time it was captured at
+    and a sequence number, see `capture_frame()`.
+
+    Call `start()` before capturing and `stop()` when done.
+    """
+
+    def __init__(self, camera: CameraProvider):
+        self.camera = camera
+        self._latest: Optional[Frame] = None
+        self._sequence = 0  # Number of frames captured so far
+
+        # Guards the newest frame. `_camera_lock` guards the wrapped camera
+        # so set_size() does not race with the grabber thread.
+        self._lock = threading.Condition()
+        self._camera_lock = threading.Lock()
+
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """
+        Start capturing frames in the background.
+        """
+        if self._running:
+            return
+
+        self._running = True
+        self._thread = threading.Thread(target=self._grab_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop capturing frames in the background.
+        """
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def set_size(self, size: Tuple[int, int]):
+        with self._camera_lock:
+            self.camera.set_size(size)
+
+    @property
+    def sequence(self) -> int:
+        """
+        Sequence number of the newest frame, or 0 if none have been captured.
+        """
+        with self._lock:
+            return self._sequence
+
+    def _grab_loop(self):
+        """
+        Continuously capture frames, keeping the newest. This should be run in
+        another thread; use `start()` to do so.
+        """
+        while self._running:
+            try:
+                with self._camera_lock:
+                    frame = self.camera.capture_frame()
+            except Exception as e:
+                print(f"Error capturing from {type(self.camera).__name__}: {e}")
+                time.sleep(0.1)
+                continue
+
+            with self._lock:
+                self._sequence += 1
+                frame.sequence = self._sequence
+                self._latest = frame
+                self._lock.notify_all()
+
+    def capture_frame(self, timeout: Optional[float] = None) -> Frame:
+        """
+        Returns the newest frame. `frame.timestamp` is the time it was captured
+        at (as given by `time.time()`) and `frame.sequence` its sequence
+        number. Sequence numbers start at 1 and increase by one for every frame
+        captured, so gaps show how many frames were skipped.
+
+        Only blocks if no frame has been captured yet. Raises `TimeoutError`
+        if no frame is available after `timeout` seconds.
+        """
+        with self._lock:
+            if not self._lock.wait_for(lambda: self._sequence > 0, timeout):
+                raise TimeoutError("No frame captured yet, is the camera started?")
+
+            assert self._latest is not None
+            return self._latest
+
+    def capture_with_metadata(self, timeout: Optional[float] = None) -> Tuple[Image.Image, float, int]:
+        """
+        Returns the newest frame as an image along with the time it was
+        captured at and its sequence number. See `capture_frame()`.
+        """
+        frame = self.capture_frame(timeout)
+        return frame.to_image(), frame.timestamp, frame.sequence
+
+    def capture(self) -> Image.Image:
+        return self.capture_frame().to_image()
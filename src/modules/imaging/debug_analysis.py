@@ -1,32 +1,24 @@
-from typing import Callable, Optional, List, Callable, Any
+from typing import Optional, Tuple
+
+import os
 
-import threading
-# from multiprocessing import Process
 from .detector import BaseDetector, BoundingBox
 from .camera import CameraProvider
 from .debug import ImageAnalysisDebugger
-from ..georeference.inference_georeference import get_object_location
+from .frame import Frame
 from .location import LocationProvider
-from PIL import Image, ImageDraw
-
-import os
+from PIL import ImageDraw
 
-from .analysis import CameraAttributes, Inference
+from .analysis import ImageAnalysisDelegate
 
 
-class DebugImageAnalysisDelegate:
+class DebugImageAnalysisDelegate(ImageAnalysisDelegate):
     """
-    Implements an imaging inference loops and provides several methods which
-    can be used to query the latest image analysis results.
-
-    Responsible for capturing pictures regularly, detecting any landing pads in
-    those pictures and then providing the most recent estimate of the landing
-    pad location from the camera's perspective.
+    An `ImageAnalysisDelegate` which also logs every picture taken, with and
+    without its bounding box drawn, to a new directory under tmp/log.
 
     Pass an `ImageAnalysisDebugger` when constructing to see a window with live
     results.
-
-    TODO: geolocate the landing pad using the drone's location.
     """
 
     def __init__(self,
@@ -35,13 +27,7 @@ class DebugImageAnalysisDelegate:
                  location_provider: LocationProvider,
                  debugger: Optional[ImageAnalysisDebugger] = None,
                  ):
-        import os
-        self.detector = detector
-        self.camera = camera
-        self.debugger = debugger
-        self.location_provider = location_provider
-        self.subscribers: List[Callable[[Image.Image, float, float], Any]] = []
-        self.camera_attributes = CameraAttributes()
+        super().__init__(detector, camera, location_provider, debugger=debugger)
 
         # log pictures taken
         os.makedirs("tmp/log", exist_ok=True)
@@ -60,30 +46,12 @@ class DebugImageAnalysisDelegate:
         # image number
         self.i = 0
 
-    def get_inference(self, bounding_box: BoundingBox) -> Inference:
-        inference = Inference(bounding_box, self.location_provider.altitude())
-        return inference
-
-    def start(self):
-        """
-        Will start the image analysis process in another thread.
-        """
-        thread = threading.Thread(target=self._analysis_loop)
-        # process = Process(target=self._analysis_loop)
-        thread.start()
-        # process.start()
-        # Use `threading` to start `self._analysis_loop` in another thread.
-
-    def _analyze_image(self):
-        """
-        Actually performs the image analysis once. Only useful for testing,
-        should otherwise we run by `start()` which then starts
-        `_analysis_loop()` in another thread.
-        """
-        im = self.camera.capture()
+    def _detect(self, frame: Frame) -> Tuple[Frame, Optional[BoundingBox]]:
+        # Draw on a copy; the frame's own image is shared with subscribers
+        im = frame.to_image().copy()
         im.save(os.path.join(self.img_path, f"{self.i}.png"))
 
-        bounding_box = self.detector.predict(im)
+        bounding_box = self.detector.predict(frame)
 
         if bounding_box:
             draw = ImageDraw.Draw(im)
@@ -100,34 +68,4 @@ class DebugImageAnalysisDelegate:
             if bounding_box is not None:
                 self.debugger.set_bounding_box(bounding_box)
 
-        for subscriber in self.subscribers:
-            if bounding_box:
-                inference = self.get_inference(bounding_box)
-                if inference:
-                    x, y = get_object_location(self.camera_attributes,
-                                               inference)
-                    subscriber(im, (x, y))
-            else:
-                subscriber(im, None)
-
-    def _analysis_loop(self):
-        """
-        Indefinitely run image analysis. This should be run in another thread;
-        use `start()` to do so.
-        """
-        while True:
-            self._analyze_image()
-
-    def subscribe(self, callback: Callable):
-        """
-        Subscribe to image analysis updates. For example:
-
-            def myhandler(image: Image.Image, bounding_box: BoundingBox):
-                if bounding_box is None:
-                    print("No bounding box detected")
-                else:
-                    print("Bounding box detected")
-
-            imaging_process.subscribe(myhandler)
-        """
-        self.subscribers.append(callback)
+        return frame, bounding_box
@@ -1,11 +1,15 @@
-from functools import lru_cache
-from typing import Optional
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
+from typing import List, Optional, Sequence, Tuple, Union
+import math
 
 from PIL import Image
 import numpy as np
 import cv2
 from cv2 import aruco
 
+from .frame import Frame, as_frame
+
 
 @dataclass
 class Vec2:
@@ -56,48 +60,100 @@ class Vec2:
 
 class BoundingBox:
 
-def __init__(self, position: Vec2, size: Vec2):
-    self.position = position
-    self.size = size
+    def __init__(self, position: Vec2, size: Vec2, confidence: Optional[float] = None, label: Optional[int] = None):
+        self.position = position
+        self.size = size
+        self.confidence = confidence  # None if the detector does not report one
+        self.label = label  # Class of the object, for detectors which find several
 
-@lru_cache(maxsize=2)
-def intersection(self, other: 'BoundingBox') -> float:
-    top_left = Vec2.max(self.position, other.position)
-    bottom_right = Vec2.min(self.position + self.size,
-                            other.position + other.size)
+    @lru_cache(maxsize=2)
+    def intersection(self, other: 'BoundingBox') -> float:
+        top_left = Vec2.max(self.position, other.position)
+        bottom_right = Vec2.min(self.position + self.size,
+                                other.position + other.size)
 
-    size = bottom_right - top_left
+        size = bottom_right - top_left
 
-    intersection = size.x * size.y
-    return max(intersection, 0)
+        intersection = size.x * size.y
+        return max(intersection, 0)
 
-def union(self, other: 'BoundingBox') -> float:
-    intersection = self.intersection(other)
-    if intersection == 0:
-        return 0
+    def union(self, other: 'BoundingBox') -> float:
+        intersection = self.intersection(other)
+        if intersection == 0:
+            return 0
 
-    union = self.size.x * self.size.y + other.size.x * other.size.y - intersection
-    return union
+        union = self.size.x * self.size.y + other.size.x * other.size.y - intersection
+        return union
 
-def intersection_over_union(self, pred: 'BoundingBox') -> Optional[float]:
-    intersection = self.intersection(pred)
-    if intersection == 0:
-        return 0
-    iou = intersection / self.union(pred)
-    return iou
+    def intersection_over_union(self, pred: 'BoundingBox') -> Optional[float]:
+        intersection = self.intersection(pred)
+        if intersection == 0:
+            return 0
+        iou = intersection / self.union(pred)
+        return iou
 
 
 class BaseDetector:
-    def predict(self, image: Image.Image) -> Optional[BoundingBox]:
+    def predict(self, image: Union[Frame, Image.Image]) -> Optional[BoundingBox]:
+        """
+        Find the object in `image`. New detectors should work on `Frame`s
+        directly (see `as_frame`) and pick whichever representation they need
+        (ie. `frame.bgr`) to avoid converting via PIL.
+        """
         raise NotImplementedError()
 
+    def predict_batch(self, images: Sequence[Union[Frame, Image.Image]]) -> List[List[BoundingBox]]:
+        """
+        Find objects in several images at once. Returns, for every image, the
+        list of all bounding boxes found in it, most confident first.
+
+        Detectors which can run several images through a single forward pass
+        (ie. YOLO) should override this. By default, `predict` is called on
+        every image in turn.
+        """
+        results = []
+        for image in images:
+            bounding_box = self.predict(image)
+            results.append([bounding_box] if bounding_box is not None else [])
+        return results
+
+    def select_best(self, bounding_boxes: List[BoundingBox]) -> Optional[BoundingBox]:
+        """
+        Pick the bounding box `predict` would have returned out of one image's
+        results from `predict_batch`.
+        """
+        return bounding_boxes[0] if bounding_boxes else None
 
-class IrDetector(BaseDetector):
-
-    def predict(self, image: Image.Image) -> Optional[BoundingBox]:
-        img = np.array(image)
 
-        gray_img = cv2.cvtColor(img, cv2.COLOR_RGBA2GRAY)
+class IrDetector(BaseDetector):
+    """
+    Finds the brightest spot in the image, ie. an IR beacon.
+
+    With `tracking=True`, once the beacon has been found, only a region of
+    interest around where it is expected next is searched. The beacon's
+    position is predicted assuming it keeps moving across the image at the
+    same velocity as between the last two detections. The ROI is the last
+    bounding box grown by `roi_margin` times its size on every side (and at
+    least `min_roi_size` pixels across). If the beacon is not in the ROI, the
+    whole frame is searched again.
+    """
+
+    def __init__(self, tracking: bool = False, roi_margin: float = 2.0, min_roi_size: int = 64):
+        self.tracking = tracking
+        self.roi_margin = roi_margin
+        self.min_roi_size = min_roi_size
+
+        self._last_box: Optional[BoundingBox] = None
+        self._velocity = Vec2(0, 0)  # Pixels per frame
+
+    def reset(self):
+        """
+        Forget the tracked beacon, so the next frame is searched in full.
+        """
+        self._last_box = None
+        self._velocity = Vec2(0, 0)
+
+    def _find(self, gray_img: np.ndarray) -> Optional[BoundingBox]:
         max_val = np.max(gray_img)  # returns maximum value of brightness
         if max_val < 200:
             return None  # lower threshold for intensity
@@ -114,11 +170,60 @@ class IrDetector(BaseDetector):
 
         return BoundingBox(Vec2(x, y), Vec2(w, h))
 
+    def _predict_roi(self, width: int, height: int) -> Tuple[int, int, int, int]:
+        """
+        Region (x0, y0, x1, y1) the beacon is expected to be in this frame.
+        """
+        assert self._last_box is not None
+        box = self._last_box
+
+        center = box.position + 0.5 * box.size + self._velocity
+        half_w = max(box.size.x * (0.5 + self.roi_margin), self.min_roi_size / 2)
+        half_h = max(box.size.y * (0.5 + self.roi_margin), self.min_roi_size / 2)
+
+        x0 = int(min(max(center.x - half_w, 0), width))
+        y0 = int(min(max(center.y - half_h, 0), height))
+        x1 = int(min(max(center.x + half_w, 0), width))
+        y1 = int(min(max(center.y + half_h, 0), height))
+        return x0, y0, x1, y1
+
+    def _update_track(self, bounding_box: Optional[BoundingBox]):
+        if bounding_box is None:
+            self.reset()
+            return
+
+        if self._last_box is not None:
+            last_center = self._last_box.position + 0.5 * self._last_box.size
+            center = bounding_box.position + 0.5 * bounding_box.size
+            self._velocity = center - last_center
+        self._last_box = bounding_box
+
+    def predict(self, image: Union[Frame, Image.Image]) -> Optional[BoundingBox]:
+        frame = as_frame(image)
+
+        if not self.tracking:
+            return self._find(frame.gray)
+
+        bounding_box = None
+        if self._last_box is not None:
+            x0, y0, x1, y1 = self._predict_roi(frame.width, frame.height)
+            if x1 > x0 and y1 > y0:
+                roi_box = self._find(frame.region(x0, y0, x1, y1, "GRAY"))
+                if roi_box is not None:
+                    bounding_box = BoundingBox(roi_box.position + Vec2(x0, y0), roi_box.size)
+
+        if bounding_box is None:
+            # Lost (or never found) the beacon, search the whole frame
+            bounding_box = self._find(frame.gray)
+
+        self._update_track(bounding_box)
+        return bounding_box
+
 
 class ArucoDetector():
 
-    def predict(self, image: Image.Image) -> Optional[BoundingBox]:
-        img  = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+    def predict(self, image: Union[Frame, Image.Image]) -> Optional[BoundingBox]:
+        img = as_frame(image).bgr
 
         aruco_dict = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_50)
 
@@ -0,0 +1,174 @@
+from typing import Dict, Optional, Tuple, Union
+
+import time
+
+from PIL import Image
+import numpy as np
+import cv2
+
+
+class Frame:
+    """
+    A single image from a camera, backed by the ndarray the camera produced.
+
+    Cameras hand out frames in whatever colour order they capture in (ie. BGR
+    for OpenCV) and at their native resolution. Colour conversion and resizing
+    to `size` only happen when a consumer asks for a particular representation
+    (`rgb`, `bgr`, `gray` or `to_image()`), and each representation is only
+    computed once per frame.
+
+    Frames should be treated as read-only; they may be shared between the
+    detector, the debugger and every subscriber.
+    """
+
+    COLOR_ORDERS = ("RGB", "BGR", "RGBA", "GRAY")
+
+    _CONVERSIONS: Dict[Tuple[str, str], int] = {
+        ("BGR", "RGB"): cv2.COLOR_BGR2RGB,
+        ("RGBA", "RGB"): cv2.COLOR_RGBA2RGB,
+        ("GRAY", "RGB"): cv2.COLOR_GRAY2RGB,
+        ("RGB", "BGR"): cv2.COLOR_RGB2BGR,
+        ("RGBA", "BGR"): cv2.COLOR_RGBA2BGR,
+        ("GRAY", "BGR"): cv2.COLOR_GRAY2BGR,
+        ("RGB", "GRAY"): cv2.COLOR_RGB2GRAY,
+        ("BGR", "GRAY"): cv2.COLOR_BGR2GRAY,
+        ("RGBA", "GRAY"): cv2.COLOR_RGBA2GRAY,
+    }
+
+    def __init__(self,
+                 array: np.ndarray,
+                 color_order: str = "RGB",
+                 size: Optional[Tuple[int, int]] = None,
+                 timestamp: Optional[float] = None,
+                 sequence: int = 0,
+                 detections: Optional[list] = None):
+        """
+        :param array: The image data with shape (height, width, channels), or
+                      (height, width) for grayscale images.
+        :param color_order: Channel order of `array`, one of COLOR_ORDERS.
+        :param size: (width, height) consumers should see this frame at. If
+                     None, the native size of `array` is used.
+        :param timestamp: When the frame was captured (as given by
+                          `time.time()`). Defaults to now.
+        :param sequence: Sequence number of the frame from its camera, if any.
+        :param detections: Bounding boxes found by the camera itself (ie. by a
+                           network on an OAK-D), or None if it does not detect.
+        """
+        if color_order not in self.COLOR_ORDERS:
+            raise ValueError(f"Unknown color order {color_order}")
+
+        self.raw = array
+        self.color_order = color_order
+        native_size = (array.shape[1], array.shape[0])
+        self.size: Tuple[int, int] = tuple(size) if size is not None else native_size  # type: ignore
+        self.timestamp = timestamp if timestamp is not None else time.time()
+        self.sequence = sequence
+        self.detections = detections
+
+        self._cache: Dict[str, np.ndarray] = {}
+        self._image: Optional[Image.Image] = None
+
+    @classmethod
+    def from_image(cls, image: Image.Image, timestamp: Optional[float] = None) -> 'Frame':
+        """
+        Wrap a PIL image as a frame.
+        """
+        if image.mode == "L":
+            color_order = "GRAY"
+        elif image.mode == "RGBA":
+            color_order = "RGBA"
+        else:
+            color_order = "RGB"
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+
+        frame = cls(np.asarray(image), color_order, timestamp=timestamp)
+        frame._image = image
+        return frame
+
+    @property
+    def width(self) -> int:
+        return self.size[0]
+
+    @property
+    def height(self) -> int:
+        return self.size[1]
+
+    def _resized(self) -> np.ndarray:
+        """
+        `raw` resized to `size`, in the native colour order.
+        """
+        if (self.raw.shape[1], self.raw.shape[0]) == self.size:
+            return self.raw
+
+        if "resized" not in self._cache:
+            self._cache["resized"] = cv2.resize(self.raw, self.size, interpolation=cv2.INTER_LINEAR)
+        return self._cache["resized"]
+
+    def as_order(self, color_order: str) -> np.ndarray:
+        """
+        Returns the frame as an ndarray of `size` in the given colour order.
+        The result is cached, so repeated calls are free.
+        """
+        if color_order == self.color_order:
+            return self._resized()
+
+        if color_order not in self._cache:
+            conversion = self._CONVERSIONS.get((self.color_order, color_order))
+            if conversion is None:
+                raise ValueError(f"Cannot convert a {self.color_order} frame to {color_order}")
+            self._cache[color_order] = cv2.cvtColor(self._resized(), conversion)
+        return self._cache[color_order]
+
+    def region(self, x0: int, y0: int, x1: int, y1: int, color_order: str) -> np.ndarray:
+        """
+        Returns the rectangle [x0, x1) x [y0, y1) (in `size` coordinates) in
+        the given colour order. If the whole frame has not already been
+        converted, only the region is, which is much cheaper for small regions.
+        """
+        if color_order == self.color_order or color_order in self._cache:
+            return self.as_order(color_order)[y0:y1, x0:x1]
+
+        conversion = self._CONVERSIONS.get((self.color_order, color_order))
+        if conversion is None:
+            raise ValueError(f"Cannot convert a {self.color_order} frame to {color_order}")
+        return cv2.cvtColor(self._resized()[y0:y1, x0:x1], conversion)
+
+    @property
+    def rgb(self) -> np.ndarray:
+        return self.as_order("RGB")
+
+    @property
+    def bgr(self) -> np.ndarray:
+        return self.as_order("BGR")
+
+    @property
+    def gray(self) -> np.ndarray:
+        return self.as_order("GRAY")
+
+    def to_image(self) -> Image.Image:
+        """
+        Returns the frame as a PIL image. Only built on first use.
+        """
+        if self._image is None or self._image.size != self.size:
+            if self.color_order == "GRAY":
+                self._image = Image.fromarray(self.gray, "L")
+            else:
+                self._image = Image.fromarray(self.rgb, "RGB")
+        return self._image
+
+    def copy(self) -> 'Frame':
+        """
+        Returns a frame with its own copy of the underlying data.
+        """
+        return Frame(self.raw.copy(), self.color_order, self.size, self.timestamp, self.sequence, self.detections)
+
+
+def as_frame(image: Union[Frame, Image.Image]) -> Frame:
+    """
+    Accept either a `Frame` or a PIL image, returning a `Frame`. Allows
+    detectors to keep working with code that still passes PIL images.
+    """
+    if isinstance(image, Frame):
+        return image
+    return Frame.from_image(image)
@@ -1,8 +1,11 @@
-from typing import Optional
+from typing import Optional, Sequence
 from dataclasses import dataclass
 import math
+import threading
+import time
 from src.modules.imaging.mavlink import MAVLinkDelegate
 import pymavlink.dialects.v20.all as dialect
+import numpy as np
 import json
 
 
@@ -50,10 +53,105 @@ class Rotation:
         }
 
 
+class TelemetryHistory:
+    """
+    Fixed-size ring buffer of timestamped telemetry samples, each made up of
+    one value per field in `fields`. Once full, the oldest sample is
+    overwritten.
+
+    `at(timestamp)` linearly interpolates the samples either side of any
+    timestamp in O(log n). Fields listed in `angular` are angles in degrees and
+    are interpolated the short way around the circle.
+
+    Samples must be appended in time order; older samples are ignored.
+    """
+
+    def __init__(self, fields: Sequence[str], capacity: int = 256, angular: Sequence[str] = ()):
+        if capacity < 1:
+            raise ValueError("TelemetryHistory must have a capacity of at least 1")
+
+        self.fields = list(fields)
+        self.capacity = capacity
+        self._angular = np.array([field in angular for field in self.fields])
+
+        # Every sample is written twice, `capacity` apart, so the samples
+        # always form one contiguous, sorted slice for np.searchsorted
+        self._times = np.zeros(2 * capacity)
+        self._values = np.zeros((2 * capacity, len(self.fields)))
+        self._start = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, timestamp: float, values: Sequence[float]):
+        """
+        Record `values` (one per field) as measured at `timestamp`.
+        """
+        with self._lock:
+            if self._count and timestamp < self._times[self._start + self._count - 1]:
+                return  # Out of order
+
+            if self._count < self.capacity:
+                i = (self._start + self._count) % self.capacity
+                self._count += 1
+            else:
+                i = self._start
+                self._start = (self._start + 1) % self.capacity
+
+            self._times[i] = self._times[i + self.capacity] = timestamp
+            self._values[i] = self._values[i + self.capacity] = values
+
+    def latest(self) -> Optional[np.ndarray]:
+        """
+        Returns the most recent sample, or None if there are none.
+        """
+        with self._lock:
+            if not self._count:
+                return None
+            return self._values[self._start + self._count - 1].copy()
+
+    def at(self, timestamp: float) -> Optional[np.ndarray]:
+        """
+        Returns the sample at `timestamp`, interpolated between the samples
+        either side of it. Timestamps outside of the history get the oldest or
+        newest sample. Returns None if there are no samples.
+        """
+        with self._lock:
+            if not self._count:
+                return None
+
+            times = self._times[self._start:self._start + self._count]
+            values = self._values[self._start:self._start + self._count]
+
+            i = int(np.searchsorted(times, timestamp))
+            if i == 0:
+                return values[0].copy()
+            if i == self._count:
+                return values[-1].copy()
+
+            # Copied, as the rows may be overwritten once the lock is released
+            t0, t1 = float(times[i - 1]), float(times[i])
+            before, after = values[i - 1].copy(), values[i].copy()
+
+        weight = (timestamp - t0) / (t1 - t0) if t1 > t0 else 1.0
+        delta = after - before
+        delta[self._angular] = (delta[self._angular] + 180) % 360 - 180
+
+        result = before + weight * delta
+        result[self._angular] = (result[self._angular] + 180) % 360 - 180
+        return result
+
+
 class LocationProvider:
     """
     Provides the drone's current location and orientation as read from
     telemetry or a debug-source.
+
+    The `*_at(timestamp)` methods give the value at an earlier time (as given
+    by `time.time()`), ie. when a frame was captured. Providers without a
+    history return the latest value.
     """
 
     def location(self) -> LatLng:
@@ -80,6 +178,24 @@ class LocationProvider:
         """
         raise NotImplementedError()
 
+    def location_at(self, timestamp: float) -> LatLng:
+        """
+        Get the lat/lng location of the drone at `timestamp`.
+        """
+        return self.location()
+
+    def altitude_at(self, timestamp: float) -> float:
+        """
+        Get the altitude of the drone in meters at `timestamp`.
+        """
+        return self.altitude()
+
+    def orientation_at(self, timestamp: float) -> Rotation:
+        """
+        Get the 3D orientation of the drone at `timestamp`.
+        """
+        return self.orientation()
+
     def dump_to(self, path: str):
         try:
             dump = {
@@ -166,54 +282,52 @@ class DebugLocationProvider(LocationProvider):
 class MAVLinkLocationProvider(LocationProvider):
     """
     Will provide location information based on information received as MAVLink messages.
+
+    Keeps the last `history_size` positions and attitudes, timestamped when
+    they were received, so they can be looked up at the time a frame was
+    captured.
     """
 
-    def __init__(self, mavlink_delegate: MAVLinkDelegate):
+    def __init__(self,
+                 mavlink_delegate: MAVLinkDelegate,
+                 history_size: int = 256,
+                 position_rate: float = 2.0,
+                 attitude_rate: float = 2.0):
         self.mavlink_delegate = mavlink_delegate
         self._location: Optional[LatLng] = None
         self._heading: Optional[Heading] = None
         self._altitude: Optional[float] = None
         self._orientation: Optional[Rotation] = None
 
+        self._position_history = TelemetryHistory(["lat", "lng", "alt"], history_size)
+        self._attitude_history = TelemetryHistory(["pitch", "roll", "yaw"],
+                                                  history_size,
+                                                  angular=["pitch", "roll", "yaw"])
+
         # Subscribe to the delegate's messages
-        self.mavlink_delegate.subscribe(self._process_message)
-        self.mavlink_delegate.send(
-            dialect.MAVLink_command_long_message(
-                target_system=1,
-                target_component=1,
-                command=dialect.MAV_CMD_SET_MESSAGE_INTERVAL,
-                confirmation=0,
-                param1=33,  # param1: send GLOBAL_POSITION_INT message
-                param2=500000,  # param2: send every 5e5 us
-                param3=0,
-                param4=0,
-                param5=0,
-                param6=0,
-                param7=1))  # param7: send messaged to requester
-        self.mavlink_delegate.send(
-            dialect.MAVLink_command_long_message(
-                target_system=1,
-                target_component=1,
-                command=dialect.MAV_CMD_SET_MESSAGE_INTERVAL,
-                confirmation=0,
-                param1=30,  # param1: send ATTITUDE message
-                param2=500000,  # param2: send every 5e5 us
-                param3=0,
-                param4=0,
-                param5=0,
-                param6=0,
-                param7=1))  # param7: send messaged to requester
-
-    def _process_message(self, message):
-        # This callback processes incoming MAVLink messages and updates the internal state
-        if message.get_type() == 'GLOBAL_POSITION_INT':
-            self._location = LatLng(message.lat / 1e7, message.lon / 1e7)
-            self._altitude = message.alt / 1000.0  # Altitude in meters
-            self._heading = Heading(message.hdg / 1e7)  # Heading in degrees
-        elif message.get_type() == 'ATTITUDE':
-            self._orientation = Rotation(pitch=math.degrees(message.pitch),
-                                         roll=math.degrees(message.roll),
-                                         yaw=math.degrees(message.yaw))
+        self.mavlink_delegate.subscribe(self._process_global_position, [dialect.MAVLINK_MSG_ID_GLOBAL_POSITION_INT])
+        self.mavlink_delegate.subscribe(self._process_attitude, [dialect.MAVLINK_MSG_ID_ATTITUDE])
+        # Baseline rates; profiles (ie. precision descent) override them
+        telemetry_rates = self.mavlink_delegate.telemetry_rates
+        telemetry_rates.request("location", dialect.MAVLINK_MSG_ID_GLOBAL_POSITION_INT, position_rate)
+        telemetry_rates.request("location", dialect.MAVLINK_MSG_ID_ATTITUDE, attitude_rate)
+
+    # These callbacks process incoming MAVLink messages and update the internal state.
+    # The delegate routes each message type to its own callback.
+
+    def _process_global_position(self, message):
+        altitude = message.alt / 1000.0  # Altitude in meters
+        self._location = LatLng(message.lat / 1e7, message.lon / 1e7)
+        self._altitude = altitude
+        self._heading = Heading(message.hdg / 1e7)  # Heading in degrees
+        self._position_history.append(time.time(), (self._location.lat, self._location.lng, altitude))
+
+    def _process_attitude(self, message):
+        self._orientation = Rotation(pitch=math.degrees(message.pitch),
+                                     roll=math.degrees(message.roll),
+                                     yaw=math.degrees(message.yaw))
+        self._attitude_history.append(time.time(),
+                                      (self._orientation.pitch, self._orientation.roll, self._orientation.yaw))
 
     def location(self) -> LatLng:
         if self._location is not None:
@@ -238,3 +352,21 @@ class MAVLinkLocationProvider(LocationProvider):
             return self._orientation
         else:
             raise ValueError("No valid orientation data available")
+
+    def location_at(self, timestamp: float) -> LatLng:
+        sample = self._position_history.at(timestamp)
+        if sample is None:
+            raise ValueError("No valid location data available")
+        return LatLng(float(sample[0]), float(sample[1]))
+
+    def altitude_at(self, timestamp: float) -> float:
+        sample = self._position_history.at(timestamp)
+        if sample is None:
+            raise ValueError("No valid altitude data available")
+        return float(sample[2])
+
+    def orientation_at(self, timestamp: float) -> Rotation:
+        sample = self._attitude_history.at(timestamp)
+        if sample is None:
+            raise ValueError("No valid orientation data available")
+        return Rotation(float(sample[0]), float(sample[1]), float(sample[2]))
@@ -1,27 +1,106 @@
-from typing import List, Callable
+from typing import Any, Deque, Dict, Iterable, List, Callable, Optional, Tuple, Union
 
+from collections import deque
 from pymavlink import mavutil
 import pymavlink.dialects.v20.all as dialect
+import threading
 import time
 
+from src.modules.imaging.pipeline import AsyncCallback
+
+
+def message_id(message_type: Union[str, int]) -> int:
+    """
+    Returns the MAVLink message ID of a message type given by name (ie.
+    "ATTITUDE") or already as an ID.
+    """
+    if isinstance(message_type, int):
+        return message_type
+
+    msg_id = getattr(dialect, f"MAVLINK_MSG_ID_{message_type}", None)
+    if msg_id is None:
+        raise ValueError(f"Unknown MAVLink message type {message_type}")
+    return msg_id
+
 
 class MAVLinkDelegate:
     """
     MAVLink connection delegate which forwards messages to subscribers.
+
+    `run()` blocks on the connection until a message arrives or the next
+    heartbeat (every `heartbeat_interval` seconds) is due, so no CPU is spent
+    waiting for telemetry.
+
+    Messages are routed on their ID, so listeners are only called for the
+    message types they subscribed to. Slow listeners can be given their own
+    queue and worker thread (see `subscribe`) so they cannot hold up the
+    others or the heartbeat.
     """
 
-    def __init__(self, conn_str: str = "tcp:127.0.0.1:14550"):
+    # The system and component this connection sends as
+    SOURCE_SYSTEM = 255
+    SOURCE_COMPONENT = 42
+
+    def __init__(self, conn_str: str = "tcp:127.0.0.1:14550", heartbeat_interval: float = 1.0):
         self._conn = mavutil.mavlink_connection(device=conn_str,
-                                                source_system=255,
-                                                source_component=42)
+                                                source_system=self.SOURCE_SYSTEM,
+                                                source_component=self.SOURCE_COMPONENT)
+        self.heartbeat_interval = heartbeat_interval
 
         self._listeners: List[Callable] = []
+        self._routes: Dict[int, List[Callable]] = {}
+        self._queued_listeners: List[AsyncCallback] = []
+
+        self.telemetry_rates = TelemetryRateManager(self)
 
-    def subscribe(self, listener: Callable):
+    def subscribe(self,
+                  listener: Callable,
+                  message_types: Optional[Iterable[Union[str, int]]] = None,
+                  queue_size: Optional[int] = None):
         """
         Subscribe to messages received from the mavlink connection.
+
+        If `message_types` (ie. ["ATTITUDE", "GLOBAL_POSITION_INT"], or their
+        message IDs) is given, `listener` is only called for messages of those
+        types. Otherwise it is called for every message.
+
+        Listeners are called on the receive thread unless `queue_size` is
+        given, in which case messages are queued for a worker thread which
+        calls `listener`. If the listener falls more than `queue_size` messages
+        behind, the oldest queued messages are dropped.
         """
-        self._listeners.append(listener)
+        if queue_size is not None:
+            queued_listener = AsyncCallback(listener, queue_size)
+            self._queued_listeners.append(queued_listener)
+            queued_listener.start()
+            listener = queued_listener
+
+        if message_types is None:
+            self._listeners.append(listener)
+            return
+
+        for message_type in message_types:
+            self._routes.setdefault(message_id(message_type), []).append(listener)
+
+    def queue_stats(self) -> List[Dict[str, Any]]:
+        """
+        Returns the name, current queue depth and number of dropped messages
+        of every listener subscribed with a queue.
+        """
+        return [{
+            "listener": queued_listener.stage.name,
+            "depth": queued_listener.queue.qsize(),
+            "dropped": queued_listener.dropped,
+        } for queued_listener in self._queued_listeners]
+
+    def _dispatch(self, message: dialect.MAVLink_message):
+        """
+        Forward `message` to every listener interested in it.
+        """
+        for listener in self._listeners:
+            listener(message)
+        for listener in self._routes.get(message.get_msgId(), ()):
+            listener(message)
 
     def send(self, mav_message: dialect.MAVLink_message):
         """
@@ -33,21 +112,17 @@ class MAVLinkDelegate:
         """
         Start the mavlink delegate. Will never return.
         """
-        last_heartbeat = time.time()
+        next_heartbeat = time.monotonic()
         while True:
-            msg = self._conn.recv_match(blocking=False)
-            if msg:
-                for listener in self._listeners:
-                    listener(msg)
-
-                continue  # Check for more messages immediately
-
-            now = time.time()
-            if now - last_heartbeat > 1:
-                last_heartbeat = now
+            now = time.monotonic()
+            if now >= next_heartbeat:
                 self.send(dialect.MAVLink_heartbeat_message(0, 0, 0, 0, 0, 0))
+                next_heartbeat = now + self.heartbeat_interval
 
-            time.sleep(0.0001)  # 100 us
+            # Sleep until a message arrives, but wake up in time for the next heartbeat
+            msg = self._conn.recv_match(blocking=True, timeout=max(next_heartbeat - time.monotonic(), 0))
+            if msg:
+                self._dispatch(msg)
 
 
 class MAVLinkDelegateMock(MAVLinkDelegate):
@@ -57,13 +132,17 @@ class MAVLinkDelegateMock(MAVLinkDelegate):
 
     def __init__(self):
         self._listeners = []
+        self._routes = {}
+        self._queued_listeners = []
+
+        # Nothing acknowledges commands here unless a test does, so do not retry them
+        self.telemetry_rates = TelemetryRateManager(self, ack_timeout=None)
 
     def send(self, mav_message: dialect.MAVLink_message):
         """
         Sends a mavlink message.
         """
-        for listener in self._listeners:
-            listener(mav_message)
+        self._dispatch(mav_message)
 
     def run(self):
         """
@@ -72,11 +151,246 @@ class MAVLinkDelegateMock(MAVLinkDelegate):
         raise AssertionError("Not implemented")
 
 
+class TelemetryRateManager:
+    """
+    Negotiates how often the autopilot streams each telemetry message.
+
+    Consumers (ie. the location provider) declare the rate they need for each
+    message with `request()`. The highest rate anyone asked for is requested
+    from the autopilot with MAV_CMD_SET_MESSAGE_INTERVAL, and only when it
+    changes. Once nobody needs a message any more, it goes back to the
+    autopilot's default rate.
+
+    Profiles (see `PROFILES`) set the rates for a phase of flight, so
+    bandwidth can go to attitude during a precision descent and be given back
+    during transit. While a profile is active, its rates override what
+    consumers asked for the messages it lists, in either direction.
+
+    Requests are confirmed by the autopilot's COMMAND_ACK; see `confirmed()`
+    and `wait_confirmed()`. COMMAND_ACK does not say which message it is for,
+    so only one command is outstanding at a time: the next is sent once the
+    autopilot acknowledged the last, or it was retried `retries` times
+    without an answer. With an `ack_timeout` of None, commands are never
+    retried and the next waits for an answer.
+    """
+
+    # Rates in Hz
+    PROFILES: Dict[str, Dict[str, float]] = {
+        "transit": {
+            "ATTITUDE": 1.0,
+            "GLOBAL_POSITION_INT": 2.0,
+        },
+        "precision_descent": {
+            "ATTITUDE": 50.0,
+            "GLOBAL_POSITION_INT": 10.0,
+            "DISTANCE_SENSOR": 20.0,
+        },
+    }
+
+    def __init__(self,
+                 mavlink_delegate: 'MAVLinkDelegate',
+                 target_system: int = 1,
+                 target_component: int = 1,
+                 ack_timeout: Optional[float] = 1.0,
+                 retries: int = 3):
+        self.mavlink_delegate = mavlink_delegate
+        self.target_system = target_system
+        self.target_component = target_component
+        self.ack_timeout = ack_timeout
+        self.retries = retries
+
+        # msg_id -> consumer -> Hz
+        self._requests: Dict[int, Dict[str, float]] = {}
+        # msg_id -> Hz set by the active profile
+        self._profile_rates: Dict[int, float] = {}
+        # msg_id -> Hz to request from the autopilot (0 for its default)
+        self._sent: Dict[int, float] = {}
+        # msg_id -> Hz the autopilot acknowledged
+        self._confirmed: Dict[int, float] = {}
+        # Messages whose rate is still to be sent, and the command awaiting an
+        # acknowledgement: (msg_id, Hz, attempts)
+        self._queue: Deque[int] = deque()
+        self._outstanding: Optional[Tuple[int, float, int]] = None
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Condition()
+        self.profile: Optional[str] = None
+
+        self.mavlink_delegate.subscribe(self._process_ack, [dialect.MAVLINK_MSG_ID_COMMAND_ACK])
+
+    def request(self, consumer: str, message_type: Union[str, int], rate_hz: float):
+        """
+        Declare that `consumer` needs `message_type` at least `rate_hz` times
+        a second. A rate of 0 withdraws the request.
+        """
+        msg_id = message_id(message_type)
+        with self._lock:
+            consumers = self._requests.setdefault(msg_id, {})
+            if rate_hz > 0:
+                consumers[consumer] = rate_hz
+            else:
+                consumers.pop(consumer, None)
+            self._update(msg_id)
+
+    def release(self, consumer: str):
+        """
+        Withdraw every request made by `consumer`.
+        """
+        with self._lock:
+            msg_ids = [msg_id for msg_id, consumers in self._requests.items() if consumer in consumers]
+            for msg_id in msg_ids:
+                self.request(consumer, msg_id, 0)
+
+    def set_profile(self, profile: Optional[str]):
+        """
+        Switch to one of the `PROFILES`, replacing the previous one. Messages
+        the profile does not list keep the rates consumers asked for. Pass
+        None to clear the profile.
+        """
+        if profile is not None and profile not in self.PROFILES:
+            raise ValueError(f"Unknown telemetry profile {profile}")
+
+        with self._lock:
+            previous = self._profile_rates
+            self.profile = profile
+            self._profile_rates = {
+                message_id(message_type): rate_hz
+                for message_type, rate_hz in self.PROFILES[profile].items()
+            } if profile is not None else {}
+
+            for msg_id in sorted(set(previous) | set(self._profile_rates)):
+                self._update(msg_id)
+
+    def rate(self, message_type: Union[str, int]) -> float:
+        """
+        Returns the rate in Hz requested from the autopilot for
+        `message_type`, or 0 if it is left at its default.
+        """
+        return self._sent.get(message_id(message_type), 0.0)
+
+    def confirmed(self, message_type: Union[str, int]) -> bool:
+        """
+        Returns True if the autopilot acknowledged the current rate for
+        `message_type`.
+        """
+        msg_id = message_id(message_type)
+        with self._lock:
+            return msg_id in self._sent and self._confirmed.get(msg_id) == self._sent[msg_id]
+
+    def wait_confirmed(self, message_type: Union[str, int], timeout: float) -> bool:
+        """
+        Wait up to `timeout` seconds for the autopilot to acknowledge the
+        current rate of `message_type`. Returns whether it did.
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while not self.confirmed(message_type):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._lock.wait(remaining)
+            return True
+
+    def _update(self, msg_id: int):
+        # Called with the lock held
+        rate_hz = self._profile_rates.get(msg_id)
+        if rate_hz is None:
+            rate_hz = max(self._requests.get(msg_id, {}).values(), default=0.0)
+        if self._sent.get(msg_id) == rate_hz or (rate_hz == 0 and msg_id not in self._sent):
+            return
+
+        self._sent[msg_id] = rate_hz
+        if msg_id not in self._queue:
+            self._queue.append(msg_id)
+        self._send_next()
+
+    def _send_next(self):
+        # Called with the lock held, so commands go out in the order they are
+        # tracked in
+        if self._outstanding is not None or not self._queue:
+            return
+
+        msg_id = self._queue.popleft()
+        self._send(msg_id, self._sent[msg_id], 1)
+
+    def _send(self, msg_id: int, rate_hz: float, attempt: int):
+        self._outstanding = (msg_id, rate_hz, attempt)
+        if self.ack_timeout is not None:
+            self._timer = threading.Timer(self.ack_timeout, self._ack_timed_out, args=(self._outstanding, ))
+            self._timer.daemon = True
+            self._timer.start()
+
+        interval_us = 1e6 / rate_hz if rate_hz > 0 else 0  # 0 restores the default rate
+        self.mavlink_delegate.send(
+            dialect.MAVLink_command_long_message(
+                target_system=self.target_system,
+                target_component=self.target_component,
+                command=dialect.MAV_CMD_SET_MESSAGE_INTERVAL,
+                confirmation=attempt - 1,
+                param1=msg_id,  # param1: message to set the interval of
+                param2=interval_us,  # param2: interval in us
+                param3=0,
+                param4=0,
+                param5=0,
+                param6=0,
+                param7=1))  # param7: send messaged to requester
+
+    def _finish(self):
+        # Called with the lock held once the outstanding command is answered or abandoned
+        assert self._outstanding is not None
+        msg_id, rate_hz, _ = self._outstanding
+        self._outstanding = None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        # The rate may have changed while waiting
+        if self._sent.get(msg_id) != rate_hz and msg_id not in self._queue:
+            self._queue.append(msg_id)
+        self._send_next()
+
+    def _ack_timed_out(self, command: Tuple[int, float, int]):
+        with self._lock:
+            if self._outstanding != command:
+                return
+
+            msg_id, rate_hz, attempt = command
+            if attempt < self.retries:
+                self._send(msg_id, rate_hz, attempt + 1)
+                return
+
+            print(f"Autopilot did not acknowledge {rate_hz} Hz for message {msg_id}")
+            self._finish()
+
+    def _process_ack(self, message: dialect.MAVLink_message):
+        if message.command != dialect.MAV_CMD_SET_MESSAGE_INTERVAL:
+            return
+        if message.result == dialect.MAV_RESULT_IN_PROGRESS:
+            return
+        # Acknowledgements of other systems' commands (ie. the ground station's).
+        # MAVLink 1 and older firmware leave the target as 0/0.
+        target = (message.target_system, message.target_component)
+        if target not in ((self.mavlink_delegate.SOURCE_SYSTEM, self.mavlink_delegate.SOURCE_COMPONENT), (0, 0)):
+            return
+
+        with self._lock:
+            if self._outstanding is None:
+                return
+            msg_id, rate_hz, _ = self._outstanding
+
+            if message.result == dialect.MAV_RESULT_ACCEPTED:
+                self._confirmed[msg_id] = rate_hz
+                self._lock.notify_all()
+            else:
+                print(f"Autopilot rejected {rate_hz} Hz for message {msg_id} (result {message.result})")
+            self._finish()
+
+
 class MessagePrinter:
 
-    def __init__(self, mavlink_delegate: MAVLinkDelegate):
+    def __init__(self, mavlink_delegate: MAVLinkDelegate, queue_size: int = 64):
         self.mavlink_delegate = mavlink_delegate
-        self.mavlink_delegate.subscribe(self._process_message)
+        # Printing is slow, so do it off the receive thread
+        self.mavlink_delegate.subscribe(self._process_message, queue_size=queue_size)
 
     def _process_message(self, message: dialect.MAVLink_message):
         print(message)
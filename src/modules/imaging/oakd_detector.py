@@ -0,0 +1,126 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+import json
+import pathlib
+
+from PIL import Image
+
+from .detector import Vec2, BoundingBox, BaseDetector
+from .frame import Frame
+
+# A recorded detection, in the same terms as depthai's ImgDetection: the
+# label, confidence and corners normalised to the image (0 to 1)
+DetectionMessage = List[Dict[str, Any]]
+
+
+def detection_to_dict(detection) -> Dict[str, Any]:
+    """
+    Convert a depthai ImgDetection (or anything with the same attributes) to
+    its recorded form.
+    """
+    return {
+        "label": int(detection.label),
+        "confidence": float(detection.confidence),
+        "xmin": float(detection.xmin),
+        "ymin": float(detection.ymin),
+        "xmax": float(detection.xmax),
+        "ymax": float(detection.ymax),
+    }
+
+
+def boxes_from_detections(detections: Iterable, width: int, height: int) -> List[BoundingBox]:
+    """
+    Convert detections from the OAK-D's detection network (depthai
+    ImgDetections, or their recorded dicts) to bounding boxes in pixels of a
+    `width` x `height` image, most confident first.
+    """
+    bounding_boxes = []
+    for detection in detections:
+        if not isinstance(detection, dict):
+            detection = detection_to_dict(detection)
+
+        x0 = min(max(detection["xmin"], 0.0), 1.0) * width
+        y0 = min(max(detection["ymin"], 0.0), 1.0) * height
+        x1 = min(max(detection["xmax"], 0.0), 1.0) * width
+        y1 = min(max(detection["ymax"], 0.0), 1.0) * height
+        bounding_boxes.append(BoundingBox(Vec2(x0, y0), Vec2(x1 - x0, y1 - y0),
+                                          detection["confidence"], detection.get("label")))
+
+    bounding_boxes.sort(key=lambda bb: bb.confidence or 0.0, reverse=True)
+    return bounding_boxes
+
+
+def load_recording(path: Union[str, pathlib.Path]) -> Iterator[DetectionMessage]:
+    """
+    Read a recorded stream of detection messages, saved as one JSON list of
+    detections per line.
+    """
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def save_recording(messages: Iterable[Iterable], path: Union[str, pathlib.Path]):
+    """
+    Save a stream of detection messages (lists of ImgDetections or their
+    recorded dicts) for `load_recording`.
+    """
+    with open(path, "w") as f:
+        for message in messages:
+            detections = [d if isinstance(d, dict) else detection_to_dict(d) for d in message]
+            f.write(json.dumps(detections) + "\n")
+
+
+class OakdDetector(BaseDetector):
+    """
+    Detector backed by the neural network running on the OAK-D itself (see
+    OakdCamera's `nn_blob_path`), so that no inference happens on the host.
+
+    The camera runs the network on every frame and sends its detections in
+    the same message as the colour image and point cloud, so frames captured
+    from it already carry their bounding boxes (`frame.detections`). This
+    detector just picks them up.
+
+    For testing without the hardware, pass a recorded stream of detection
+    messages (see `load_recording`) as `recording`: each call then takes the
+    next message, in order, for frames which carry no detections.
+    """
+
+    def __init__(self,
+                 min_confidence: float = 0.5,
+                 labels: Optional[Sequence[int]] = None,
+                 recording: Optional[Iterable[DetectionMessage]] = None):
+        """
+        :param min_confidence: Detections less confident than this are ignored.
+        :param labels: Class labels to keep, or None for all.
+        :param recording: Recorded detection messages to replay.
+        """
+        self.min_confidence = min_confidence
+        self.labels = set(labels) if labels is not None else None
+        self._recording = iter(recording) if recording is not None else None
+
+    def predict(self, image: Union[Frame, Image.Image]) -> Optional[BoundingBox]:
+        return self.select_best(self.predict_batch([image])[0])
+
+    def predict_batch(self, images: Sequence[Union[Frame, Image.Image]]) -> List[List[BoundingBox]]:
+        batch = []
+        for image in images:
+            batch.append([box for box in self._detections(image) if self._keep(box)])
+        return batch
+
+    def _detections(self, image: Union[Frame, Image.Image]) -> List[BoundingBox]:
+        detections = getattr(image, "detections", None)
+        if detections is not None:
+            return detections
+
+        if self._recording is None:
+            raise ValueError("The image was not captured by an OAK-D running a detection network")
+
+        width, height = image.size
+        return boxes_from_detections(next(self._recording, []), width, height)
+
+    def _keep(self, bounding_box: BoundingBox) -> bool:
+        if bounding_box.confidence is None or bounding_box.confidence < self.min_confidence:
+            return False
+        return self.labels is None or bounding_box.label in self.labels
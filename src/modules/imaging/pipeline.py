@@ -0,0 +1,218 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, List, Optional
+
+
+class DroppingQueue(queue.Queue):
+    """
+    Bounded queue which never blocks the producer. When the queue is full, the
+    oldest item is discarded to make room for the newest one, so consumers
+    always work on the most recent data.
+    """
+
+    def __init__(self, maxsize: int = 1):
+        if maxsize < 1:
+            raise ValueError("DroppingQueue must have a maxsize of at least 1")
+        super().__init__(maxsize)
+        self.dropped = 0
+
+    def put_latest(self, item: Any) -> bool:
+        """
+        Put `item` in the queue, dropping the oldest queued item if full.
+
+        Returns True if an older item had to be dropped.
+        """
+        dropped = False
+        while True:
+            try:
+                self.put_nowait(item)
+                return dropped
+            except queue.Full:
+                try:
+                    self.get_nowait()
+                    self.dropped += 1
+                    dropped = True
+                except queue.Empty:
+                    pass  # A consumer emptied the queue first, try again
+
+
+class Stage:
+    """
+    A single worker thread of a pipeline. Repeatedly takes an item from
+    `source`, passes it through `work` and forwards the result to `sink`.
+
+    The first stage of a pipeline has no `source`; `work` is then called with
+    no arguments. Returning None from `work` drops the item.
+
+    If `batch_size` is more than 1, the stage collects up to `batch_size`
+    items, waiting at most `batch_latency` seconds after the first one, and
+    calls `work` with the list of items. `work` must then return a list of
+    results, each of which is forwarded to `sink`.
+
+    Exceptions raised by `work` (ie. a camera failing a read) are logged and
+    the item dropped; the stage waits `error_delay` seconds and carries on.
+    """
+
+    def __init__(self,
+                 name: str,
+                 work: Callable,
+                 source: Optional[DroppingQueue] = None,
+                 sink: Optional[DroppingQueue] = None,
+                 poll_interval: float = 0.1,
+                 batch_size: int = 1,
+                 batch_latency: float = 0.0,
+                 error_delay: float = 0.1):
+        self.name = name
+        self.work = work
+        self.source = source
+        self.sink = sink
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.batch_latency = batch_latency
+        self.error_delay = error_delay
+        self.errors = 0
+        self.running = False
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+
+    def join(self, timeout: Optional[float] = None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def _collect_batch(self, first: Any) -> List[Any]:
+        """
+        Collect items following `first` until the batch is full or the
+        latency budget has been used up.
+        """
+        assert self.source is not None
+
+        batch = [first]
+        deadline = time.monotonic() + self.batch_latency
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.source.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while self.running:
+            try:
+                self._step()
+            except Exception as e:
+                self.errors += 1
+                print(f"Error in pipeline stage {self.name}: {e}")
+                time.sleep(self.error_delay)
+
+    def _step(self):
+        if self.source is None:
+            result = self.work()
+        else:
+            try:
+                item = self.source.get(timeout=self.poll_interval)
+            except queue.Empty:
+                return  # Check that we should still be running
+
+            if self.batch_size > 1:
+                results = self.work(self._collect_batch(item))
+                if self.sink is not None:
+                    for result in results:
+                        self.sink.put_latest(result)
+                return
+
+            result = self.work(item)
+
+        if result is not None and self.sink is not None:
+            self.sink.put_latest(result)
+
+
+class AsyncCallback:
+    """
+    Runs `callback` on its own thread so that a slow callback cannot stall
+    whoever calls it. Calling an `AsyncCallback` only queues the arguments;
+    if the callback is still busy with an earlier call, the oldest waiting
+    arguments are dropped so the callback always catches up to the latest.
+    """
+
+    def __init__(self, callback: Callable, queue_size: int = 1):
+        self.callback = callback
+        self.queue = DroppingQueue(queue_size)
+        self.stage = Stage(f"callback-{getattr(callback, '__name__', 'anonymous')}", self._call, self.queue)
+
+    def __call__(self, *args):
+        self.queue.put_latest(args)
+
+    def _call(self, args: tuple):
+        self.callback(*args)
+
+    @property
+    def dropped(self) -> int:
+        """
+        Number of calls dropped because the callback had fallen behind.
+        """
+        return self.queue.dropped
+
+    def start(self):
+        if not self.stage.running:
+            self.stage.start()
+
+    def stop(self):
+        self.stage.stop()
+        self.stage.join()
+
+
+class Pipeline:
+    """
+    Chain of `Stage`s connected by bounded `DroppingQueue`s. Each stage runs in
+    its own thread so slow stages (ie. inference) overlap with fast ones (ie.
+    camera I/O). Under backpressure stale items are dropped instead of queued.
+    """
+
+    def __init__(self, queue_size: int = 1):
+        self.queue_size = queue_size
+        self.stages: List[Stage] = []
+
+    def add_stage(self, name: str, work: Callable, batch_size: int = 1, batch_latency: float = 0.0):
+        """
+        Append a stage to the end of the pipeline. Stages must be added in
+        order; the first stage added is the producer. See `Stage` for
+        batching.
+        """
+        source = None
+        if self.stages:
+            # Batching stages need room to queue up a whole batch, both when
+            # collecting it and when handing on their results
+            source = DroppingQueue(max(self.queue_size, batch_size, self.stages[-1].batch_size))
+            self.stages[-1].sink = source
+        elif batch_size > 1:
+            raise ValueError("The first stage of a pipeline cannot batch")
+        self.stages.append(Stage(name, work, source, batch_size=batch_size, batch_latency=batch_latency))
+
+    @property
+    def dropped(self) -> int:
+        """
+        Total number of items dropped between stages due to backpressure.
+        """
+        return sum(stage.source.dropped for stage in self.stages
+                   if stage.source is not None)
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def stop(self):
+        for stage in self.stages:
+            stage.stop()
+        for stage in self.stages:
+            stage.join()
@@ -0,0 +1,321 @@
+import ctypes
+import threading
+import time
+from types import SimpleNamespace
+from typing import List, Tuple
+
+import numpy as np
+import smbus2
+
+from src.modules.autopilot.altimeter import (Altimeter, ExponentialMovingAverage, MovingAverage, MovingMedian,
+                                             OutlierRejectingAverage)
+from src.modules.autopilot.altimeter_fusion import FusedAltimeter
+from src.modules.autopilot.altimeter_mavlink import MavlinkAltimeterProvider
+from src.modules.autopilot.altimeter_oakd import OakdAltimeter
+from src.modules.autopilot.altimeter_xm125 import XM125
+from src.modules.imaging.camera import DepthCapture, OakdCamera
+from src.modules.imaging.frame import Frame
+
+
+def test_moving_average():
+    average = MovingAverage(3)
+    assert average.get_average() is None
+    assert not average.is_valid()
+
+    average.add(1)
+    average.add(2)
+    assert average.get_average() == 1.5
+    assert not average.is_valid()
+
+    average.add(3)
+    average.add(4)
+    assert average.is_valid()
+    assert average.get_average() == 3
+    assert average.values == [2, 3, 4]
+
+    average.reset()
+    assert average.get_average() is None
+    assert average.values == []
+
+
+def test_moving_average_long_run():
+    # The running sum must not drift over many values
+    values = np.random.default_rng(0).uniform(0, 10000, 10007)
+    average = MovingAverage(100)
+    for value in values:
+        average.add(value)
+    assert np.isclose(average.get_average(), values[-100:].mean())
+    assert np.allclose(average.values, values[-100:])
+
+
+def test_moving_median():
+    median = MovingMedian(5)
+    for value in [1000, 1001, 5000, 999, 1002]:
+        median.add(value)
+    assert median.get_average() == 1001
+
+
+def test_exponential_moving_average():
+    average = ExponentialMovingAverage(3)
+    assert average.alpha == 0.5
+    assert average.get_average() is None
+
+    average.add(0)
+    average.add(4)
+    assert average.get_average() == 2
+    assert not average.is_valid()
+    average.add(4)
+    assert average.get_average() == 3
+    assert average.is_valid()
+
+    try:
+        ExponentialMovingAverage(3, alpha=0)
+    except ValueError:
+        return
+    assert False
+
+
+def test_outlier_rejecting_average():
+    average = OutlierRejectingAverage(5, threshold=3.0, min_spread=5.0)
+    for value in [1000, 1002, 998, 1001, 999]:
+        assert average.add(value)
+
+    # A single spike is ignored
+    assert not average.add(3000)
+    assert average.rejected == 1
+    assert average.get_average() == 1000
+
+    # But a lasting change is followed
+    for _ in range(4):
+        average.add(2000)
+    assert average.add(2000)
+    assert average.get_average() == 2000
+    assert not average.is_valid()
+
+
+class FakeXM125Bus:
+    """
+    Serves the XM125's registers over a fake I2C bus, with a new result ready
+    for every measure command.
+    """
+
+    def __init__(self):
+        self.registers = {XM125.REG_DETECTOR_STATUS: 0}
+        self.commands: List[int] = []
+        self.reads: List[Tuple[int, int]] = []
+        self.peaks = [(1500, 300), (4000, 0xFFFFFF00)]
+
+    def i2c_rdwr(self, write, read):
+        reg_addr = int.from_bytes(bytes(write), "big")
+        count = len(read) // 4
+        self.reads.append((reg_addr, count))
+        data = b"".join(self.registers.get(reg_addr + i, 0).to_bytes(4, "big") for i in range(count))
+        ctypes.memmove(read.buf, data, len(data))
+
+    def write_i2c_block_data(self, _address, register_msb, data):
+        reg_addr = (register_msb << 8) | data[0]
+        value = int.from_bytes(bytes(data[1:]), "big")
+        self.registers[reg_addr] = value
+        if reg_addr == XM125.REG_COMMAND:
+            self.commands.append(value)
+            if value == XM125.CMD_MEASURE_DISTANCE:
+                self.registers[XM125.REG_DISTANCE_RESULT] = len(self.peaks)
+                for i, (distance, strength) in enumerate(self.peaks):
+                    self.registers[XM125.REG_PEAK0_DISTANCE + i] = distance
+                    self.registers[XM125.REG_PEAK0_STRENGTH + i] = strength
+
+
+def test_xm125_continuous(monkeypatch):
+    bus = FakeXM125Bus()
+    monkeypatch.setattr(smbus2, "SMBus", lambda _bus: bus)
+    sensor = XM125(average_window=1, continuous=True)
+
+    for _ in range(3):
+        peaks = sensor.measure()
+        assert [peak['raw'][0] for peak in peaks] == [1500, 4000]
+        assert sensor.get_distance_mm() == 1500
+
+    # Each measurement is read in one go and the next one started straight away
+    assert bus.commands == [XM125.CMD_MEASURE_DISTANCE] * 4
+    result_reads = [read for read in bus.reads if read[0] == XM125.REG_DISTANCE_RESULT]
+    assert result_reads == [(XM125.REG_DISTANCE_RESULT, XM125.RESULT_BLOCK_SIZE)] * 3
+
+    # Calibration is only redone when a result asks for it
+    bus.registers[XM125.REG_DISTANCE_RESULT] |= XM125.DISTANCE_RESULT_CALIBRATION_NEEDED
+    monkeypatch.setattr(time, "sleep", lambda _: None)
+    assert sensor.measure() == []
+    assert bus.commands[-1] == XM125.CMD_RECALIBRATE
+    assert len(sensor.measure()) == 2
+    assert bus.commands[-2:] == [XM125.CMD_MEASURE_DISTANCE] * 2
+
+
+class StallingAltimeter(Altimeter):
+    """
+    Gives one good sample, then stalls on every measurement like a sensor
+    stuck in error recovery.
+    """
+
+    def __init__(self):
+        super().__init__(min_distance_mm=250, max_distance_mm=10000)
+        self.measurements = 0
+
+    def begin(self) -> bool:
+        return True
+
+    def measure(self):
+        self.measurements += 1
+        if self.measurements > 1:
+            time.sleep(0.5)
+            return []
+        return [{'raw': (1500, 0), 'averaged': (1500, 0)}]
+
+    def get_distance_mm(self):
+        return 1500.0
+
+    @property
+    def mavlink_sensor_type(self) -> int:
+        return self.SENSOR_TYPE_RADAR
+
+
+def test_altimeter_provider_publishes_through_stalls():
+    sent: List[Tuple] = []
+    provider = MavlinkAltimeterProvider(StallingAltimeter(), "", update_rate_hz=50, stale_timeout=0.1,
+                                        drop_timeout=0.3)
+    provider._tstart = time.monotonic()
+    provider._mavlink_connection = SimpleNamespace(mav=SimpleNamespace(distance_sensor_send=lambda *args: sent.append(args)))
+
+    provider._running = True
+    threads = [threading.Thread(target=provider._measurement_loop), threading.Thread(target=provider._publish_loop)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.5)
+    provider._running = False
+    for thread in threads:
+        thread.join()
+
+    # Sending carried on at about the full rate while the sensor was stuck,
+    # flagged as stale, and stopped once the sample was too old
+    covariances = [message[-1] for message in sent]
+    assert 10 <= len(sent) <= 17
+    assert covariances[0] == 0
+    assert MavlinkAltimeterProvider.COVARIANCE_UNKNOWN in covariances
+    assert all(message[3] == 150 for message in sent)
+    age = provider.get_latest_age()
+    assert age is not None and age > 0.3
+
+
+class ConstantAltimeter(Altimeter):
+    """
+    Reads a fixed distance at a fixed rate.
+    """
+
+    def __init__(self, distance_mm, variance_mm2, interval):
+        super().__init__(min_distance_mm=250, max_distance_mm=10000)
+        self.distance_mm = distance_mm
+        self.variance_mm2 = variance_mm2
+        self.interval = interval
+
+    def begin(self) -> bool:
+        return True
+
+    def measure(self):
+        time.sleep(self.interval)
+        return [{'distance': self.distance_mm}]
+
+    def get_distance_mm(self):
+        return self.distance_mm
+
+    def get_variance_mm2(self):
+        return self.variance_mm2
+
+    @property
+    def mavlink_sensor_type(self) -> int:
+        return self.SENSOR_TYPE_RADAR
+
+
+def test_fused_altimeter_filter():
+    fused = FusedAltimeter([ConstantAltimeter(0, 0, 0)], acceleration_variance=1.0)
+    assert fused.get_distance_mm() is None
+
+    # Readings from a precise and a noisy sensor, interleaved
+    rng = np.random.default_rng(0)
+    start = time.monotonic() - 2
+    for i in range(100):
+        t = start + i * 0.01
+        fused.update(2000 + rng.normal(0, 10), 10 ** 2, t)
+        fused.update(2000 + rng.normal(0, 50), 50 ** 2, t + 0.005)
+
+    distance = fused._estimate(start + 1)[0][0]
+    variance = fused._estimate(start + 1)[1][0, 0]
+    assert abs(distance - 2000) < 10
+    assert variance < 10 ** 2
+
+    # An outlier is ignored
+    assert not fused.update(5000, 10 ** 2, start + 1)
+    assert fused.rejected == 1
+
+
+def test_fused_altimeter_sensors():
+    radar = ConstantAltimeter(2000, 20 ** 2, 0.1)
+    depth = ConstantAltimeter(2040, 40 ** 2, 0.2)
+    fused = FusedAltimeter([radar, depth], output_interval=0.02)
+    assert fused.min_distance_mm == 250
+
+    # The radar at 10 Hz and the depth camera at 5 Hz
+    start = time.monotonic() - 2
+    for i in range(10):
+        fused.update(radar.distance_mm, radar.variance_mm2, start + i * 0.1)
+        if i % 2 == 0:
+            fused.update(depth.distance_mm, depth.variance_mm2, start + i * 0.1 + 0.05)
+
+    # Estimated between readings, and weighted towards the more precise sensor
+    estimates = [fused._estimate(start + 0.9 + i * 0.02) for i in range(5)]
+    distances = [estimate[0][0] for estimate in estimates]
+    assert all(1990 < distance < 2030 for distance in distances)
+    assert np.mean(distances) < 2020
+    assert all(estimate[1][0, 0] < 40 ** 2 for estimate in estimates)
+
+    # The provider publishes at the fused rate
+    assert MavlinkAltimeterProvider(fused, "").update_interval == 0.02
+    assert MavlinkAltimeterProvider(radar, "").update_interval == 0.1
+
+    # The sensors are measured on their own threads
+    assert fused.begin()
+    try:
+        outputs: List = []
+        deadline = time.monotonic() + 5
+        while not outputs and time.monotonic() < deadline:
+            outputs = fused.measure()
+    finally:
+        fused.stop()
+    assert 1980 < outputs[0]['distance'] < 2040
+
+
+class RecordedOakdCamera(OakdCamera):
+    """
+    Gives the same depth capture every time, without a device.
+    """
+
+    def __init__(self, capture: DepthCapture):
+        self._capture = capture
+
+    def capture_with_depth(self) -> DepthCapture:
+        return self._capture
+
+
+def test_oakd_altimeter():
+    height, width = 40, 50
+    points = np.zeros((height, width, 3))
+    points[..., 2] = 3000
+    points[::3, ::3, 2] = 0  # No depth
+    points[20, 25, 2] = 9000  # Spurious depth
+    capture = DepthCapture(Frame(np.zeros((height, width, 3), dtype=np.uint8)), points.reshape(-1, 3), width, height)
+
+    altimeter = OakdAltimeter(RecordedOakdCamera(capture))
+    assert len(altimeter.measure()) == 1
+    assert altimeter.get_distance_mm() == 3000
+    assert altimeter.get_variance_mm2() == 0
+
+    # Too little of the middle has a depth
+    points[..., 2] = 0
+    assert altimeter.measure() == []
@@ -4,7 +4,9 @@
 # function raises an error, the test fails. Otherwise, the test passes.
 # See test/test_camera.py for an example.
 
-from typing import Optional
+from typing import List, Optional
+import threading
+import time
 
 from PIL import Image
 
@@ -12,6 +14,7 @@ from src.modules.imaging.analysis import ImageAnalysisDelegate
 from src.modules.imaging.camera import DebugCamera
 from src.modules.imaging.location import DebugLocationProvider
 from src.modules.imaging.debug import ImageAnalysisDebugger
+from src.modules.imaging.detector import BaseDetector
 from dep.labeller.benchmarks.detector import LandingPadDetector, BoundingBox
 from dep.labeller.loader.label import Vec2
 
@@ -108,3 +111,179 @@ def test_analysis_debugger():
     debug.hide()
     run_analysis()
     assert not debug.is_visible
+
+
+def test_analysis_pipelined():
+    camera = DebugCamera("res/test-image.jpeg")
+    detector = DebugLandingPadDetector(bb=BoundingBox(Vec2(20, 20), Vec2(50, 50)))
+    location_provider = DebugLocationProvider()
+    location_provider.set_altitude(1.0)
+    analysis = ImageAnalysisDelegate(detector,
+                                     camera,
+                                     location_provider,
+                                     pipelined=True)
+
+    results = []
+    received = threading.Event()
+
+    def _callback(image, location):
+        results.append((image, location))
+        received.set()
+
+    analysis.subscribe(_callback)
+    analysis.start()
+    try:
+        assert received.wait(timeout=5), "No results from the pipeline"
+    finally:
+        analysis.stop()
+
+    image, location = results[0]
+    assert image is not None
+    assert location is not None
+
+    # Every stage has been joined, so no more results can arrive
+    count = len(results)
+    time.sleep(0.2)
+    assert len(results) == count
+
+
+class FlakyCamera(DebugCamera):
+    """
+    Fails its first read, like a webcam dropping a frame.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.failed = False
+
+    def capture_frame(self):
+        if not self.failed:
+            self.failed = True
+            raise RuntimeError("Failed to capture image from webcam")
+        return super().capture_frame()
+
+
+def test_analysis_pipelined_capture_error():
+    camera = FlakyCamera("res/test-image.jpeg")
+    detector = DebugLandingPadDetector(bb=BoundingBox(Vec2(20, 20), Vec2(50, 50)))
+    location_provider = DebugLocationProvider()
+    location_provider.set_altitude(1.0)
+    analysis = ImageAnalysisDelegate(detector,
+                                     camera,
+                                     location_provider,
+                                     pipelined=True)
+
+    received = threading.Event()
+    analysis.subscribe(lambda image, location: received.set())
+    analysis.start()
+    try:
+        # The failed read is skipped rather than stopping the capture stage
+        assert received.wait(timeout=5), "No results after a failed capture"
+        assert camera.failed
+    finally:
+        analysis.stop()
+
+
+class DebugBatchDetector(BaseDetector):
+
+    def __init__(self, bb: Optional[BoundingBox] = None):
+        self.bounding_box = bb
+        self.batch_sizes: List[int] = []
+
+    def predict_batch(self, images):
+        self.batch_sizes.append(len(images))
+        return [[self.bounding_box] for _ in images]
+
+
+def test_analysis_batched():
+    camera = DebugCamera("res/test-image.jpeg")
+    detector = DebugBatchDetector(BoundingBox(Vec2(20, 20), Vec2(50, 50)))
+    location_provider = DebugLocationProvider()
+    location_provider.set_altitude(1.0)
+    analysis = ImageAnalysisDelegate(detector,
+                                     camera,
+                                     location_provider,
+                                     batch_size=3,
+                                     batch_latency=5.0)
+
+    results = []
+    analysis.subscribe(lambda image, location: results.append(location))
+
+    # A whole batch goes through the detector at once, and every frame in it
+    # is still reported to subscribers
+    analysis._analyze_image()
+    assert detector.batch_sizes == [3]
+    assert len(results) == 3
+    assert all(location is not None for location in results)
+
+
+def test_analysis_result_shared():
+    camera = DebugCamera("res/test-image.jpeg")
+    detector = DebugLandingPadDetector(bb=BoundingBox(Vec2(20, 20), Vec2(50, 50)))
+    location_provider = DebugLocationProvider()
+    location_provider.set_altitude(1.0)
+    analysis = ImageAnalysisDelegate(detector, camera, location_provider)
+    assert analysis.latest_result() is None
+
+    results = []
+    analysis.subscribe(lambda image, location: results.append((image, location)))
+    analysis.subscribe(lambda image, location: results.append((image, location)))
+
+    analysis._analyze_image()
+    result = analysis.latest_result()
+    assert result is not None
+    assert result.bounding_box == detector.bounding_box
+    assert result.altitude == 1.0
+    assert result.offset is not None
+
+    # Both subscribers got the same, single result
+    assert len(results) == 2
+    assert results[0][0] is results[1][0] is result.frame
+    assert results[0][1] == results[1][1] == result.offset
+
+    # Subscribers can be given the result itself
+    shared = []
+    analysis.subscribe(shared.append, with_result=True)
+    analysis._analyze_image()
+    assert shared == [analysis.latest_result()]
+    assert shared[0].bounding_box == detector.bounding_box
+
+    detector.bounding_box = None
+    analysis._analyze_image()
+    result = analysis.latest_result()
+    assert result is not None
+    assert result.bounding_box is None and result.offset is None
+
+
+def test_analysis_async_subscriber():
+    camera = DebugCamera("res/test-image.jpeg")
+    detector = DebugLandingPadDetector(bb=BoundingBox(Vec2(20, 20), Vec2(50, 50)))
+    location_provider = DebugLocationProvider()
+    location_provider.set_altitude(1.0)
+    analysis = ImageAnalysisDelegate(detector, camera, location_provider)
+
+    release = threading.Event()
+    received = []
+
+    def _slow_callback(image, location):
+        release.wait(timeout=5)
+        received.append(location)
+
+    analysis.subscribe(_slow_callback, asynchronous=True)
+    try:
+        # A blocked subscriber does not hold up the analysis
+        start = time.time()
+        for _ in range(5):
+            analysis._analyze_image()
+        assert time.time() - start < 1
+
+        release.set()
+        deadline = time.time() + 5
+        while not received and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        analysis.stop()
+
+    # Updates which arrived while the subscriber was busy were dropped
+    assert 1 <= len(received) < 5
+    assert analysis.async_subscribers[0].dropped > 0
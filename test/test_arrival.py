@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+from src.modules.autopilot.arrival import ArrivalMonitor
+
+
+class FakeVehicle:
+    """
+    Just enough of a dronekit Vehicle to drive an ArrivalMonitor.
+    """
+
+    def __init__(self):
+        self.location = SimpleNamespace(global_relative_frame=SimpleNamespace(alt=0.0))
+        self.mode = SimpleNamespace(name="GUIDED")
+        self._listeners = {}
+
+    def add_attribute_listener(self, name, callback):
+        self._listeners.setdefault(name, []).append(callback)
+
+    def set_altitude(self, alt):
+        self.location.global_relative_frame = SimpleNamespace(alt=alt)
+        for callback in self._listeners.get("location.global_relative_frame", []):
+            callback(self, "location.global_relative_frame", self.location.global_relative_frame)
+
+    def set_mode(self, name):
+        self.mode = SimpleNamespace(name=name)
+        for callback in self._listeners.get("mode", []):
+            callback(self, "mode", self.mode)
+
+
+def _altitude_distance(target):
+    return lambda location: abs(location.alt - target)
+
+
+def test_arrival_resolves_on_telemetry():
+    vehicle = FakeVehicle()
+    monitor = ArrivalMonitor(vehicle)
+
+    low = monitor.watch(_altitude_distance(5.0), 1.0)
+    high = monitor.watch(_altitude_distance(10.0), 1.0)
+    assert monitor.pending == 2
+
+    vehicle.set_altitude(3.0)
+    assert not low.done() and not high.done()
+
+    vehicle.set_altitude(4.5)
+    assert low.result(timeout=0) is True
+    assert not high.done()
+
+    vehicle.set_altitude(9.5)
+    assert high.result(timeout=0) is True
+    assert monitor.pending == 0
+
+
+def test_arrival_already_there():
+    vehicle = FakeVehicle()
+    monitor = ArrivalMonitor(vehicle)
+
+    future = monitor.watch(_altitude_distance(0.5), 1.0)
+    assert future.result(timeout=0) is True
+
+
+def test_arrival_timeout():
+    vehicle = FakeVehicle()
+    monitor = ArrivalMonitor(vehicle)
+
+    future = monitor.watch(_altitude_distance(10.0), 1.0, timeout=0.05)
+    assert future.result(timeout=5) is False
+    assert monitor.pending == 0
+
+
+def test_arrival_leaving_guided():
+    vehicle = FakeVehicle()
+    monitor = ArrivalMonitor(vehicle)
+
+    future = monitor.watch(_altitude_distance(10.0), 1.0)
+    vehicle.set_mode("RTL")
+    assert future.result(timeout=0) is False
+
+    # Not in GUIDED, so the vehicle will not be going anywhere
+    assert monitor.watch(_altitude_distance(10.0), 1.0).result(timeout=0) is False
@@ -9,11 +9,10 @@ from src.modules.imaging.mavlink import MAVLinkDelegate
 from src.modules.imaging.battery import MAVLinkBatteryStatusProvider
 
 CONN_STR = "udp:127.0.0.1:14551"
-MESSENGER_PORT = 14552
 
 drone = connect(CONN_STR, wait_ready=False)
 
-nav = navigator.Navigator(drone, MESSENGER_PORT)
+nav = navigator.Navigator(drone)
 lander = lander.Lander()
 
 nav.send_status_message("Shepard is online")
@@ -1,8 +1,12 @@
 from PIL import Image
 import hashlib
+import numpy as np
 import os
+import time
 
-from src.modules.imaging.camera import DebugCamera
+from src.modules.imaging.camera import DebugCamera, DepthCapture, ThreadedCamera
+from src.modules.imaging.detector import BoundingBox, Vec2
+from src.modules.imaging.frame import Frame, as_frame
 
 
 def md5sum(path: str | os.PathLike) -> bytes:
@@ -55,3 +59,138 @@ def test_debug_camera(tmp_path):
     cam.set_size((600, 400))
     im = cam.capture()
     assert im.tobytes() == og_im.tobytes()
+
+
+def test_threaded_camera():
+    cam = ThreadedCamera(DebugCamera("res/test-image.jpeg"))
+    cam.start()
+    try:
+        im, timestamp, sequence = cam.capture_with_metadata(timeout=5)
+        assert im.width == 600
+        assert im.height == 400
+        assert sequence >= 1
+        assert timestamp <= time.time()
+
+        # The grabber keeps capturing in the background
+        deadline = time.time() + 5
+        while cam.sequence <= sequence and time.time() < deadline:
+            time.sleep(0.01)
+        _, new_timestamp, new_sequence = cam.capture_with_metadata()
+        assert new_sequence > sequence
+        assert new_timestamp >= timestamp
+
+        # Frames match the source
+        og_im = Image.open("res/test-image.jpeg")
+        frame = cam.capture_frame()
+        assert frame.to_image().tobytes() == og_im.tobytes()
+    finally:
+        cam.stop()
+
+    # The newest frame is shared rather than copied for every caller
+    frame = cam.capture_frame()
+    assert cam.capture_frame() is frame
+    assert frame.sequence == cam.sequence
+
+
+def test_frame_conversions():
+    og_im = Image.open("res/test-image.jpeg")
+    rgb = np.asarray(og_im)
+    bgr = np.ascontiguousarray(rgb[:, :, ::-1])
+
+    frame = Frame(bgr, "BGR")
+    assert (frame.width, frame.height) == (600, 400)
+
+    # The native order is served without any conversion or copy
+    assert frame.bgr is bgr
+
+    # Conversions are computed once and then cached
+    assert np.array_equal(frame.rgb, rgb)
+    assert frame.rgb is frame.rgb
+    assert frame.gray.shape == (400, 600)
+    assert frame.to_image() is frame.to_image()
+    assert frame.to_image().tobytes() == og_im.tobytes()
+
+    # Resizing happens lazily, to the size requested by the camera
+    small = Frame(bgr, "BGR", size=(100, 50))
+    assert small.raw is bgr
+    assert small.bgr.shape == (50, 100, 3)
+    assert small.to_image().size == (100, 50)
+
+
+def test_debug_camera_frame():
+    cam = DebugCamera("res/test-image.jpeg")
+
+    frame = cam.capture_frame()
+    assert frame.color_order == "RGB"
+    assert frame.rgb.shape == (400, 600, 3)
+    assert frame.to_image() is cam.capture()  # No PIL round-trip
+
+    # Detectors accept both frames and PIL images
+    assert as_frame(frame) is frame
+    assert np.array_equal(as_frame(cam.capture()).rgb, frame.rgb)
+
+
+def test_depth_capture_points():
+    height, width = 4, 5
+    ys, xs = np.mgrid[0:height, 0:width]
+    point_cloud = np.stack([xs * 10, ys * 10, np.full(xs.shape, 1000)], axis=-1).reshape(-1, 3).astype(np.float32)
+    bgr = np.zeros((height, width, 3), dtype=np.uint8)
+    capture = DepthCapture(Frame(bgr, "BGR"), point_cloud, width, height)
+
+    # The points are a view onto the cloud, not a copy
+    assert capture.points.shape == (height, width, 3)
+    assert np.shares_memory(capture.points, point_cloud)
+    assert capture.points.dtype == np.float32
+
+    assert np.array_equal(capture.get_point(3, 2), (30, 20, 1000))
+    assert np.array_equal(capture.get_points([0, 4], [1, 3]), [(0, 10, 1000), (40, 30, 1000)])
+
+    assert capture.distance_between_points(0, 0, 4, 3) == 50
+    distances = capture.distance_between_points(np.array([0, 1]), np.array([0, 0]), np.array([3, 1]), np.array([0, 3]))
+    assert np.array_equal(distances, [30, 30])
+
+    # The colour image is only converted when asked for
+    assert capture.frame.raw is bgr
+    assert capture.rgb.shape == (height, width, 3)
+
+
+def test_depth_capture_regions():
+    height, width = 20, 30
+    ys, xs = np.mgrid[0:height, 0:width]
+    # A tilted floor, 2000 mm below the camera at the left edge
+    depth = 2000 + xs * 10.0
+    point_cloud = np.stack([xs * 10.0, ys * 10.0, depth], axis=-1).astype(np.float32)
+    point_cloud[:5, :10] = 0  # No depth in the top left
+    point_cloud[15, 25, 2] = 50000  # A spurious depth
+    capture = DepthCapture(Frame(np.zeros((height, width, 3), dtype=np.uint8)), point_cloud.reshape(-1, 3),
+                           width, height)
+
+    box = BoundingBox(Vec2(0, 0), Vec2(20, 10))
+    assert capture.region(box).shape == (10, 20, 3)
+    assert capture.region_valid_ratio(box) == 0.75
+    assert len(capture.region_points(box)) == 150
+
+    # Boxes are clipped to the frame
+    assert capture.region(BoundingBox(Vec2(25, 15), Vec2(100, 100))).shape == (5, 5, 3)
+    assert capture.region_valid_ratio(BoundingBox(Vec2(0, 0), Vec2(5, 5))) == 0
+    assert capture.region_depth(BoundingBox(Vec2(0, 0), Vec2(5, 5))) is None
+
+    spike = BoundingBox(Vec2(23, 13), Vec2(5, 5))
+    assert capture.region_depth(spike) == 2250
+    trimmed = capture.region_depth(spike, "trimmed_mean", trim=0.1)
+    assert trimmed is not None and abs(trimmed - 2250) < 1
+    position = capture.region_position(spike)
+    assert position is not None and np.allclose(position, (250, 150, 2250))
+
+    plane = capture.fit_plane(BoundingBox(Vec2(10, 0), Vec2(10, 10)))
+    assert plane is not None
+    normal, distance = plane
+    expected = np.array([1.0, 0.0, -1.0]) / np.sqrt(2)
+    assert np.allclose(normal, expected, atol=1e-6)
+    assert np.isclose(distance, 2000 / np.sqrt(2))
+
+    try:
+        capture.region_depth(box, "mean")
+    except ValueError:
+        return
+    assert False
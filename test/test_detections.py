@@ -0,0 +1,48 @@
+import numpy as np
+
+from src.modules.autopilot.detections import DetectionRegistry
+
+
+def test_detection_registry_merges_sightings():
+    registry = DetectionRegistry(radius=5)
+
+    track, new = registry.add((0, 0))
+    assert new
+    for position in [(1, 0), (0, 1), (-1, 0), (0, -1)]:
+        merged, new = registry.add(position)
+        assert not new
+        assert merged is track
+
+    assert len(registry) == 1
+    assert track.count == 5
+    assert np.allclose(track.mean, (0, 0))
+    assert np.allclose(track.covariance, np.cov([(0, 1, 0, -1, 0), (0, 0, 1, 0, -1)]))
+
+    # Far enough away to be another target, including across cell borders
+    other, new = registry.add((20, -7))
+    assert new
+    assert registry.nearest((19, -6)) is other
+    assert registry.nearest((10, -3)) is None
+    assert np.allclose(registry.targets(), [(0, 0), (20, -7)])
+
+
+def test_detection_registry_follows_moving_mean():
+    registry = DetectionRegistry(radius=2)
+
+    # The mean drifts into the next cell as sightings are merged
+    track, _ = registry.add((1.9, 0))
+    for _ in range(9):
+        merged, new = registry.add((2.5, 0))
+        assert merged is track and not new
+
+    assert np.isclose(track.mean[0], 2.44)
+    assert registry.nearest((4.4, 0)) is track
+    assert registry.nearest((0, 0)) is None
+
+
+def test_detection_registry_radius():
+    try:
+        DetectionRegistry(radius=0)
+    except ValueError:
+        return
+    assert False
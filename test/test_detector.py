@@ -0,0 +1,79 @@
+from typing import Tuple
+
+import numpy as np
+
+from src.modules.imaging.detector import IrDetector
+from src.modules.imaging.frame import Frame
+
+
+def beacon_frame(center: Tuple[int, int], size=(640, 480)) -> Frame:
+    """
+    Dark BGR frame with a single bright 6x6 beacon centered at `center`.
+    """
+    img = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+    x, y = center
+    img[y - 3:y + 3, x - 3:x + 3] = 255
+    return Frame(img, "BGR")
+
+
+class CountingFrame(Frame):
+    """
+    Frame which records whether the whole image was converted to grayscale.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.full_conversions = 0
+
+    def as_order(self, color_order: str) -> np.ndarray:
+        if color_order == "GRAY" and color_order not in self._cache:
+            self.full_conversions += 1
+        return super().as_order(color_order)
+
+
+def counting_beacon_frame(center: Tuple[int, int]) -> CountingFrame:
+    return CountingFrame(beacon_frame(center).raw, "BGR")
+
+
+def test_ir_detector():
+    detector = IrDetector()
+
+    bb = detector.predict(beacon_frame((100, 200)))
+    assert bb is not None
+    assert (bb.position.x, bb.position.y) == (97, 197)
+    assert (bb.size.x, bb.size.y) == (6, 6)
+
+    assert detector.predict(Frame(np.zeros((480, 640, 3), dtype=np.uint8), "BGR")) is None
+
+
+def test_ir_detector_tracking():
+    detector = IrDetector(tracking=True)
+
+    # First detection needs a full-frame search
+    frame = counting_beacon_frame((100, 100))
+    bb = detector.predict(frame)
+    assert bb is not None
+    assert frame.full_conversions == 1
+
+    # Beacon moving at a constant velocity stays inside the predicted ROI, so
+    # the full frame is never converted
+    for i in range(1, 10):
+        center = (100 + 20 * i, 100 + 10 * i)
+        frame = counting_beacon_frame(center)
+        bb = detector.predict(frame)
+        assert bb is not None
+        assert (bb.position.x + 3, bb.position.y + 3) == center
+        assert frame.full_conversions == 0
+
+    # Jumping out of the ROI falls back to a full-frame search
+    frame = counting_beacon_frame((600, 50))
+    bb = detector.predict(frame)
+    assert bb is not None
+    assert (bb.position.x + 3, bb.position.y + 3) == (600, 50)
+    assert frame.full_conversions == 1
+
+    # Losing the beacon entirely resets the track
+    assert detector.predict(Frame(np.zeros((480, 640, 3), dtype=np.uint8), "BGR")) is None
+    frame = counting_beacon_frame((300, 300))
+    assert detector.predict(frame) is not None
+    assert frame.full_conversions == 1
@@ -0,0 +1,65 @@
+import numpy as np
+
+from src.modules.autopilot.geofence import Geofence
+
+# An L shaped fence
+L_FENCE = [(0, 0), (10, 0), (10, 4), (4, 4), (4, 10), (0, 10)]
+
+
+def test_geofence_contains():
+    fence = Geofence(L_FENCE)
+
+    assert fence.contains((2, 2))
+    assert fence.contains((8, 2))
+    assert fence.contains((2, 8))
+    assert not fence.contains((8, 8))  # In the notch
+    assert not fence.contains((-1, 5))
+    assert not fence.contains((11, 2))
+
+
+def test_geofence_closed_polygon():
+    # Repeating the first vertex at the end makes no difference
+    open_fence = Geofence(L_FENCE)
+    closed_fence = Geofence(L_FENCE + [L_FENCE[0]])
+    assert np.array_equal(open_fence.vertices, closed_fence.vertices)
+
+    try:
+        Geofence([(0, 0), (1, 1)])
+        assert False, "A geofence with 2 vertices should not be allowed"
+    except ValueError:
+        pass
+
+
+def test_geofence_contains_many():
+    fence = Geofence(L_FENCE)
+
+    rng = np.random.default_rng(0)
+    points = rng.uniform(-2, 12, size=(1000, 2))
+    inside = fence.contains_many(points)
+    assert inside.shape == (1000, )
+
+    expected = ((points[:, 0] > 0) & (points[:, 0] < 10) & (points[:, 1] > 0) & (points[:, 1] < 10) &
+                ~((points[:, 0] > 4) & (points[:, 1] > 4)))
+    assert np.array_equal(inside, expected)
+    assert all(fence.contains(p) == i for p, i in zip(points[:20], inside[:20]))
+
+
+def test_geofence_signed_distance():
+    fence = Geofence(L_FENCE)
+
+    assert np.isclose(fence.signed_distance((2, 2)), 2)
+    assert np.isclose(fence.signed_distance((8, 3)), 1)
+    assert np.isclose(fence.signed_distance((8, 8)), -4)
+    assert np.isclose(fence.signed_distance((13, 8)), -5)  # Nearest the corner (10, 4)
+
+    distances = fence.signed_distance_many([(2, 2), (8, 8)])
+    assert np.allclose(distances, [2, -4])
+
+
+def test_geofence_clip_route():
+    fence = Geofence(L_FENCE)
+    route = [(1, 1), (5, 1), (9.5, 1), (8, 8), (2, 9.5)]
+
+    assert np.array_equal(fence.clip_route(route), [(1, 1), (5, 1), (9.5, 1), (2, 9.5)])
+    # Keep a metre away from the fence
+    assert np.array_equal(fence.clip_route(route, margin=1.0), [(1, 1), (5, 1)])
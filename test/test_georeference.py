@@ -0,0 +1,131 @@
+import math
+
+import numpy as np
+
+from src.modules.georeference.inference_georeference import (GeoreferenceContext, LonLat_To_XY, XY_To_LonLat,
+                                                             meters_to_LonLat, pixel_to_rel_position,
+                                                             pixels_to_rel_positions)
+from src.modules.imaging.analysis import CameraAttributes, Inference
+from src.modules.imaging.detector import BoundingBox, Vec2
+
+FOVH = math.radians(62.2)
+FOVV = math.radians(48.8)
+
+
+def test_utm_zone():
+    assert GeoreferenceContext.utm_zone(-113.5) == 12
+    assert GeoreferenceContext.utm_zone(-180.0) == 1
+    assert GeoreferenceContext.utm_zone(179.9) == 60
+    assert GeoreferenceContext.utm_zone(np.array([-113.6, -113.4])) == 12
+
+
+def test_projection_cached():
+    context = GeoreferenceContext()
+    assert context.projection(12) is context.projection(12)
+    assert context.projection(12) is not context.projection(13)
+
+
+def test_lonlat_xy_round_trip():
+    lon, lat = -113.5, 53.5
+    x, y = LonLat_To_XY(lon, lat)
+    lon2, lat2 = XY_To_LonLat(x, y)
+    assert abs(lon - lon2) < 1e-9
+    assert abs(lat - lat2) < 1e-9
+
+
+def test_lonlat_xy_round_trip_picked_zone():
+    context = GeoreferenceContext()
+    for lon, lat in [(-113.5, 53.5), (151.2, -33.9)]:
+        x, y, zone, south = context.lonlat_to_xy(lon, lat)
+        assert south == (lat < 0)
+        assert 0 < y < 10000000  # Northings are only positive on the right hemisphere's grid
+        lon2, lat2 = context.xy_to_lonlat(x, y, zone, south)
+        assert abs(lon - lon2) < 1e-9
+        assert abs(lat - lat2) < 1e-9
+
+
+def test_lonlat_to_xy_vectorised():
+    context = GeoreferenceContext()
+    lons = np.linspace(-113.6, -113.4, 50)
+    lats = np.linspace(53.4, 53.6, 50)
+
+    xs, ys, zone, south = context.lonlat_to_xy(lons, lats)
+    assert (zone, south) == (12, False)
+    assert xs.shape == (50, )
+    for i in (0, 25, 49):
+        x, y = LonLat_To_XY(lons[i], lats[i])
+        assert abs(xs[i] - x) < 1e-6
+        assert abs(ys[i] - y) < 1e-6
+
+
+def test_meters_to_lonlat():
+    origin = (-113.5, 53.5)
+    north, east, north_east = meters_to_LonLat(origin, [(100, 0), (0, 100), (100, 100)])
+
+    # Each entry is (lat, lon)
+    assert north[0] > origin[1] and abs(north[1] - origin[0]) < 1e-9
+    assert east[1] > origin[0] and abs(east[0] - origin[1]) < 1e-6
+
+    # Moving north-east should move as far north and east as each on their own
+    assert abs(north_east[0] - north[0]) < 1e-5
+    assert abs(north_east[1] - east[1]) < 1e-5
+
+    x0, y0 = LonLat_To_XY(*origin)
+    x, y = LonLat_To_XY(north[1], north[0])
+    assert abs(np.hypot(x - x0, y - y0) - 100) < 0.1
+
+
+def test_pixels_to_rel_positions_level():
+    camera_attributes = CameraAttributes()
+    xs = np.array([0.5, 0.0, 1.0, 0.5, 0.25])
+    ys = np.array([0.5, 0.5, 0.5, 0.0, 0.75])
+
+    offsets = pixels_to_rel_positions(camera_attributes, xs, ys, 10.0, FOVH, FOVV)
+    assert offsets.shape == (5, 2)
+
+    expected_forward = 10.0 * (1 - 2 * ys) * math.tan(FOVV / 2)
+    expected_right = 10.0 * (2 * xs - 1) * math.tan(FOVH / 2)
+    assert np.allclose(offsets[:, 0], expected_forward)
+    assert np.allclose(offsets[:, 1], expected_right)
+
+    # The single inference version should agree
+    bounding_box = BoundingBox(Vec2(480 - 10, 810 - 10), Vec2(20, 20))
+    single = pixel_to_rel_position(camera_attributes, Inference(bounding_box, 10.0), FOVH, FOVV)
+    assert np.allclose(single, offsets[4])
+
+
+def test_pixels_to_rel_positions_attitude():
+    camera_attributes = CameraAttributes()
+
+    # Pitching the nose up makes the centre of the image look forward
+    offset = pixels_to_rel_positions(camera_attributes, 0.5, 0.5, 10.0, FOVH, FOVV, pitch=math.radians(10))[0]
+    assert np.allclose(offset, [10.0 * math.tan(math.radians(10)), 0.0])
+
+    # Rolling right makes it look to the left
+    offset = pixels_to_rel_positions(camera_attributes, 0.5, 0.5, 10.0, FOVH, FOVV, roll=math.radians(10))[0]
+    assert np.allclose(offset, [0.0, -10.0 * math.tan(math.radians(10))])
+
+    # Tilting the camera forward is the same as pitching the drone up
+    camera_attributes.angle = math.radians(10)
+    tilted = pixels_to_rel_positions(camera_attributes, [0.2, 0.7], [0.3, 0.9], 10.0, FOVH, FOVV)
+    camera_attributes.angle = 0
+    pitched = pixels_to_rel_positions(camera_attributes, [0.2, 0.7], [0.3, 0.9], 10.0, FOVH, FOVV, pitch=math.radians(10))
+    assert np.allclose(tilted, pitched)
+
+    # Facing east, forward becomes east and right becomes south
+    offset = pixels_to_rel_positions(camera_attributes, 0.75, 0.25, 10.0, FOVH, FOVV, yaw=math.radians(90))[0]
+    level = pixels_to_rel_positions(camera_attributes, 0.75, 0.25, 10.0, FOVH, FOVV)[0]
+    assert np.allclose(offset, [-level[1], level[0]])
+
+    # Rays above the horizon never hit the ground
+    offset = pixels_to_rel_positions(camera_attributes, 0.5, 0.0, 10.0, FOVH, FOVV, pitch=math.radians(80))[0]
+    assert np.isnan(offset).all()
+
+
+def test_pixels_to_rel_positions_per_point_attitude():
+    camera_attributes = CameraAttributes()
+    altitudes = np.array([5.0, 10.0, 20.0])
+    pitches = np.radians([0.0, 5.0, -5.0])
+
+    offsets = pixels_to_rel_positions(camera_attributes, [0.5] * 3, [0.5] * 3, altitudes, FOVH, FOVV, pitch=pitches)
+    assert np.allclose(offsets[:, 0], altitudes * np.tan(pitches))
@@ -1,7 +1,8 @@
 import math
+import time
 from src.modules.imaging.location import (DebugLocationProvider,
                                           MAVLinkLocationProvider, LatLng,
-                                          Heading, Rotation)
+                                          Heading, Rotation, TelemetryHistory)
 from src.modules.imaging.mavlink import MAVLinkDelegateMock
 from pymavlink.dialects.v20 import all as dialect
 
@@ -239,3 +240,58 @@ def test_get_MAVLink_position_not_init():
     ]
     for method in methods:
         assert_raises(method)
+
+
+def test_telemetry_history_interpolation():
+    history = TelemetryHistory(["alt", "yaw"], capacity=4, angular=["yaw"])
+    assert history.at(0.0) is None
+
+    history.append(1.0, (10.0, 170.0))
+    history.append(2.0, (20.0, -170.0))
+
+    # Interpolates between samples, going the short way around for angles
+    alt, yaw = history.at(1.5)
+    assert math.isclose(alt, 15.0)
+    assert math.isclose(yaw, -180.0) or math.isclose(yaw, 180.0)
+
+    alt, yaw = history.at(1.25)
+    assert math.isclose(alt, 12.5)
+    assert math.isclose(yaw, 175.0)
+
+    # Outside of the history, the closest sample is used
+    assert history.at(0.0)[0] == 10.0
+    assert history.at(5.0)[0] == 20.0
+
+
+def test_telemetry_history_wraps():
+    history = TelemetryHistory(["alt"], capacity=3)
+    for t in range(10):
+        history.append(float(t), (t * 10.0, ))
+
+    assert len(history) == 3
+    assert history.latest()[0] == 90.0
+    # Only the newest samples are kept
+    assert history.at(0.0)[0] == 70.0
+    assert math.isclose(history.at(8.5)[0], 85.0)
+
+    # Samples older than the newest are ignored
+    history.append(1.0, (-1.0, ))
+    assert history.latest()[0] == 90.0
+
+
+def test_get_MAVLink_altitude_at():
+    mavlink = MAVLinkDelegateMock()
+    loc_mavlink = MAVLinkLocationProvider(mavlink)
+
+    def position_message(alt):
+        return dialect.MAVLink_global_position_int_message(0, 0, 0, alt, 0, 0, 0, 0, 0)
+
+    mavlink.send(position_message(1000))
+    between = time.time()
+    time.sleep(0.01)
+    mavlink.send(position_message(3000))
+
+    assert loc_mavlink.altitude() == 3.0
+    assert loc_mavlink.altitude_at(time.time()) == 3.0
+    assert 1.0 <= loc_mavlink.altitude_at(between) < 3.0
+    assert loc_mavlink.altitude_at(0.0) == 1.0
@@ -0,0 +1,253 @@
+import threading
+import time
+
+from src.modules.imaging.location import MAVLinkLocationProvider
+from src.modules.imaging.mavlink import MAVLinkDelegate, MAVLinkDelegateMock, TelemetryRateManager
+from pymavlink.dialects.v20 import all as dialect
+
+
+def _attitude_message():
+    return dialect.MAVLink_attitude_message(0, 0.1, 0.2, 0.3, 0, 0, 0)
+
+
+def _sys_status_message():
+    return dialect.MAVLink_sys_status_message(0, 0, 0, 0, 12000, 0, 0, 0, 0, 0, 0, 0, 0)
+
+
+def test_subscribe_message_types():
+    mavlink = MAVLinkDelegateMock()
+
+    every, attitude, both = [], [], []
+    mavlink.subscribe(every.append)
+    mavlink.subscribe(attitude.append, ["ATTITUDE"])
+    mavlink.subscribe(both.append, ["ATTITUDE", "SYS_STATUS"])
+
+    mavlink.send(_attitude_message())
+    mavlink.send(_sys_status_message())
+
+    assert [m.get_type() for m in every] == ["ATTITUDE", "SYS_STATUS"]
+    assert [m.get_type() for m in attitude] == ["ATTITUDE"]
+    assert [m.get_type() for m in both] == ["ATTITUDE", "SYS_STATUS"]
+
+
+class _StopDelegate(Exception):
+    pass
+
+
+class FakeConnection:
+    """
+    Stands in for a mavutil connection, replaying `messages` and recording
+    what is sent and how `recv_match` is called.
+    """
+
+    def __init__(self, messages, duration):
+        self.messages = list(messages)
+        self.stop_at = time.monotonic() + duration
+        self.sent = []
+        self.timeouts = []
+        self.mav = self
+
+    def send(self, message):
+        self.sent.append(message)
+
+    def recv_match(self, blocking=False, timeout=None):
+        assert blocking, "The delegate should block rather than poll"
+        self.timeouts.append(timeout)
+        if time.monotonic() > self.stop_at:
+            raise _StopDelegate()
+        if self.messages:
+            return self.messages.pop(0)
+        time.sleep(timeout)
+        return None
+
+
+def test_run_blocks_and_sends_heartbeats():
+    mavlink = MAVLinkDelegate.__new__(MAVLinkDelegate)
+    mavlink._listeners = []
+    mavlink._routes = {}
+    mavlink._queued_listeners = []
+    mavlink.heartbeat_interval = 0.1
+    mavlink._conn = FakeConnection([_attitude_message(), _sys_status_message()], 0.35)
+
+    received = []
+    mavlink.subscribe(received.append, ["SYS_STATUS"])
+
+    try:
+        mavlink.run()
+    except _StopDelegate:
+        pass
+
+    assert [m.get_type() for m in received] == ["SYS_STATUS"]
+
+    heartbeats = [m for m in mavlink._conn.sent if m.get_type() == "HEARTBEAT"]
+    assert 3 <= len(heartbeats) <= 5
+
+    # Never waits past the next heartbeat, and only wakes up to send one
+    assert all(0 <= timeout <= 0.1 for timeout in mavlink._conn.timeouts)
+    assert len(mavlink._conn.timeouts) < 20
+
+
+def test_subscribe_by_message_id():
+    mavlink = MAVLinkDelegateMock()
+
+    attitude = []
+    mavlink.subscribe(attitude.append, [dialect.MAVLINK_MSG_ID_ATTITUDE])
+    mavlink.send(_attitude_message())
+    mavlink.send(_sys_status_message())
+
+    assert [m.get_type() for m in attitude] == ["ATTITUDE"]
+
+    try:
+        mavlink.subscribe(attitude.append, ["NOT_A_MESSAGE"])
+        assert False, "Subscribing to an unknown message type should fail"
+    except ValueError:
+        pass
+
+
+def test_queued_listener():
+    mavlink = MAVLinkDelegateMock()
+
+    release = threading.Event()
+    slow, fast = [], []
+
+    def _slow_listener(message):
+        release.wait(timeout=5)
+        slow.append(message)
+
+    mavlink.subscribe(_slow_listener, queue_size=2)
+    mavlink.subscribe(fast.append, ["ATTITUDE"])
+
+    # The slow listener does not hold up the others
+    start = time.time()
+    for _ in range(10):
+        mavlink.send(_attitude_message())
+    assert time.time() - start < 1
+    assert len(fast) == 10
+
+    stats = mavlink.queue_stats()
+    assert len(stats) == 1
+    assert stats[0]["depth"] == 2
+    assert stats[0]["dropped"] >= 7
+
+    release.set()
+    deadline = time.time() + 5
+    while mavlink.queue_stats()[0]["depth"] > 0 and time.time() < deadline:
+        time.sleep(0.01)
+    assert mavlink.queue_stats()[0]["depth"] == 0
+
+
+def _ack(result=dialect.MAV_RESULT_ACCEPTED,
+         target_system=MAVLinkDelegate.SOURCE_SYSTEM,
+         target_component=MAVLinkDelegate.SOURCE_COMPONENT):
+    return dialect.MAVLink_command_ack_message(dialect.MAV_CMD_SET_MESSAGE_INTERVAL, result, 0, 0, target_system,
+                                               target_component)
+
+
+def _interval_commands(mavlink):
+    commands = []
+    mavlink.subscribe(lambda m: commands.append((int(m.param1), m.param2)), ["COMMAND_LONG"])
+    return commands
+
+
+def test_telemetry_rates_negotiated():
+    mavlink = MAVLinkDelegateMock()
+    commands = _interval_commands(mavlink)
+    rates = mavlink.telemetry_rates
+
+    rates.request("a", "ATTITUDE", 2.0)
+    rates.request("b", "ATTITUDE", 10.0)
+    # Lower requests do not change the negotiated rate, so nothing is sent
+    rates.request("a", "ATTITUDE", 5.0)
+    assert rates.rate("ATTITUDE") == 10.0
+
+    # One command is outstanding at a time
+    attitude = dialect.MAVLINK_MSG_ID_ATTITUDE
+    assert commands == [(attitude, 500000)]
+    mavlink.send(_ack())
+    assert commands == [(attitude, 500000), (attitude, 100000)]
+    mavlink.send(_ack())
+
+    rates.release("b")
+    rates.release("a")
+    mavlink.send(_ack())
+    assert commands[-2:] == [(attitude, 200000), (attitude, 0)]
+    assert rates.rate("ATTITUDE") == 0.0
+
+
+def test_telemetry_rates_confirmed():
+    mavlink = MAVLinkDelegateMock()
+    rates = mavlink.telemetry_rates
+
+    rates.request("a", "ATTITUDE", 2.0)
+    rates.request("a", "SYS_STATUS", 1.0)
+    assert not rates.confirmed("ATTITUDE")
+
+    # Acks for other systems' commands are ignored
+    mavlink.send(_ack(target_system=MAVLinkDelegate.SOURCE_SYSTEM - 1))
+    assert not rates.confirmed("ATTITUDE")
+
+    # Acks confirm the outstanding command, including MAVLink 1 acks without a target
+    mavlink.send(_ack(target_system=0, target_component=0))
+    assert rates.confirmed("ATTITUDE")
+    assert not rates.confirmed("SYS_STATUS")
+    assert not rates.wait_confirmed("SYS_STATUS", 0.01)
+
+    mavlink.send(_ack(dialect.MAV_RESULT_DENIED))
+    assert not rates.confirmed("SYS_STATUS")
+
+    # A new rate must be acknowledged again
+    rates.request("b", "ATTITUDE", 20.0)
+    assert not rates.confirmed("ATTITUDE")
+    threading.Timer(0.05, lambda: mavlink.send(_ack())).start()
+    assert rates.wait_confirmed("ATTITUDE", 5)
+
+
+def test_telemetry_rates_retried():
+    mavlink = MAVLinkDelegateMock()
+    commands = _interval_commands(mavlink)
+    rates = TelemetryRateManager(mavlink, ack_timeout=0.05, retries=2)
+
+    rates.request("a", "ATTITUDE", 2.0)
+    rates.request("a", "SYS_STATUS", 1.0)
+
+    # The ack is lost, so the command is sent again, then given up on
+    attitude, sys_status = dialect.MAVLINK_MSG_ID_ATTITUDE, dialect.MAVLINK_MSG_ID_SYS_STATUS
+    deadline = time.time() + 5
+    while len(commands) < 3 and time.time() < deadline:
+        time.sleep(0.01)
+    assert commands == [(attitude, 500000), (attitude, 500000), (sys_status, 1000000)]
+    assert not rates.confirmed("ATTITUDE")
+
+    # The next ack is for the command after it
+    mavlink.send(_ack())
+    assert rates.confirmed("SYS_STATUS")
+
+
+def test_telemetry_profiles():
+    mavlink = MAVLinkDelegateMock()
+    MAVLinkLocationProvider(mavlink)
+    rates = mavlink.telemetry_rates
+
+    # The location provider's baseline
+    assert rates.rate("ATTITUDE") == 2.0
+
+    rates.set_profile("precision_descent")
+    assert rates.rate("ATTITUDE") == 50.0
+    assert rates.rate("GLOBAL_POSITION_INT") == 10.0
+
+    # Switching profile drops the old one, and transit lowers attitude below
+    # the baseline
+    rates.set_profile("transit")
+    assert rates.rate("ATTITUDE") == 1.0
+    assert rates.rate("GLOBAL_POSITION_INT") == 2.0
+    assert rates.rate("DISTANCE_SENSOR") == 0.0
+
+    # Without a profile the consumers' requests apply again
+    rates.set_profile(None)
+    assert rates.rate("ATTITUDE") == 2.0
+
+    try:
+        rates.set_profile("not_a_profile")
+        assert False, "Setting an unknown profile should fail"
+    except ValueError:
+        pass
@@ -0,0 +1,115 @@
+import time
+from types import SimpleNamespace
+from typing import List
+
+import pymavlink.dialects.v20.all as dialect
+
+from src.modules.autopilot.messenger import Messenger
+
+
+class FakeConnection:
+    """
+    Records the STATUSTEXT messages sent through it.
+    """
+
+    def __init__(self):
+        self.sent: List = []
+        self.mav = SimpleNamespace(send=self.sent.append)
+
+    def texts(self):
+        return [message.text for message in self.sent]
+
+
+def test_messenger_sends():
+    connection = FakeConnection()
+    messenger = Messenger(connection=connection)
+
+    messenger.send("Taking off")
+    messenger.send("Landing")
+    assert messenger.flush(timeout=5)
+    assert connection.texts() == ["SHEPARD: Taking off", "SHEPARD: Landing"]
+    messenger.close()
+
+
+def test_messenger_sends_through_vehicle():
+    written: List[bytes] = []
+    connection = SimpleNamespace(target_system=7, write=written.append)
+    messenger = Messenger(vehicle=SimpleNamespace(message_factory=SimpleNamespace(file=connection)))
+
+    messenger.send("Landing")
+    assert messenger.flush(timeout=5)
+
+    # Sent as the vehicle's onboard computer
+    message = dialect.MAVLink(None).decode(bytearray(written[0]))
+    assert message.text == "SHEPARD: Landing"
+    assert (message.get_srcSystem(), message.get_srcComponent()) == (7, dialect.MAV_COMP_ID_ONBOARD_COMPUTER)
+    messenger.close()
+
+
+def test_messenger_coalesces_topics():
+    connection = FakeConnection()
+    messenger = Messenger(connection=connection, min_interval=0.2)
+
+    start = time.monotonic()
+    messenger.send("Distance to target: 0 m", topic="distance")
+    assert messenger.flush(timeout=5)
+    for i in range(1, 10):
+        messenger.send(f"Distance to target: {i} m", topic="distance")
+    messenger.send("Other news")
+    assert messenger.flush(timeout=5)
+
+    # The first progress message goes out straight away, then only the
+    # newest once the interval is up. Other topics are not held up.
+    texts = connection.texts()
+    assert texts[0] == "SHEPARD: Distance to target: 0 m"
+    assert texts[-1] == "SHEPARD: Distance to target: 9 m"
+    assert texts[1] == "SHEPARD: Other news"
+    assert len(texts) == 3
+    assert time.monotonic() - start >= 0.2
+
+    # Repeating the same message is coalesced even without a topic
+    connection.sent.clear()
+    for _ in range(5):
+        messenger.send("No balloons detected")
+    assert messenger.flush(timeout=5)
+    assert len(connection.sent) <= 2
+    messenger.close()
+
+
+def test_messenger_chunks_long_text():
+    connection = FakeConnection()
+    messenger = Messenger(connection=connection)
+
+    text = "x" * 120
+    messenger.send(text, prefix="P")
+    assert messenger.flush(timeout=5)
+
+    assert len(connection.sent) == 3
+    assert all(message.id == connection.sent[0].id != 0 for message in connection.sent)
+    assert [message.chunk_seq for message in connection.sent] == [0, 1, 2]
+    assert "".join(connection.texts()) == f"P: {text}"
+
+    # A single message has no id
+    connection.sent.clear()
+    messenger.send("short")
+    assert messenger.flush(timeout=5)
+    assert connection.sent[0].id == 0
+
+    messenger.close()
+
+
+def test_messenger_chunk_boundaries():
+    messenger = Messenger(connection=FakeConnection())
+
+    # An exactly full last chunk is followed by an empty one to end the text
+    chunks = messenger.chunk(b"y" * 100)
+    assert [len(text) for text, _, _ in chunks] == [50, 50, 0]
+
+    # Multi-byte characters are never split
+    text = ("é" * 60).encode("utf-8")
+    chunks = messenger.chunk(text)
+    assert b"".join(chunk for chunk, _, _ in chunks) == text
+    for chunk, _, _ in chunks:
+        chunk.decode("utf-8")
+
+    messenger.close()
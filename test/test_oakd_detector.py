@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from src.modules.imaging.camera import DebugCamera
+from src.modules.imaging.detector import BoundingBox, Vec2
+from src.modules.imaging.frame import Frame
+from src.modules.imaging.oakd_detector import OakdDetector, boxes_from_detections, load_recording, save_recording
+
+
+def img_detection(label, confidence, xmin, ymin, xmax, ymax):
+    # Stands in for depthai.ImgDetection
+    return SimpleNamespace(label=label, confidence=confidence, xmin=xmin, ymin=ymin, xmax=xmax, ymax=ymax)
+
+
+def test_boxes_from_detections():
+    boxes = boxes_from_detections([img_detection(0, 0.6, 0.1, 0.2, 0.3, 0.4),
+                                   img_detection(1, 0.9, 0.5, 0.5, 1.2, 1.0)], 600, 400)
+
+    # Most confident first, in pixels, clipped to the image
+    assert [box.confidence for box in boxes] == [0.9, 0.6]
+    assert [box.label for box in boxes] == [1, 0]
+    assert (boxes[0].position.x, boxes[0].position.y) == (300, 200)
+    assert (boxes[0].size.x, boxes[0].size.y) == (300, 200)
+    assert np.allclose((boxes[1].position.x, boxes[1].position.y, boxes[1].size.x, boxes[1].size.y),
+                       (60, 80, 120, 80))
+
+
+def test_oakd_detector_frame_detections():
+    detections = [BoundingBox(Vec2(10, 10), Vec2(5, 5), 0.8, label=2),
+                  BoundingBox(Vec2(20, 20), Vec2(5, 5), 0.7, label=1),
+                  BoundingBox(Vec2(30, 30), Vec2(5, 5), 0.3, label=1)]
+    frame = Frame(np.zeros((400, 600, 3), dtype=np.uint8), "BGR", detections=detections)
+    assert frame.copy().detections is detections
+
+    assert OakdDetector().predict(frame) is detections[0]
+    assert OakdDetector(labels=[1]).predict(frame) is detections[1]
+    assert OakdDetector(min_confidence=0.9).predict(frame) is None
+    assert len(OakdDetector(min_confidence=0.1).predict_batch([frame, frame])[1]) == 3
+
+    # Frames from other cameras have nothing to pick up
+    try:
+        OakdDetector().predict(DebugCamera("res/test-image.jpeg").capture_frame())
+    except ValueError:
+        return
+    assert False
+
+
+def test_oakd_detector_recording(tmp_path):
+    path = tmp_path / "detections.jsonl"
+    save_recording([[img_detection(0, 0.9, 0.0, 0.0, 0.5, 0.5)],
+                    [],
+                    [img_detection(0, 0.8, 0.5, 0.5, 1.0, 1.0)]], path)
+
+    camera = DebugCamera("res/test-image.jpeg")
+    detector = OakdDetector(recording=load_recording(path))
+
+    first = detector.predict(camera.capture_frame())
+    assert first is not None and (first.size.x, first.size.y) == (300, 200)
+    assert detector.predict(camera.capture()) is None
+    third = detector.predict(camera.capture_frame())
+    assert third is not None and (third.position.x, third.position.y) == (300, 200)
+
+    # The recording has run out
+    assert detector.predict(camera.capture_frame()) is None
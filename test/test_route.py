@@ -0,0 +1,45 @@
+import math
+
+import numpy as np
+
+from src.modules.autopilot.route import coverage_step, spiral_route, spiral_waypoints
+
+# The route generated by the original, loop based, Lander.generateSpiralSearch(2)
+EXPECTED_ROUTE = [(5, 0), (10, 0), (10, 5), (10, 10), (5, 10), (0, 10), (-5, 10), (-5, 5), (-5, 0), (-5, -5),
+                  (0, -5), (5, -5), (10, -5), (15, -5), (15, 0), (15, 5), (15, 10), (15, 15), (10, 15), (5, 15),
+                  (0, 15), (-5, 15), (-10, 15), (-10, 10), (-10, 5), (-10, 0), (-10, -5), (-10, -10), (-5, -10),
+                  (0, -10), (5, -10), (10, -10), (15, -10), (20, -10), (20, -5), (20, 0), (20, 5), (20, 10),
+                  (20, 15), (20, 20)]
+
+
+def test_spiral_route():
+    route = spiral_route(5, 2)
+    assert route.shape == (len(EXPECTED_ROUTE), 2)
+    assert np.array_equal(route, EXPECTED_ROUTE)
+
+
+def test_spiral_waypoints():
+    assert np.allclose(list(spiral_waypoints(2.5, 4)), spiral_route(2.5, 4))
+
+    # Waypoints are generated lazily
+    waypoints = spiral_waypoints(5, 1000000)
+    assert next(waypoints) == (5, 0)
+    assert next(waypoints) == (10, 0)
+
+
+def test_coverage_step():
+    half_h, half_v = math.radians(30), math.radians(24)
+
+    # Limited by the narrower (vertical) field of view
+    footprint = 2 * 10 * math.tan(half_v)
+    assert math.isclose(coverage_step(10, half_h, half_v, overlap=0), footprint)
+    assert math.isclose(coverage_step(10, half_h, half_v, overlap=0.25), footprint * 0.75)
+
+    # Higher means a wider view, so bigger steps
+    assert coverage_step(20, half_h, half_v) > coverage_step(10, half_h, half_v)
+
+    try:
+        coverage_step(10, half_h, half_v, overlap=1)
+        assert False, "An overlap of 1 should not be allowed"
+    except ValueError:
+        pass
@@ -0,0 +1,112 @@
+from typing import List
+
+import numpy as np
+
+from src.modules.autopilot.waypoints import POSITION_TYPEMASK, POSITION_VELOCITY_TYPEMASK, WaypointStreamer
+
+
+class FakeNav:
+    """
+    Records the setpoints sent to it and moves towards them at a fixed speed.
+    """
+
+    def __init__(self, position=(0.0, 0.0, 0.0)):
+        self.position = np.array(position, dtype=np.float64)
+        self.setpoints: List[dict] = []
+
+    def get_local_position_ned(self):
+        return tuple(self.position)
+
+    def set_position_target_local_ned(self, **kwargs):
+        self.setpoints.append(kwargs)
+
+    def step(self, distance):
+        setpoint = self.setpoints[-1]
+        target = np.array((setpoint["x"], setpoint["y"], setpoint["z"]))
+        heading = target - self.position
+        length = np.linalg.norm(heading)
+        if length <= distance:
+            self.position = target
+        else:
+            self.position = self.position + heading / length * distance
+
+
+def test_waypoint_streamer_flies_route():
+    nav = FakeNav()
+    waypoints = [(10, 0, 0), (10, 10, 0), (0, 10, 0)]
+    streamer = WaypointStreamer(nav, waypoints, speed=5, lookahead=2, tolerance=0.5)
+
+    visited = []
+    for _ in range(1000):
+        if not streamer.update():
+            break
+        visited.append(streamer.index)
+        nav.step(0.5)
+
+    assert streamer.done
+    assert np.linalg.norm(nav.position - (0, 10, 0)) <= 0.5
+    assert visited == sorted(visited)
+    assert set(visited) == {0, 1, 2}
+
+    # Once done, nothing more is sent
+    sent = len(nav.setpoints)
+    assert not streamer.update()
+    assert len(nav.setpoints) == sent
+
+
+def test_waypoint_streamer_blends_velocity():
+    nav = FakeNav()
+    streamer = WaypointStreamer(nav, [(10, 0, 0), (10, 10, 0)], speed=4, lookahead=2, tolerance=0.5)
+
+    # Mid leg: aim ahead along the leg at full speed
+    streamer.update((5, 0, 0))
+    setpoint = nav.setpoints[-1]
+    assert setpoint["type_mask"] == POSITION_VELOCITY_TYPEMASK
+    assert (setpoint["x"], setpoint["y"]) == (7, 0)
+    assert np.isclose(np.hypot(setpoint["vx"], setpoint["vy"]), 4)
+
+    # Near the corner: already on the next leg, aiming around the corner
+    streamer.update((9, 0, 0))
+    assert streamer.index == 1
+    setpoint = nav.setpoints[-1]
+    assert setpoint["vy"] > 0
+
+    # Near the end: slow down
+    streamer.update((10, 9, 0))
+    setpoint = nav.setpoints[-1]
+    assert np.isclose(np.hypot(setpoint["vx"], setpoint["vy"]), 2)
+    assert (setpoint["x"], setpoint["y"]) == (10, 10)
+
+
+def test_waypoint_streamer_without_blend():
+    nav = FakeNav()
+    streamer = WaypointStreamer(nav, [(10, 0, -5), (10, 10, -5)], speed=4, lookahead=2, blend=False)
+
+    streamer.update()
+    setpoint = nav.setpoints[-1]
+    assert setpoint["type_mask"] == POSITION_TYPEMASK
+    assert (setpoint["x"], setpoint["y"], setpoint["z"]) == (10, 0, -5)
+
+    streamer.update((8.5, 0, -5))
+    setpoint = nav.setpoints[-1]
+    assert (setpoint["x"], setpoint["y"], setpoint["z"]) == (10, 10, -5)
+
+
+def test_waypoint_streamer_off_route():
+    nav = FakeNav()
+    streamer = WaypointStreamer(nav, [(10, 0, 0), (10, 10, 0), (0, 10, 0)], speed=4, lookahead=2, blend=False)
+    streamer.update((0, 0, 0))
+
+    # Level with the first waypoint but far off the route: it is not skipped
+    streamer.update((10, -30, 0))
+    assert streamer.index == 0
+    setpoint = nav.setpoints[-1]
+    assert (setpoint["x"], setpoint["y"]) == (10, 0)
+
+
+def test_waypoint_streamer_needs_waypoints():
+    try:
+        WaypointStreamer(FakeNav(), [], speed=1)
+    except ValueError:
+        return
+    assert False